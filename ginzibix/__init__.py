@@ -396,10 +396,55 @@ def get_server_config(cfg):
     return sconf
 
 
+# reads optional per-server tuning options from config
+def get_server_options(cfg):
+    snr = 0
+    idx = 0
+    soptions = {}
+    while idx < 99:
+        idx += 1
+        snr += 1
+        snrstr = "SERVER" + str(snr)
+        try:
+            server_name = cfg[snrstr]["SERVER_NAME"]
+        except Exception:
+            continue
+        options = {}
+        # number of outstanding BODY/STAT commands per connection
+        try:
+            options["pipeline"] = max(int(cfg[snrstr]["PIPELINE"]), 1)
+        except Exception:
+            options["pipeline"] = 1
+        # negotiate COMPRESS DEFLATE / XFEATURE COMPRESS GZIP if server supports it
+        try:
+            options["compression"] = True if cfg[snrstr]["COMPRESSION"].lower() == "yes" else False
+        except Exception:
+            options["compression"] = False
+        # connection autoscaler starts with this number of connections
+        try:
+            options["min_connections"] = max(int(cfg[snrstr]["MIN_CONNECTIONS"]), 1)
+        except Exception:
+            options["min_connections"] = 1
+        # KiB/s, 0 = unlimited; stored as bytes/s
+        try:
+            options["bandwidth_limit"] = max(int(float(cfg[snrstr]["BANDWIDTH_LIMIT"]) * 1024), 0)
+        except Exception:
+            options["bandwidth_limit"] = 0
+        soptions[server_name] = options
+    return soptions
+
+
+# sync calls (exc, exc_many) go through REQ/REP, writes nobody waits for (exc_async)
+# through PUSH/PULL. every sync call carries the sequence no. of the sender's last async
+# write, the db applies all async writes of that sender first: a process always reads
+# its own writes.
 class PWDBSender():
     def __init__(self):
         self.context = None
         self.socket = None
+        self.push_socket = None
+        self.sender_id = None
+        self.async_seq = 0
         _, self.maindir, _, _ = make_dirs()
 
     def connect(self):
@@ -412,17 +457,46 @@ class PWDBSender():
                 socketurl = "ipc://" + ipc_location
                 self.socket.connect(socketurl)
             except Exception:
-                self.socket = None
-                self.context = None
+                self.close()
                 return None
         return True
 
+    def connect_async(self):
+        if not self.connect():
+            return None
+        if not self.push_socket:
+            try:
+                self.push_socket = self.context.socket(zmq.PUSH)
+                # pending writes are still delivered if the process exits right away
+                self.push_socket.setsockopt(zmq.LINGER, 2000)
+                self.push_socket.connect("ipc://" + self.maindir + "ginzibix_socket2")
+                self.sender_id = str(os.getpid()) + "." + str(id(self))
+            except Exception:
+                if self.push_socket:
+                    self.push_socket.close(linger=0)
+                self.push_socket = None
+                return None
+        return True
+
+    # push socket keeps its linger, so pending async writes are still delivered
+    def close(self):
+        try:
+            if self.socket:
+                self.socket.close(linger=0)
+            if self.push_socket:
+                self.push_socket.close()
+            if self.context:
+                self.context.term()
+        except Exception:
+            pass
+        self.socket = None
+        self.push_socket = None
+        self.context = None
+
     def reconnect(self, funcstr):
         i = 1
         while True:
-            if self.context:
-                self.socket.close()
-                self.context = None
+            self.close()
             time.sleep(1)
             res = self.connect()
             if res:
@@ -438,12 +512,12 @@ class PWDBSender():
         a = -1
         while True:
             try:
-                self.socket.send_pyobj((funcstr, args0, kwargs0))
+                self.socket.send_pyobj((funcstr, args0, kwargs0, self.sender_id, self.async_seq))
                 break
             except zmq.ZMQError:
                 res = self.reconnect(funcstr)
             except Exception:
-                self.context = None
+                self.close()
                 return False
 
         # receive
@@ -453,9 +527,32 @@ class PWDBSender():
                 return False
             return ret0
         except Exception:
-            self.context = None
+            self.close()
             return False
 
+    # calls = [(funcstr, args0, kwargs0), ...] in one round trip, returns list of results
+    def exc_many(self, calls):
+        ret0 = self.exc("exc_many", [calls], {})
+        if not isinstance(ret0, list):
+            return [None] * len(calls)
+        return ret0
+
+    # fire and forget, falls back to a sync call if the push socket is not available
+    def exc_async(self, funcstr, args0, kwargs0):
+        if not self.connect_async():
+            return self.exc(funcstr, args0, kwargs0)
+        try:
+            self.push_socket.send_pyobj((self.sender_id, self.async_seq + 1, funcstr, args0, kwargs0))
+            self.async_seq += 1
+        except Exception:
+            try:
+                self.push_socket.close()
+            except Exception:
+                pass
+            self.push_socket = None
+            return self.exc(funcstr, args0, kwargs0)
+        return True
+
 
 def is_port_in_use(port):
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -0,0 +1,234 @@
+import asyncio
+import ssl
+import zlib
+import nntplib
+
+from ginzibix.nntp_reader import find_terminator, dot_unstuff, is_compressed_block, finish_compressed_block, CHUNK_SIZE
+
+
+NNTP_TIMEOUT = 60
+
+
+# minimal asyncio nntp client, raises the same exceptions as nntplib so
+# error handling stays identical to the threaded connection workers
+class AioNNTP:
+
+    def __init__(self, host, port=119, user=None, password=None, usessl=False, readermode=True, timeout=NNTP_TIMEOUT,
+                 compression=False):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.usessl = usessl
+        self.readermode = readermode
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.welcome = None
+        # receive buffer, all reads go through it
+        self.rbuf = bytearray()
+        # None, "deflate" or "gzip"
+        self.use_compression = compression
+        self.compression = None
+        self.compressor = None
+        self.decompressor = None
+        self.bytes_in = 0
+
+    async def connect(self):
+        context = None
+        if self.usessl:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS)
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=context),
+                                                          self.timeout)
+        try:
+            self.welcome = await self.getresp()
+            # this is just for ginzicut preloading
+            if self.user and self.user.lower() == "ginzicut" or self.password and self.password.lower() == "ginzicut":
+                return self
+            if self.user:
+                await self.login()
+            if self.readermode:
+                try:
+                    await self.shortcmd("MODE READER")
+                except nntplib.NNTPError:
+                    pass
+            if self.use_compression:
+                await self.negotiate_compression()
+        except BaseException:
+            self.close()
+            raise
+        return self
+
+    async def login(self):
+        resp = await self.shortcmd("AUTHINFO USER " + self.user)
+        if resp.startswith("381"):
+            resp = await self.shortcmd("AUTHINFO PASS " + self.password)
+        if not resp.startswith("281"):
+            raise nntplib.NNTPPermanentError(resp)
+
+    async def capabilities(self):
+        caps = {}
+        try:
+            await self.shortcmd("CAPABILITIES")
+        except nntplib.NNTPError:
+            return caps
+        for line in (await self.read_dot_terminated()).decode("utf-8", "surrogateescape").splitlines():
+            words = line.split()
+            if words:
+                caps[words[0].upper()] = [w.upper() for w in words[1:]]
+        return caps
+
+    # COMPRESS DEFLATE (RFC 8054) if offered, otherwise try XFEATURE COMPRESS GZIP
+    async def negotiate_compression(self):
+        caps = await self.capabilities()
+        if "DEFLATE" in caps.get("COMPRESS", []):
+            try:
+                await self.shortcmd("COMPRESS DEFLATE")
+                self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+                self.decompressor = zlib.decompressobj(-15)
+                if self.rbuf:
+                    self.rbuf = bytearray(self.decompressor.decompress(bytes(self.rbuf)))
+                self.compression = "deflate"
+                return self.compression
+            except nntplib.NNTPError:
+                pass
+        try:
+            await self.shortcmd("XFEATURE COMPRESS GZIP TERMINATOR")
+            self.compression = "gzip"
+        except nntplib.NNTPError:
+            pass
+        return self.compression
+
+    def write(self, data):
+        if self.compressor:
+            data = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.writer.write(data)
+
+    async def putcmd(self, line):
+        self.write(line.encode("utf-8") + b"\r\n")
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+
+    # sends several commands at once (pipelining), responses have to be read in order
+    async def putcmds(self, lines):
+        self.write(b"".join(line.encode("utf-8") + b"\r\n" for line in lines))
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+
+    async def fill(self):
+        data = await asyncio.wait_for(self.reader.read(CHUNK_SIZE), self.timeout)
+        if not data:
+            raise EOFError("connection closed by " + self.host)
+        self.bytes_in += len(data)
+        if self.decompressor:
+            data = self.decompressor.decompress(data)
+        self.rbuf += data
+
+    async def readline(self):
+        start = 0
+        while True:
+            idx = self.rbuf.find(b"\n", start)
+            if idx >= 0:
+                line = bytes(self.rbuf[:idx + 1])
+                del self.rbuf[:idx + 1]
+                return line
+            start = len(self.rbuf)
+            await self.fill()
+
+    # reads dot-terminated block into one buffer and undoes dot-stuffing
+    async def read_dot_terminated(self):
+        start = 0
+        while True:
+            end, bodyend = find_terminator(self.rbuf, start)
+            if end >= 0:
+                body = dot_unstuff(bytes(self.rbuf[:bodyend]))
+                del self.rbuf[:end]
+                return body
+            start = max(len(self.rbuf) - 4, 0)
+            await self.fill()
+
+    async def getresp(self):
+        resp = (await self.readline()).decode("utf-8", "surrogateescape").rstrip("\r\n")
+        c = resp[:1]
+        if c == "4":
+            raise nntplib.NNTPTemporaryError(resp)
+        if c == "5":
+            raise nntplib.NNTPPermanentError(resp)
+        if c not in "123":
+            raise nntplib.NNTPProtocolError(resp)
+        return resp
+
+    # see nntp_reader.read_compressed_block
+    async def read_compressed_block(self):
+        while len(self.rbuf) < 2:
+            await self.fill()
+        if not is_compressed_block(self.rbuf):
+            body = await self.read_dot_terminated()
+            return body, len(body)
+        decompressor = zlib.decompressobj(47)
+        out = []
+        wire = 0
+        while True:
+            if self.rbuf:
+                out.append(decompressor.decompress(bytes(self.rbuf)))
+                used = len(self.rbuf) - len(decompressor.unused_data)
+                del self.rbuf[:used]
+                wire += used
+            if decompressor.eof:
+                break
+            await self.fill()
+        if not self.rbuf:
+            await self.fill()
+        if self.rbuf[:1] == b".":
+            wire += len(await self.readline())
+        return finish_compressed_block(b"".join(out)), wire
+
+    # returns resp, [body], bytes received on the wire for the body
+    async def getbody(self):
+        bytes_in0 = self.bytes_in
+        resp = await self.getresp()
+        if not resp.startswith("222"):
+            return resp, None, 0
+        if self.compression == "gzip":
+            body, wire = await self.read_compressed_block()
+        else:
+            body = await self.read_dot_terminated()
+            wire = len(body)
+            if self.compression == "deflate":
+                wire = self.bytes_in - bytes_in0
+        return resp, [body], wire
+
+    async def shortcmd(self, line):
+        await self.putcmd(line)
+        return await self.getresp()
+
+    async def body(self, message_id):
+        await self.putcmd("BODY " + message_id)
+        return await self.getbody()
+
+    async def stat(self, message_id):
+        return self.statparse(await self.shortcmd("STAT " + message_id))
+
+    def statparse(self, resp):
+        words = resp.split()
+        try:
+            number = int(words[1])
+        except Exception:
+            number = 0
+        message_id0 = words[2] if len(words) > 2 else ""
+        return resp, number, message_id0
+
+    async def quit(self):
+        resp = None
+        try:
+            resp = await self.shortcmd("QUIT")
+        finally:
+            self.close()
+        return resp
+
+    def close(self):
+        if self.writer:
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+        self.reader = None
+        self.writer = None
@@ -1,20 +1,107 @@
-import re
+import zlib
+import hashlib
 import ginzyenc
 import os
 import time
 import queue
 import signal
+import multiprocessing as mp
 from threading import Thread
+from collections import OrderedDict, deque
 from setproctitle import setproctitle
 
 from ginzibix.mplogging import whoami
 from ginzibix import mplogging
 from ginzibix import PWDBSender
+from ginzibix.shm_ring import ShmRing, resolve_info, free_info
+from ginzibix.article_spill import SPILL_FILENAME, get_backlog_sizes, add_backlog, read_spilled
+from ginzibix.segment_log import SegmentLog
+from ginzibix.yenc_header import parse_yenc
 
 TERMINATED = False
 MAX_THREADS = 4
 IS_IDLE = False
 
+# articles are decoded one by one as they arrive and written at their =ypart offset
+# into a preallocated file in _partial0/; which parts are written is appended to a log
+# next to it (see segment_log.py), so downloads can be resumed. when the downloader
+# says the file is complete it is moved to the download dir (where the renamer picks it up)
+PART_MISSING = 0
+PART_DONE = 1
+PART_FAILED = 2
+# downloader only: sent to the decoder, not yet reported back as written
+PART_QUEUED = 3
+PARTMAP_SUFFIX = ".gzbxmap"
+
+# decoding is done by a pool of worker processes, any worker takes any article (the
+# download order completes one file after another). the dispatcher (decode_articles)
+# owns segment logs and file status, workers only decode + write and report back, so
+# a file is finished only after all its articles are written.
+# workers report back through the dispatcher's input queue, so the dispatcher blocks
+# on one queue and only wakes up for new work, results or the periodic checks.
+# per worker stats in a shared array: busy sec., articles, decoded bytes, queue wait sec.
+DECODER_STATS_FIELDS = 4
+# max. sec. the dispatcher blocks: worker health, termination
+DECODER_WAKEUP_INTERVAL = 1
+# open output files per worker
+PARTWRITER_MAX_FILES = 8
+# par2 identifies files by md5 of their first 16k
+MD5_16K_SIZE = 16 * 1024
+
+
+# crc32 of concatenated data from crc32 of both parts (port of zlib's crc32_combine),
+# x^(8 * len2) mod p is cached as parts mostly have the same size
+CRC32_POLY = 0xedb88320
+CRC32_X2N = []
+CRC32_SHIFTS = {}
+
+
+def crc32_multmodp(a, b):
+    m = 1 << 31
+    p = 0
+    while True:
+        if a & m:
+            p ^= b
+            if not a & (m - 1):
+                break
+        m >>= 1
+        b = (b >> 1) ^ CRC32_POLY if b & 1 else b >> 1
+    return p
+
+
+def crc32_x2nmodp(n, k):
+    if not CRC32_X2N:
+        p = 1 << 30
+        CRC32_X2N.append(p)
+        for _ in range(31):
+            p = crc32_multmodp(p, p)
+            CRC32_X2N.append(p)
+    p = 1 << 31
+    while n:
+        if n & 1:
+            p = crc32_multmodp(CRC32_X2N[k & 31], p)
+        n >>= 1
+        k += 1
+    return p
+
+
+def crc32_combine(crc1, crc2, len2):
+    try:
+        shift = CRC32_SHIFTS[len2]
+    except KeyError:
+        shift = CRC32_SHIFTS[len2] = crc32_x2nmodp(len2, 3)
+    return crc32_multmodp(shift, crc1) ^ crc2
+
+
+def get_nr_decoder_workers(cfg):
+    try:
+        nr_workers = int(cfg["OPTIONS"]["DECODER_WORKERS"])
+    except Exception:
+        nr_workers = 0
+    if nr_workers <= 0:
+        nr_workers = min(MAX_THREADS, os.cpu_count() or 1)
+    return nr_workers
+
 
 def decoder_is_idle():
     return IS_IDLE
@@ -25,6 +112,23 @@ def decoder_set_idle(ie):
     IS_IDLE = ie
 
 
+# "article" + "done" jobs put into the input queue but not yet written / finished, counted
+# in a shared mp.Value("q") by the downloader (+1) and the dispatcher (-1); 0 = decoder
+# is through with everything (the input queue also carries worker results, so its size
+# does not tell)
+def add_decoder_pending(pending, n):
+    if pending is None or not n:
+        return
+    with pending.get_lock():
+        pending.value = max(pending.value + n, 0)
+
+
+# decoder was killed / restarted or its queue was cleared: queued jobs are gone
+def reset_decoder_pending(pending):
+    with pending.get_lock():
+        pending.value = 0
+
+
 class SigHandler_Decoder:
     def __init__(self, logger):
         self.logger = logger
@@ -35,90 +139,521 @@ class SigHandler_Decoder:
         TERMINATED = True
 
 
-def decode_articles(mp_work_queue0, mp_loggerqueue, filewrite_lock):
-    setproctitle("gzbx." + os.path.basename(__file__))
+# one byte per article: PART_DONE if written before (replays the file's segment log)
+def load_partmap(partial_dir, filename, nr_articles):
+    partmap = bytearray(nr_articles)
+    if not os.path.isfile(partial_dir + filename):
+        return partmap
+    seglog = SegmentLog(partial_dir + filename + PARTMAP_SUFFIX)
+    try:
+        seglog.load()
+    except Exception:
+        return partmap
+    for art_nr in seglog.parts:
+        if 1 <= art_nr <= nr_articles:
+            partmap[art_nr - 1] = PART_DONE
+    return partmap
+
+
+# segment log + status of a file in _partial0/, only used by the dispatcher
+class PartialFile:
+    def __init__(self, partial_dir, filename, nr_articles):
+        self.partial_dir = partial_dir
+        self.filename = filename
+        self.full_filename = partial_dir + filename
+        if not os.path.isdir(partial_dir):
+            os.makedirs(partial_dir)
+        # log without the file is stale, it is started over on first append
+        self.seglog = SegmentLog(self.full_filename + PARTMAP_SUFFIX)
+        if os.path.isfile(self.full_filename):
+            self.seglog.load()
+        # begin -> (length, crc32) of parts, incl. those written before a restart
+        self.parts = {}
+        for art_nr, (begin, length, crc) in self.seglog.parts.items():
+            if length and 1 <= art_nr <= nr_articles:
+                self.parts[begin] = (length, crc)
+        self.size = self.seglog.size
+        # md5 / md5 of first 16k: parts are hashed in file order as soon as they are
+        # written (from page cache, md5 state cannot be shared between workers)
+        self.md5 = hashlib.md5()
+        self.md5_16k = hashlib.md5()
+        self.md5_pos = 0
+        self.fd = None
+        self.status = 1
+        self.statusmsg = "ok"
+        # articles sent to workers but not reported back yet
+        self.pending = 0
+        # set by "done" job: (save_dir, ) once the downloader has all articles
+        self.done = None
+        # metrics: parts decoded, sum / max sec. between download and decoding, sum of decode sec.
+        self.nr_parts = 0
+        self.wait_sum = 0
+        self.wait_max = 0
+        self.decode_sum = 0
+
+    # workers report after writing, so the log never claims parts which are not on disk
+    def set_part(self, art_nr, part):
+        size, begin, length, crc = part
+        self.size = size
+        self.parts[begin] = (length, crc)
+        try:
+            self.seglog.append(art_nr, size, begin, length, crc)
+        except OSError:
+            # part is downloaded again on resume
+            pass
+        try:
+            self.advance_md5()
+        except OSError:
+            # no md5 then, renamer / verifier hash the file themselves
+            self.md5_pos = -1
+
+    def advance_md5(self):
+        while self.md5_pos in self.parts:
+            if self.fd is None:
+                self.fd = os.open(self.full_filename, os.O_RDONLY)
+            length, _ = self.parts[self.md5_pos]
+            data = os.pread(self.fd, length, self.md5_pos)
+            if len(data) != length:
+                return
+            self.md5.update(data)
+            if self.md5_pos < MD5_16K_SIZE:
+                self.md5_16k.update(data[:MD5_16K_SIZE - self.md5_pos])
+            self.md5_pos += length
+
+    # (md5, md5 of first 16k) as hex, None if not all parts were hashed
+    def get_md5(self):
+        if self.size is None or self.md5_pos != self.size:
+            return None
+        return self.md5.hexdigest(), self.md5_16k.hexdigest()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.seglog.close()
+
+    # crc32 of whole file from its parts, None if there are gaps (failed articles, parts
+    # from part maps of older versions)
+    def get_crc32(self):
+        if self.size is None:
+            return None
+        crc = 0
+        pos = 0
+        for begin in sorted(self.parts):
+            length, crc0 = self.parts[begin]
+            if begin != pos:
+                return None
+            crc = crc32_combine(crc, crc0, length)
+            pos += length
+        return crc if pos == self.size else None
+
+    def add_timing(self, wait, decode_time):
+        self.nr_parts += 1
+        self.wait_sum += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.decode_sum += decode_time
+
+    def get_timing_str(self):
+        if not self.nr_parts:
+            return "no parts decoded"
+        return "{0} parts, decode time {1:.2f} sec., queue wait avg {2:.0f} / max {3:.0f} ms".format(
+            self.nr_parts, self.decode_sum, self.wait_sum / self.nr_parts * 1000, self.wait_max * 1000)
+
+    def set_error(self, status, statusmsg):
+        self.status = status
+        self.statusmsg = statusmsg
+
+    # moves completed file to save_dir (empty file if no article could be downloaded)
+    def finish(self, save_dir, filewrite_lock):
+        self.close()
+        with open(self.full_filename, "ab"):
+            pass
+        with filewrite_lock:
+            if not os.path.isdir(save_dir):
+                os.makedirs(save_dir)
+            os.replace(self.full_filename, save_dir + self.filename)
+        self.seglog.remove()
+
+
+# hdr = YencHeader of info (see yenc_header.py)
+def decode_article(info, hdr):
+    # part size from =yend / =ypart, guestimate if missing
+    size0 = hdr.get_part_size() if hdr else None
+    if not size0:
+        size0 = int(sum(len(i) for i in info) * 1.1)
+    decoded_data, output_filename, crc, crc_yenc, crc_correct = ginzyenc.decode_usenet_chunks(info, size0)
+    if not isinstance(crc, int):
+        try:
+            crc = int(crc, 16)
+        except Exception:
+            crc = zlib.crc32(decoded_data)
+    return decoded_data, crc & 0xFFFFFFFF
+
+
+# reserves disk space for the whole file (sparse file if the fs cannot)
+def preallocate(fd, size):
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        os.ftruncate(fd, size)
+
+
+# output files of a decoder worker: preallocated to their final size (=ybegin size=)
+# when opened, parts are written with pwrite at their offset, so several workers write
+# to the same file at once without a lock or a buffer of the whole file
+class PartWriter:
+    def __init__(self, maxfiles=PARTWRITER_MAX_FILES):
+        self.maxfiles = maxfiles
+        # full filename -> (fd, inode), lru
+        self.files = OrderedDict()
+
+    def get_fd(self, full_filename, size):
+        try:
+            fd, inode = self.files[full_filename]
+            # file may have been finished (moved away) and started again meanwhile
+            if os.stat(full_filename).st_ino == inode:
+                self.files.move_to_end(full_filename)
+                return fd
+        except (KeyError, FileNotFoundError):
+            pass
+        self.close_file(full_filename)
+        fd = os.open(full_filename, os.O_RDWR | os.O_CREAT, 0o644)
+        st = os.fstat(fd)
+        if st.st_size < size:
+            preallocate(fd, size)
+        self.files[full_filename] = (fd, st.st_ino)
+        while len(self.files) > self.maxfiles:
+            self.close_file(next(iter(self.files)))
+        return fd
+
+    def write(self, full_filename, size, begin, data):
+        os.pwrite(self.get_fd(full_filename, size), data, begin)
+
+    def close_file(self, full_filename):
+        try:
+            fd, _ = self.files.pop(full_filename)
+            os.close(fd)
+        except (KeyError, OSError):
+            pass
+
+    def close(self):
+        for full_filename in list(self.files.keys()):
+            self.close_file(full_filename)
+
+
+# decodes + writes one article, returns (status, statusmsg, (file size, begin, length, crc32) or None)
+def process_article(info0, full_filename, writer, shm_ring, logger):
+    # bodies spilled by the downloader are in the segment file next to the partial file
+    info = resolve_info(shm_ring, read_spilled(os.path.join(os.path.dirname(full_filename), SPILL_FILENAME), info0))
+    if info is None:
+        logger.warning(whoami() + "article body not available anymore in " + full_filename)
+        return -3, "article body lost", None
+    try:
+        hdr = parse_yenc(info)
+        if not hdr or not hdr.size:
+            raise ValueError("no yenc header")
+        size, begin = hdr.size, hdr.get_offset()
+        decoded_data, crc = decode_article(info, hdr)
+    except Exception as e:
+        logger.warning(whoami() + str(e) + ": cannot perform ginzyenc")
+        return -3, "ginzyenc decoding error!", None
+    finally:
+        free_info(shm_ring, info0)
+    try:
+        writer.write(full_filename, size, begin, decoded_data)
+    except Exception as e:
+        logger.error(whoami() + str(e) + " in file " + full_filename)
+        return -4, "file_error", None
+    return 1, "ok", (size, begin, len(decoded_data), crc)
+
+
+def decoder_worker(idx, work_queue, result_queue, stats, mp_loggerqueue, shm_name=None):
+    setproctitle("gzbx." + os.path.basename(__file__) + "." + str(idx))
     logger = mplogging.setup_logger(mp_loggerqueue, __file__)
-    logger.info(whoami() + "starting article decoder process")
+    logger.debug(whoami() + "starting decoder worker #" + str(idx))
 
     sh = SigHandler_Decoder(logger)
     signal.signal(signal.SIGINT, sh.sighandler)
     signal.signal(signal.SIGTERM, sh.sighandler)
 
-    pwdb = PWDBSender()
+    shm_ring = None
+    if shm_name:
+        try:
+            shm_ring = ShmRing.attach(shm_name)
+        except Exception as e:
+            logger.warning(whoami() + str(e) + ": cannot attach shared memory ring")
 
-    bytesfinal = bytearray()
+    # dispatcher may be killed without stopping the pool, we get re-parented then
+    ppid = os.getppid()
+    writer = PartWriter()
     while not TERMINATED:
-        res0 = None
-        decoder_set_idle(True)
-        while not TERMINATED:
-            try:
-                res0 = mp_work_queue0.get_nowait()
+        try:
+            job = work_queue.get(timeout=0.5)
+        except (queue.Empty, EOFError):
+            if os.getppid() != ppid:
+                logger.warning(whoami() + "decoder dispatcher is gone, exiting decoder worker #" + str(idx))
                 break
-            except (queue.Empty, EOFError):
-                pass
-            except Exception as e:
-                logger.warning(whoami() + str(e))
-            time.sleep(0.1)
-        if not res0 or TERMINATED:
-            logger.info(whoami() + "exiting decoder process!")
+            continue
+        except Exception as e:
+            logger.warning(whoami() + str(e))
+            continue
+        if job is None:
             break
-        decoder_set_idle(False)
-
-        infolist, save_dir, filename, filetype = res0
-        logger.debug(whoami() + "starting decoding for " + filename)
-        # del bytes0
-        bytesfinal = bytearray()
-        status = 0   # 1: ok, 0: wrong yenc structure, -1: no crc32, -2: crc32 checksum error, -3: decoding error
-        statusmsg = "ok"
-
-        # ginzyenc
-        full_filename = save_dir + filename
-        i = 0
-        for info in infolist:
-            try:
-                lastline = info[-1].decode("latin-1")
-                m = re.search('size=(.\d+?) ', lastline)
-                if m:
-                    size = int(m.group(1))
-            except Exception as e:
-                logger.warning(whoami() + str(e) + ", guestimate size ...")
-                size = int(sum(len(i) for i in info.lines) * 1.1)
+        key, info0, full_filename, art_nr, ts_queued = job
+        t0 = time.time()
+        wait = max(t0 - ts_queued, 0)
+        status, statusmsg, part = process_article(info0, full_filename, writer, shm_ring, logger)
+        decode_time = time.time() - t0
+        result_queue.put(("result", idx, key, art_nr, status, statusmsg, part, wait, decode_time))
+        stats[idx * DECODER_STATS_FIELDS] += decode_time
+        stats[idx * DECODER_STATS_FIELDS + 1] += 1
+        stats[idx * DECODER_STATS_FIELDS + 2] += part[2] if part else 0
+        stats[idx * DECODER_STATS_FIELDS + 3] += wait
+    writer.close()
+    if shm_ring:
+        shm_ring.close()
+    logger.debug(whoami() + "decoder worker #" + str(idx) + " exited!")
+
+
+class DecoderPool:
+    def __init__(self, nr_workers, result_queue, stats, mp_loggerqueue, shm_name, logger, backlog=None):
+        self.nr_workers = nr_workers
+        self.result_queue = result_queue
+        self.stats = stats
+        # shared (in memory, spilled) bytes counters of the downloader (see article_spill.py)
+        self.backlog = backlog
+        self.mp_loggerqueue = mp_loggerqueue
+        self.shm_name = shm_name
+        self.logger = logger
+        self.workers = [None] * nr_workers
+        self.work_queues = [None] * nr_workers
+        # per worker: (key, art_nr, backlog sizes) of articles sent but not reported,
+        # workers report in order
+        self.jobs = [deque() for _ in range(nr_workers)]
+        for idx in range(nr_workers):
+            self.start_worker(idx)
+
+    def start_worker(self, idx):
+        if self.work_queues[idx] is not None:
+            # queue of a dead worker: unread jobs must not block our exit
+            self.work_queues[idx].cancel_join_thread()
+            self.work_queues[idx].close()
+        self.work_queues[idx] = mp.Queue()
+        self.workers[idx] = mp.Process(target=decoder_worker, args=(idx, self.work_queues[idx], self.result_queue, self.stats,
+                                                                   self.mp_loggerqueue, self.shm_name, ))
+        self.workers[idx].start()
+
+    # least loaded worker gets the article
+    def submit(self, key, info0, full_filename, art_nr, ts_queued):
+        idx = min(range(self.nr_workers), key=lambda i: len(self.jobs[i]))
+        self.jobs[idx].append((key, art_nr, get_backlog_sizes(info0)))
+        self.work_queues[idx].put((key, info0, full_filename, art_nr, ts_queued))
+
+    # result of worker idx arrived, False if worker was restarted meanwhile
+    def set_done(self, idx, key, art_nr):
+        jobs = self.jobs[idx]
+        if not jobs or jobs[0][0] != key or jobs[0][1] != art_nr:
+            return False
+        _, _, (inmem, spilled) = jobs.popleft()
+        add_backlog(self.backlog, -inmem, -spilled)
+        return True
+
+    # articles which will never be reported: no longer in memory / segment file
+    def release_backlog(self, idx):
+        inmem = sum(sizes[0] for _, _, sizes in self.jobs[idx])
+        spilled = sum(sizes[1] for _, _, sizes in self.jobs[idx])
+        self.jobs[idx].clear()
+        add_backlog(self.backlog, -inmem, -spilled)
+
+    # restarts dead workers, returns [(key, art_nr), ...] of lost articles
+    def check_workers(self):
+        lost = []
+        for idx, worker in enumerate(self.workers):
+            if worker.is_alive():
+                continue
+            self.logger.warning(whoami() + "decoder worker #" + str(idx) + " died, restarting ...")
+            lost.extend((key, art_nr) for key, art_nr, _ in self.jobs[idx])
+            self.release_backlog(idx)
+            self.start_worker(idx)
+        return lost
+
+    def stop(self):
+        for q in self.work_queues:
+            q.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+
+def decode_articles(mp_work_queue0, mp_loggerqueue, filewrite_lock, shm_name=None, nr_workers=1, stats=None, backlog=None,
+                    pending=None, result_queue=None):
+    setproctitle("gzbx." + os.path.basename(__file__))
+    logger = mplogging.setup_logger(mp_loggerqueue, __file__)
+    logger.info(whoami() + "starting article decoder process with " + str(nr_workers) + " workers")
+
+    sh = SigHandler_Decoder(logger)
+    signal.signal(signal.SIGINT, sh.sighandler)
+    signal.signal(signal.SIGTERM, sh.sighandler)
+
+    pwdb = PWDBSender()
+
+    if stats is None:
+        stats = mp.Array("d", nr_workers * DECODER_STATS_FIELDS, lock=False)
+    # workers put their results into the input queue as well
+    pool = DecoderPool(nr_workers, mp_work_queue0, stats, mp_loggerqueue, shm_name, logger, backlog=backlog)
+
+    # full partial filename -> PartialFile
+    partial_files = {}
+
+    def finish_file(key):
+        pf = partial_files.pop(key)
+        # before the file shows up in the download dir, sfv check uses it (see gpeewee.py)
+        crc32 = pf.get_crc32()
+        md5 = pf.get_md5()
+        if pf.status == 1:
             try:
-                decoded_data, output_filename, crc, crc_yenc, crc_correct = ginzyenc.decode_usenet_chunks(info, size)
-                #if filename.endswith("part01.rar") and i == 3:
-                #    pass
-                #else:
-                bytesfinal.extend(decoded_data)
+                if crc32 is not None:
+                    pwdb.exc("db_file_set_crc32", [pf.filename, "%08x" % crc32], {})
+                # renamer, verifier and resume use these instead of reading the file again
+                if md5:
+                    pwdb.exc("db_file_set_md5", [pf.filename, md5[0], md5[1]], {})
             except Exception as e:
-                logger.warning(whoami() + str(e) + ": cannot perform ginzyenc")
-                status = -3
-                statusmsg = "ginzyenc decoding error!"
-                # continue decoding, maybe it can be repaired ...?
-            i += 1
-        logger.debug(whoami() + "decoding for " + filename + ": success!")
+                logger.warning(whoami() + str(e) + ": cannot store checksums of " + pf.filename)
         try:
-            with filewrite_lock:
-                if not os.path.isdir(save_dir):
-                    os.makedirs(save_dir)
-                with open(full_filename, "wb") as f0:
-                    f0.write(bytesfinal)
-                    f0.flush()
-                    f0.close()
+            pf.finish(pf.done, filewrite_lock)
+            status, statusmsg = pf.status, pf.statusmsg
         except Exception as e:
             statusmsg = "file_error"
-            logger.error(whoami() + str(e) + " in file " + filename)
+            logger.error(whoami() + str(e) + " in file " + pf.filename)
             status = -4
-        logger.info(whoami() + filename + " decoded with status " + str(status) + " / " + statusmsg)
+        logger.info(whoami() + pf.filename + " decoded with status " + str(status) + " / " + statusmsg + " ("
+                    + pf.get_timing_str() + ")")
         pwdbstatus = 2
         if status in [-3, -4]:
             pwdbstatus = -1
         try:
             # pwdb.db_file_update_status(filename, pwdbstatus)
-            pwdb.exc("db_file_update_status", [filename, pwdbstatus], {})
-            logger.debug(whoami() + "updated DB for " + filename + ", db.status=" + str(pwdbstatus))
+            pwdb.exc("db_file_update_status", [pf.filename, pwdbstatus], {})
+            logger.debug(whoami() + "updated DB for " + pf.filename + ", db.status=" + str(pwdbstatus))
         except Exception as e:
-            logger.error(whoami() + str(e) + ": cannot update DB for " + filename)
-        i += 1
+            logger.error(whoami() + str(e) + ": cannot update DB for " + pf.filename)
+        # the "done" job of this file
+        add_decoder_pending(pending, -1)
+
+    def get_partial_file(partial_dir, filename, nr_articles):
+        key = partial_dir + filename
+        try:
+            return partial_files[key]
+        except KeyError:
+            partial_files[key] = PartialFile(partial_dir, filename, nr_articles)
+            return partial_files[key]
+
+    # downloader keeps articles as PART_QUEUED until they are reported here
+    def report(pf, art_nr, part_status):
+        if result_queue is not None:
+            result_queue.put((pf.filename, art_nr, part_status))
+
+    def set_result(res0):
+        _, idx, key, art_nr, status, statusmsg, part, wait, decode_time = res0
+        pf = partial_files.get(key)
+        if not pool.set_done(idx, key, art_nr):
+            return None
+        add_decoder_pending(pending, -1)
+        if not pf:
+            return None
+        pf.pending -= 1
+        pf.add_timing(wait, decode_time)
+        if status == 1:
+            pf.set_part(art_nr, part)
+            report(pf, art_nr, PART_DONE)
+        else:
+            pf.set_error(status, statusmsg)
+            report(pf, art_nr, PART_FAILED)
+        return pf
+
+    ts_checked = time.time()
+    while not TERMINATED:
+        decoder_set_idle(not any(pf.pending for pf in partial_files.values()))
+        # blocks until there is something to do, wakes up only for the periodic checks
+        try:
+            res0 = mp_work_queue0.get(timeout=DECODER_WAKEUP_INTERVAL)
+        except (queue.Empty, EOFError):
+            res0 = ()
+        except Exception as e:
+            logger.warning(whoami() + str(e))
+            res0 = ()
+        if res0 is None:
+            break
+
+        if time.time() - ts_checked >= DECODER_WAKEUP_INTERVAL:
+            # bodies of a crashed worker are gone, not broken: downloader fetches them again
+            for key, art_nr in pool.check_workers():
+                add_decoder_pending(pending, -1)
+                pf = partial_files.get(key)
+                if pf:
+                    pf.pending -= 1
+                    report(pf, art_nr, PART_MISSING)
+            ts_checked = time.time()
+        if not res0:
+            continue
+
+        # ("result", worker idx, key, art_nr, status, statusmsg, part, queue wait, decode sec.): part written
+        # ("article", info, partial_dir, filename, nr_articles, art_nr, ts queued): decode + write part
+        # ("done", partial_dir, save_dir, filename, nr_articles): all articles downloaded (or failed)
+        if res0[0] == "result":
+            pf = set_result(res0)
+            if pf and pf.done and pf.pending <= 0:
+                finish_file(pf.full_filename)
+            continue
+
+        if res0[0] == "article":
+            _, info0, partial_dir, filename, nr_articles, art_nr, ts_queued = res0
+            try:
+                pf = get_partial_file(partial_dir, filename, nr_articles)
+            except Exception as e:
+                logger.error(whoami() + str(e) + ": cannot open partial file for " + filename)
+                add_decoder_pending(pending, -1)
+                continue
+            pf.pending += 1
+            pool.submit(pf.full_filename, info0, pf.full_filename, art_nr, ts_queued)
+            continue
+
+        _, partial_dir, save_dir, filename, nr_articles = res0
+        try:
+            pf = get_partial_file(partial_dir, filename, nr_articles)
+        except Exception as e:
+            logger.error(whoami() + str(e) + ": cannot open partial file for " + filename)
+            add_decoder_pending(pending, -1)
+            continue
+        pf.done = save_dir
+        if pf.pending <= 0:
+            finish_file(pf.full_filename)
+
+    logger.info(whoami() + "exiting decoder process!")
+    pool.stop()
+    # parts written by now are kept for resume, queued articles are dropped (the queue
+    # is cleared on stop anyway)
+    ts_stop = time.time()
+    while time.time() - ts_stop < 5:
+        try:
+            res0 = mp_work_queue0.get(timeout=0.1)
+        except (queue.Empty, EOFError):
+            break
+        except Exception:
+            break
+        if res0 and res0[0] == "result":
+            set_result(res0)
+        elif res0 and res0[0] == "article":
+            add_backlog(backlog, *[-size for size in get_backlog_sizes(res0[1])])
+    for idx in range(nr_workers):
+        pool.release_backlog(idx)
+    for pf in partial_files.values():
+        pf.close()
+    # downloader may be gone already, do not block on unread results
+    if result_queue is not None:
+        result_queue.cancel_join_thread()
     logger.debug(whoami() + "exited!")
 
 
@@ -0,0 +1,259 @@
+import re
+import heapq
+import random
+import threading
+from itertools import count
+
+from ginzibix.article_table import ArticleTable
+
+
+# articles without remaining servers go to this group, any worker takes them
+# (they are only passed on as "no server left" results)
+ANY_SERVER = ()
+
+# download order of file types: par2 index first (needed for verifying), then small
+# stuff, then rar volumes in volume order, par2vols only come when needed anyway
+FILETYPE_PRIORITY = {"par2": 0, "nfo": 1, "sfv": 1, "rar": 2, "etc": 3, "par2vol": 4}
+# explicitly bumped files go before everything else, except hedged articles
+BUMPED_PRIORITY = -1
+URGENT_PRIORITY = -2
+
+
+# volume number of a rar file: x.part01.rar -> 1, x.rar -> 0, x.r00 -> 1, x.001 -> 1
+def get_rar_volume(filename):
+    gg = re.search(r"[.]part(\d+)[.]rar$", filename, flags=re.IGNORECASE)
+    if gg:
+        return int(gg.group(1))
+    if re.search(r"[.]rar$", filename, flags=re.IGNORECASE):
+        return 0
+    gg = re.search(r"[.]r(\d+)$", filename, flags=re.IGNORECASE)
+    if gg:
+        return int(gg.group(1)) + 1
+    gg = re.search(r"[.](\d{3})$", filename)
+    if gg:
+        return int(gg.group(1))
+    return 0
+
+
+# ready queues of articles, one per group of servers allowed to fetch the article next
+# (= first level of its remaining servers). workers only ever see articles for their
+# server and block on a per-server condition when there is nothing to do.
+# queues are heaps: files are completed one after another in priority order
+# (par2 index, lowest rar volume, ...) instead of all at once in random order.
+# queues only hold integer handles into the nzb's ArticleTable (see article_table.py),
+# article tuples are built when popped
+class ArticleScheduler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.table = ArticleTable()
+        # server group -> heap of (priority, seq, handle)
+        self.queues = {ANY_SERVER: []}
+        # filename -> rank of bump_priority call, later bumps go first
+        self.bumped = {}
+        self.bump_seq = count()
+        self.seq = count()
+        # server name -> server groups containing it, single-server groups first
+        self.server_groups = {}
+        # server name -> condition (on self.lock) for waiting workers
+        self.conditions = {}
+        # callables invoked after articles were added (e.g. to wake up an event loop)
+        self.listeners = []
+        # optional callable article -> article, applied to everything queued (see miss_cache.py)
+        self.article_filter = None
+        # backpressure from the downloader (memory budget exhausted): nothing is popped
+        self.throttled = False
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def get_condition(self, server_name):
+        try:
+            return self.conditions[server_name]
+        except KeyError:
+            self.conditions[server_name] = threading.Condition(self.lock)
+            return self.conditions[server_name]
+
+    def get_queue(self, group):
+        try:
+            return self.queues[group]
+        except KeyError:
+            self.queues[group] = []
+            for server_name in group:
+                groups = self.server_groups.setdefault(server_name, [])
+                groups.append(group)
+                groups.sort(key=len)
+            return self.queues[group]
+
+    def add_listener(self, listener):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        try:
+            self.listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def notify(self, groups):
+        if ANY_SERVER in groups:
+            for condition in self.conditions.values():
+                condition.notify()
+            return
+        servers = set()
+        for group in groups:
+            servers.update(group)
+        for server_name in servers:
+            self.get_condition(server_name).notify()
+
+    # new nzb: queues have to be empty
+    def set_table(self, table):
+        with self.lock:
+            self.table = table
+
+    def get_priority(self, handle):
+        fid = self.table.art_file[handle]
+        filename, filetype, art_nr = self.table.filenames[fid], self.table.filetypes[fid], self.table.art_nr[handle]
+        if filename in self.bumped:
+            return (BUMPED_PRIORITY, -self.bumped[filename], art_nr)
+        volume = get_rar_volume(filename) if filetype == "rar" else 0
+        return (FILETYPE_PRIORITY.get(filetype, FILETYPE_PRIORITY["etc"]), volume, filename, art_nr)
+
+    # moves all queued (and future) articles of filenames to the front
+    def bump_priority(self, filenames):
+        with self.lock:
+            for filename in filenames:
+                self.bumped[filename] = next(self.bump_seq)
+            self.reprioritize_locked()
+
+    # file type / name changed in downloader (pre-analysis, renamer), filetype None = unchanged
+    def update_file(self, old_filename, filename, filetype=None):
+        with self.lock:
+            if filetype:
+                self.table.set_filetype(old_filename, filetype)
+            if filename != old_filename:
+                self.table.rename_file(old_filename, filename)
+                if old_filename in self.bumped:
+                    self.bumped[filename] = self.bumped.pop(old_filename)
+            self.reprioritize_locked()
+
+    # lock has to be held
+    def reprioritize_locked(self):
+        for group, heap in self.queues.items():
+            self.queues[group] = [(priority if priority[0] == URGENT_PRIORITY else self.get_priority(handle), seq, handle)
+                                  for priority, seq, handle in heap]
+            heapq.heapify(self.queues[group])
+
+    def append(self, article):
+        self.extend([article])
+
+    # puts article in front of all others (hedging, see hedging.py)
+    def append_urgent(self, article):
+        self.extend([article], urgent=True)
+
+    # lock has to be held
+    def push_locked(self, handle, urgent):
+        if self.article_filter:
+            article = self.table.get_article(handle)
+            article0 = self.article_filter(article)
+            if article0 is not article:
+                self.table.set_servers(handle, article0[6])
+        group = self.table.get_server_group(handle)
+        priority = (URGENT_PRIORITY,) if urgent else self.get_priority(handle)
+        heapq.heappush(self.get_queue(group), (priority, next(self.seq), handle))
+        self.count += 1
+        return group
+
+    # article tuples (requeued by workers / hedger): remaining servers are stored in the table
+    def extend(self, articles, urgent=False):
+        groups = set()
+        with self.lock:
+            for article in articles:
+                try:
+                    handle = self.table.get_handle(article[0], article[4])
+                except KeyError:
+                    # left over from previous nzb
+                    continue
+                self.table.set_servers(handle, article[6])
+                groups.add(self.push_locked(handle, urgent))
+            self.notify(groups)
+        self.notify_listeners(groups)
+
+    # handles from the downloader, handle_groups = [(remaining_servers, handles), ...];
+    # shuffle only makes sense with urgent (= fifo), otherwise priorities sort them again
+    def extend_handles(self, handle_groups, urgent=False, shuffle=False):
+        groups = set()
+        with self.lock:
+            handles0 = []
+            for remaining_servers, handles in handle_groups:
+                for handle in handles:
+                    self.table.set_servers(handle, remaining_servers)
+                handles0.extend(handles)
+            if shuffle:
+                random.shuffle(handles0)
+            for handle in handles0:
+                groups.add(self.push_locked(handle, urgent))
+            self.notify(groups)
+        self.notify_listeners(groups)
+
+    def notify_listeners(self, groups):
+        if groups:
+            for listener in self.listeners:
+                listener()
+
+    def set_throttled(self, throttled):
+        with self.lock:
+            self.throttled = throttled
+            if not throttled:
+                for condition in self.conditions.values():
+                    condition.notify_all()
+        if not throttled:
+            self.notify_listeners([ANY_SERVER])
+
+    # pops article with best priority over all groups server_name belongs to
+    def pop_locked(self, server_name, include_any=True):
+        if self.throttled:
+            return None
+        if include_any and self.queues[ANY_SERVER]:
+            self.count -= 1
+            return self.table.get_article(heapq.heappop(self.queues[ANY_SERVER])[2])
+        best = None
+        for group in self.server_groups.get(server_name, []):
+            heap = self.queues[group]
+            if heap and (best is None or heap[0] < best[0]):
+                best = heap
+        if best is None:
+            return None
+        self.count -= 1
+        return self.table.get_article(heapq.heappop(best)[2])
+
+    # returns article for server_name or None; waits up to timeout sec. if nothing is ready
+    def pop_for(self, server_name, timeout=None):
+        with self.lock:
+            article = self.pop_locked(server_name)
+            if article is None and timeout:
+                self.get_condition(server_name).wait(timeout)
+                article = self.pop_locked(server_name)
+            return article
+
+    # up to n further articles for server_name without waiting (pipelining)
+    def pop_many_for(self, server_name, n):
+        articles = []
+        with self.lock:
+            while len(articles) < n:
+                article = self.pop_locked(server_name, include_any=False)
+                if article is None:
+                    break
+                articles.append(article)
+        return articles
+
+    def len_for(self, server_name):
+        with self.lock:
+            return sum(len(self.queues[group]) for group in self.server_groups.get(server_name, []))
+
+    def clear(self):
+        with self.lock:
+            for heap in self.queues.values():
+                heap.clear()
+            self.bumped = {}
+            self.count = 0
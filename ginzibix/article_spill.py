@@ -0,0 +1,163 @@
+import os
+
+from ginzibix.mplogging import whoami
+
+# memory budget for article bodies on their way to the decoder: bodies which are not in
+# the shm ring (ring full / off) are held in memory (queues to the decoder) until a
+# decoder worker has written them. above the watermark bodies are appended to a per-nzb
+# segment file in _partial0/ instead and only SpillRef descriptors are queued, the
+# decoder reads them back. if even that is exhausted (memory above budget, segment file
+# at its max. size), the connection workers get backpressure: they stop taking articles
+# until the decoder has caught up.
+
+SPILL_FILENAME = ".segments.gzbxspill"
+# defaults: budget in MiB, spilling starts at watermark * budget, max. MiB in segment file
+# (0 = no spilling, only backpressure)
+MEMORY_BUDGET = 256
+SPILL_WATERMARK = 0.75
+SPILL_MAX = 2048
+# bytes in shared backlog counters (mp.Array("q", 2)), written by downloader + decoder
+BACKLOG_MEMORY = 0
+BACKLOG_SPILLED = 1
+
+
+class SpillRef:
+    __slots__ = ("offset", "length")
+
+    def __init__(self, offset, length):
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getstate__(self):
+        return (self.offset, self.length)
+
+    def __setstate__(self, state):
+        self.offset, self.length = state
+
+
+# (budget, spill watermark, max. spilled) in bytes from config
+def get_memory_config(cfg):
+    try:
+        budget = float(cfg["OPTIONS"]["MEMORY_BUDGET"])
+    except Exception:
+        budget = MEMORY_BUDGET
+    try:
+        spill_max = float(cfg["OPTIONS"]["SPILL_MAX"])
+    except Exception:
+        spill_max = SPILL_MAX
+    budget = int(max(budget, 1) * 1024 * 1024)
+    return budget, int(budget * SPILL_WATERMARK), int(max(spill_max, 0) * 1024 * 1024)
+
+
+# (bytes in memory, bytes spilled) of an article info, bodies in the shm ring do not count
+def get_backlog_sizes(info):
+    if not isinstance(info, list):
+        return 0, 0
+    inmem = spilled = 0
+    for chunk in info:
+        if isinstance(chunk, SpillRef):
+            spilled += chunk.length
+        elif isinstance(chunk, (bytes, bytearray)):
+            inmem += len(chunk)
+    return inmem, spilled
+
+
+# never below 0: bodies queued before a reset_backlog may still be released afterwards
+def add_backlog(backlog, inmem, spilled):
+    if backlog is None or not (inmem or spilled):
+        return
+    with backlog.get_lock():
+        backlog[BACKLOG_MEMORY] = max(backlog[BACKLOG_MEMORY] + inmem, 0)
+        backlog[BACKLOG_SPILLED] = max(backlog[BACKLOG_SPILLED] + spilled, 0)
+
+
+# decoder was killed / restarted: its queued + in-flight bodies are lost and would
+# never be released
+def reset_backlog(backlog):
+    with backlog.get_lock():
+        backlog[BACKLOG_MEMORY] = 0
+        backlog[BACKLOG_SPILLED] = 0
+
+
+# downloader side: appends bodies to the segment file, which is truncated again as soon
+# as the decoder has read back everything
+class ArticleSpill:
+    def __init__(self, filename, logger):
+        self.filename = filename
+        self.logger = logger
+        self.fd = None
+        self.offset = 0
+        self.bytes_spilled = 0
+        self.articles_spilled = 0
+
+    # info ([bytes chunks]) -> [SpillRef], unchanged if it cannot be written
+    def store(self, info):
+        try:
+            if self.fd is None:
+                self.fd = os.open(self.filename, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+                self.offset = 0
+            refs = []
+            offset = self.offset
+            for chunk in info:
+                os.pwrite(self.fd, chunk, offset)
+                refs.append(SpillRef(offset, len(chunk)))
+                offset += len(chunk)
+        except Exception as e:
+            self.logger.warning(whoami() + str(e) + ": cannot spill article to " + self.filename)
+            return info
+        self.offset = offset
+        self.bytes_spilled += sum(ref.length for ref in refs)
+        self.articles_spilled += 1
+        return refs
+
+    # start over at offset 0 once no spilled body is pending in the decoder
+    def truncate_if_drained(self, backlog):
+        if self.fd is None or not self.offset or backlog[BACKLOG_SPILLED] > 0:
+            return
+        try:
+            os.ftruncate(self.fd, 0)
+            self.offset = 0
+        except OSError as e:
+            self.logger.warning(whoami() + str(e) + ": cannot truncate " + self.filename)
+
+    def close(self, remove=True):
+        if self.fd is None:
+            return
+        try:
+            os.close(self.fd)
+            if remove:
+                os.remove(self.filename)
+        except OSError:
+            pass
+        self.fd = None
+        self.offset = 0
+
+    def get_stats(self):
+        return {"file_size": self.offset, "bytes_spilled": self.bytes_spilled, "articles_spilled": self.articles_spilled}
+
+
+# decoder side: list of chunks, possibly SpillRefs -> list of bytes (None if not readable)
+def read_spilled(filename, info):
+    if not isinstance(info, list) or not any(isinstance(chunk, SpillRef) for chunk in info):
+        return info
+    try:
+        fd = os.open(filename, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        chunks = []
+        for chunk in info:
+            if isinstance(chunk, SpillRef):
+                length = chunk.length
+                chunk = os.pread(fd, length, chunk.offset)
+                if len(chunk) != length:
+                    return None
+            chunks.append(chunk)
+        return chunks
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
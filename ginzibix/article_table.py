@@ -0,0 +1,144 @@
+import sys
+from array import array
+from bisect import bisect_left
+
+
+# compact index of all files / articles of an nzb, replaces the old allfileslist
+# (list of [(filename, age, filetype, nr_articles), (art_nr, art_name, bytes), ...]).
+# files and articles get integer ids, per-article data lives in arrays, message-ids
+# are interned. articles of a file have consecutive ids (= handles) sorted by art_nr,
+# so queues only carry ints and the full article tuple
+#     (filename, age, filetype, nr_articles, art_nr, art_name, remaining_servers)
+# is only built when a worker actually downloads it.
+# remaining servers are stored as index into a table of distinct server lists
+# (there are only few: one per retention level / failed server combination)
+class ArticleTable:
+    def __init__(self):
+        # per file
+        self.filenames = []
+        self.filetypes = []
+        self.ages = array("q")
+        self.nr_articles = array("I")
+        # handle of first article of file, one extra entry = no. of articles
+        self.first_article = array("I", [0])
+        self.file_index = {}
+        # per article
+        self.art_file = array("I")
+        self.art_nr = array("I")
+        self.art_names = []
+        self.art_bytes = array("I")
+        self.art_servers = array("H")
+        # distinct remaining_servers as tuples of tuples, index 0 = no servers
+        self.server_sets = [()]
+        self.server_set_index = {(): 0}
+
+    def __len__(self):
+        return len(self.art_names)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["file_index"]
+        del state["server_set_index"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.art_names = [sys.intern(art_name) for art_name in self.art_names]
+        self.file_index = {filename: fid for fid, filename in enumerate(self.filenames)}
+        self.server_set_index = {servers: idx for idx, servers in enumerate(self.server_sets)}
+
+    # converts allfileslist of older versions (still in db)
+    @classmethod
+    def from_allfileslist(cls, allfileslist):
+        table = cls()
+        for file_articles in allfileslist:
+            fid = table.add_file(*file_articles[0])
+            for art_nr, art_name, art_bytescount in sorted(file_articles[1:]):
+                table.add_article(fid, art_nr, art_name, art_bytescount)
+        return table
+
+    # --- building, articles have to be added file by file in ascending art_nr ---
+
+    def add_file(self, filename, age, filetype, nr_articles):
+        fid = len(self.filenames)
+        self.filenames.append(filename)
+        self.filetypes.append(sys.intern(filetype))
+        self.ages.append(age)
+        self.nr_articles.append(nr_articles)
+        self.first_article.append(self.first_article[-1])
+        self.file_index[filename] = fid
+        return fid
+
+    def add_article(self, fid, art_nr, art_name, art_bytescount):
+        handle = len(self.art_names)
+        self.art_file.append(fid)
+        self.art_nr.append(art_nr)
+        self.art_names.append(sys.intern(art_name))
+        self.art_bytes.append(art_bytescount)
+        self.art_servers.append(0)
+        self.first_article[fid + 1] = handle + 1
+        return handle
+
+    # --- files ---
+
+    def nr_files(self):
+        return len(self.filenames)
+
+    def find_file(self, filename):
+        return self.file_index.get(filename)
+
+    def get_file(self, fid):
+        return self.filenames[fid], self.ages[fid], self.filetypes[fid], self.nr_articles[fid]
+
+    def get_articles_of_file(self, fid):
+        return range(self.first_article[fid], self.first_article[fid + 1])
+
+    def set_filetype(self, filename, filetype):
+        fid = self.file_index.get(filename)
+        if fid is not None:
+            self.filetypes[fid] = sys.intern(filetype)
+
+    def rename_file(self, old_filename, filename):
+        fid = self.file_index.pop(old_filename, None)
+        if fid is not None:
+            self.filenames[fid] = filename
+            self.file_index[filename] = fid
+
+    # overall size in bytes
+    def get_bytescount(self):
+        return sum(self.art_bytes)
+
+    # --- articles ---
+
+    def get_handle(self, filename, art_nr):
+        fid = self.file_index[filename]
+        lo, hi = self.first_article[fid], self.first_article[fid + 1]
+        handle = bisect_left(self.art_nr, art_nr, lo, hi)
+        if handle == hi or self.art_nr[handle] != art_nr:
+            raise KeyError((filename, art_nr))
+        return handle
+
+    def set_servers(self, handle, remaining_servers):
+        servers = tuple(tuple(level_servers) for level_servers in remaining_servers)
+        try:
+            idx = self.server_set_index[servers]
+        except KeyError:
+            idx = len(self.server_sets)
+            self.server_sets.append(servers)
+            self.server_set_index[servers] = idx
+        self.art_servers[handle] = idx
+
+    def get_servers(self, handle):
+        return [list(level_servers) for level_servers in self.server_sets[self.art_servers[handle]]]
+
+    # first level of remaining servers, sorted
+    def get_server_group(self, handle):
+        servers = self.server_sets[self.art_servers[handle]]
+        if not servers:
+            return ()
+        return tuple(sorted(servers[0]))
+
+    def get_article(self, handle):
+        fid = self.art_file[handle]
+        return (self.filenames[fid], self.ages[fid], self.filetypes[fid], self.nr_articles[fid], self.art_nr[handle],
+                self.art_names[handle], self.get_servers(handle))
@@ -0,0 +1,135 @@
+import time
+import threading
+from datetime import datetime
+
+from ginzibix.mplogging import whoami
+from ginzibix import get_server_options
+
+
+# re-check time-of-day schedule every n seconds
+SCHEDULE_CHECK_INTERVAL = 30
+
+
+# token bucket with "debt": consumers take what they downloaded and get back
+# how long they have to sleep; the lock only guards the arithmetic, sleeping
+# happens in the caller, so workers never wait on each other
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.lock = threading.Lock()
+        self.rate = 0
+        self.burst = 0
+        self.tokens = 0
+        self.ts = time.monotonic()
+        self.set_rate(rate, burst)
+
+    # rate in bytes/sec, 0 means unlimited
+    def set_rate(self, rate, burst=None):
+        with self.lock:
+            self.rate = max(int(rate), 0)
+            # default burst: 1 sec of traffic, but at least one article
+            self.burst = burst if burst else max(self.rate, 1024 * 1024)
+            self.tokens = min(self.tokens, self.burst)
+            self.ts = time.monotonic()
+
+    def consume(self, nbytes):
+        if not self.rate:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+            self.ts = now
+            self.tokens -= nbytes
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+
+# "08:00-18:00=2048, 22:00-06:00=0" -> [(480, 1080, 2048 * 1024), (1320, 360, 0)]
+def parse_bandwidth_schedule(schedule_str):
+    schedule = []
+    for entry in schedule_str.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        timerange, rate = entry.split("=")
+        start, end = timerange.split("-")
+        start_h, start_m = start.strip().split(":")
+        end_h, end_m = end.strip().split(":")
+        schedule.append((int(start_h) * 60 + int(start_m), int(end_h) * 60 + int(end_m), int(float(rate) * 1024)))
+    return schedule
+
+
+# global + per-server token buckets; rates in config are KiB/s, 0 = unlimited
+class BandwidthLimiter:
+    def __init__(self, cfg, logger):
+        self.logger = logger
+        try:
+            self.config_rate = int(float(cfg["OPTIONS"]["BANDWIDTH_LIMIT"]) * 1024)
+        except Exception:
+            self.config_rate = 0
+        try:
+            self.schedule = parse_bandwidth_schedule(cfg["OPTIONS"]["BANDWIDTH_SCHEDULE"])
+        except Exception as e:
+            if "BANDWIDTH_SCHEDULE" in cfg["OPTIONS"]:
+                self.logger.warning(whoami() + str(e) + ": cannot parse bandwidth_schedule, ignoring")
+            self.schedule = []
+        self.global_bucket = TokenBucket(self.config_rate)
+        self.server_buckets = {}
+        for server_name, options in get_server_options(cfg).items():
+            self.server_buckets[server_name] = TokenBucket(options.get("bandwidth_limit", 0))
+        # global limit set at runtime, overrides config + schedule until reset with None
+        self.override_rate = None
+        self.last_schedule_check = 0
+        self.check_schedule()
+
+    def get_scheduled_rate(self):
+        now = datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            if start <= end and start <= minute < end:
+                return rate
+            # range over midnight
+            if start > end and (minute >= start or minute < end):
+                return rate
+        return self.config_rate
+
+    def check_schedule(self):
+        self.last_schedule_check = time.monotonic()
+        if self.override_rate is not None:
+            rate = self.override_rate
+        else:
+            rate = self.get_scheduled_rate()
+        if rate != self.global_bucket.rate:
+            self.logger.info(whoami() + "setting global bandwidth limit to " + str(rate // 1024) + " KiB/s (0 = unlimited)")
+            self.global_bucket.set_rate(rate)
+
+    # returns seconds the caller has to wait after receiving nbytes from server_name
+    def consume(self, server_name, nbytes):
+        if time.monotonic() - self.last_schedule_check > SCHEDULE_CHECK_INTERVAL:
+            self.check_schedule()
+        delay = self.global_bucket.consume(nbytes)
+        try:
+            delay = max(delay, self.server_buckets[server_name].consume(nbytes))
+        except KeyError:
+            pass
+        return delay
+
+    # server_name None: global limit; rate in KiB/s, None resets global limit to config / schedule
+    def set_limit(self, server_name, rate_kib):
+        rate = int(float(rate_kib) * 1024) if rate_kib is not None else None
+        if server_name is None:
+            self.override_rate = rate
+            self.check_schedule()
+            return True
+        if server_name not in self.server_buckets:
+            self.server_buckets[server_name] = TokenBucket(0)
+        self.server_buckets[server_name].set_rate(rate if rate else 0)
+        self.logger.info(whoami() + "setting bandwidth limit for " + server_name + " to " + str((rate or 0) // 1024) + " KiB/s")
+        return True
+
+    # in KiB/s, 0 = unlimited
+    def get_limits(self):
+        result = {"-ALL SERVERS-": self.global_bucket.rate // 1024}
+        for server_name, bucket in self.server_buckets.items():
+            result[server_name] = bucket.rate // 1024
+        return result
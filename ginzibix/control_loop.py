@@ -15,6 +15,7 @@ import pickle
 
 from ginzibix.mplogging import whoami
 from ginzibix import renamer, nzb_parser, postprocessor, mplogging, downloader, mpconnections
+from ginzibix.shm_ring import ShmRing
 from ginzibix import PWDBSender, make_dirs, mpp_is_alive, mpp_join, GUI_Poller, get_cut_nzbname, get_cut_msg, get_bg_color, get_status_name_and_color,\
     clear_postproc_dirs, get_server_config, get_configured_servers, get_config_for_server, get_free_server_cfg, is_port_in_use, do_mpconnections,\
     kill_mpp
@@ -286,6 +287,8 @@ def ginzi_main(cfg_file, cfg, dirs, subdirs, guiport, mp_loggerqueue):
     articlequeue = None
     resultqueue = None
     mp_work_queue = mp.Queue()
+    # jobs in mp_work_queue the decoder has not done yet, mp_work_queue also carries results
+    mp_decoder_pending = mp.Value("q", 0)
     renamer_result_queue = mp.Queue()
 
     # filewrite_lock = mp.Lock()
@@ -301,6 +304,19 @@ def ginzi_main(cfg_file, cfg, dirs, subdirs, guiport, mp_loggerqueue):
              "verifier": [verifier_parent_pipe, verifier_child_pipe],
              "mpconnector": [mpconnector_parent_pipe, mpconnector_child_pipe, mpconnector_lock]}
 
+    # shared memory ring for article bodies (see shm_ring.py), size in MiB, 0 = off
+    try:
+        shm_ring_size = int(float(cfg["OPTIONS"]["SHM_RING_SIZE"]) * 1024 * 1024)
+    except Exception:
+        shm_ring_size = 256 * 1024 * 1024
+    shm_ring = None
+    if shm_ring_size > 0:
+        try:
+            shm_ring = ShmRing.create(shm_ring_size)
+            logger.debug(whoami() + "created shared memory ring " + shm_ring.name + " with " + str(shm_ring.size) + " bytes")
+        except Exception as e:
+            logger.warning(whoami() + str(e) + ": cannot create shared memory ring, passing articles via zmq")
+
     # load server ts from file
     try:
         server_ts0 = pickle.load(open(dirs["main"] + "ginzibix.ts", "rb"))
@@ -348,7 +364,8 @@ def ginzi_main(cfg_file, cfg, dirs, subdirs, guiport, mp_loggerqueue):
 
     # start mpconnector
     logger.info(whoami() + "starting mpconnector process ...")
-    mpp_connector = mp.Process(target=mpconnections.mpconnector, args=(mpconnector_child_pipe, cfg, server_ts, mp_loggerqueue, ))
+    mpp_connector = mp.Process(target=mpconnections.mpconnector, args=(mpconnector_child_pipe, cfg, server_ts, mp_loggerqueue,
+                                                                           shm_ring.name if shm_ring else None, dirs["main"], ))
     mpp_connector.start()
     mpp["mpconnector"] = mpp_connector
 
@@ -552,7 +569,7 @@ def ginzi_main(cfg_file, cfg, dirs, subdirs, guiport, mp_loggerqueue):
                 try:
                     first_has_changed, moved_nzbs = pwdb.exc("move_nzb_list", [datarec], {"move_and_resetprios": False})
                     if moved_nzbs:
-                        pwdb.exc("db_msg_insert", [nzbname, "NZB(s) moved to history", "warning"], {})
+                        pwdb.exc_async("db_msg_insert", [nzbname, "NZB(s) moved to history", "warning"], {})
                     if first_has_changed:
                         logger.info(whoami() + "first NZB has changed")
                         if dl:
@@ -577,7 +594,7 @@ def ginzi_main(cfg_file, cfg, dirs, subdirs, guiport, mp_loggerqueue):
                     # just get info if first has changed etc.
                     first_has_changed, deleted_nzbs = pwdb.exc("reorder_nzb_list", [datarec], {"delete_and_resetprios": False})
                     if deleted_nzbs:
-                        pwdb.exc("db_msg_insert", [nzbname, "NZB(s) deleted", "warning"], {})
+                        pwdb.exc_async("db_msg_insert", [nzbname, "NZB(s) deleted", "warning"], {})
                     if first_has_changed:
                         logger.info(whoami() + "first NZB has changed")
                         if dl:
@@ -614,10 +631,12 @@ def ginzi_main(cfg_file, cfg, dirs, subdirs, guiport, mp_loggerqueue):
                 if nzbname:
                     pwdb.exc("db_nzb_set_current_nzbobj", [nzbname], {})
                     do_mpconnections(pipes, "reset_timestamps_bdl", None)
+                    # previous downloader + decoder are gone, no article body in the ring is needed anymore
+                    do_mpconnections(pipes, "reset_shm_ring", None)
                     logger.info(whoami() + "got next NZB: " + str(nzbname))
                     dl = downloader.Downloader(cfg, dirs, ct, mp_work_queue, articlequeue, resultqueue, mpp, pipes,
                                                renamer_result_queue, mp_events, nzbname, mp_loggerqueue, filewrite_lock,
-                                               logger)
+                                               logger, shm_ring=shm_ring, decoder_pending=mp_decoder_pending)
                     # if status postprocessing, don't start threads!
                     if pwdb.exc("db_nzb_getstatus", [nzbname], {}) in [0, 1, 2]:
                         if not paused:
@@ -638,7 +657,7 @@ def ginzi_main(cfg_file, cfg, dirs, subdirs, guiport, mp_loggerqueue):
                     if mpp_is_alive(mpp, "post"):
                         mpp["post"].join()
                         mpp["post"] = None
-                    pwdb.exc("db_msg_insert", [nzbname, "downloaded and postprocessed successfully!", "success"], {})
+                    pwdb.exc_async("db_msg_insert", [nzbname, "downloaded and postprocessed successfully!", "success"], {})
                     # set 'flags' for getting next nzb
                     del dl
                     dl = None
@@ -650,10 +669,11 @@ def ginzi_main(cfg_file, cfg, dirs, subdirs, guiport, mp_loggerqueue):
                 elif stat0 == 3 and not mpp_is_alive(mpp, "post"):
                     article_health = 0
                     logger.info(whoami() + "download success, postprocessing NZB " + nzbname)
-                    pwdb.exc("db_msg_insert", [nzbname, "downloaded ok, starting postprocess", "success"], {})
+                    pwdb.exc_async("db_msg_insert", [nzbname, "downloaded ok, starting postprocess", "success"], {})
                     mpp_post = mp.Process(target=postprocessor.postprocess_nzb, args=(nzbname, articlequeue, resultqueue, mp_work_queue, pipes, mpp, mp_events, cfg,
                                                                                       dl.verifiedrar_dir, dl.unpack_dir, dl.nzbdir, dl.rename_dir, dl.main_dir,
-                                                                                      dl.download_dir, dl.dirs, dl.pw_file, mp_loggerqueue, ))
+                                                                                      dl.download_dir, dl.dirs, dl.pw_file, mp_loggerqueue,
+                                                                                      mp_decoder_pending, ))
                     mpp_post.start()
                     mpp["post"] = mpp_post
                 # if download failed
@@ -664,7 +684,7 @@ def ginzi_main(cfg_file, cfg, dirs, subdirs, guiport, mp_loggerqueue):
                                    stopall=False, onlyarticlequeue=False)
                     dl.stop()
                     dl.join()
-                    pwdb.exc("db_msg_insert", [nzbname, "downloaded failed!", "error"], {})
+                    pwdb.exc_async("db_msg_insert", [nzbname, "downloaded failed!", "error"], {})
                     # set 'flags' for getting next nzb
                     del dl
                     dl = None
@@ -682,7 +702,7 @@ def ginzi_main(cfg_file, cfg, dirs, subdirs, guiport, mp_loggerqueue):
                     dl.join()
                     if mpp_is_alive(mpp, "post"):
                         mpp["post"].join()
-                    pwdb.exc("db_msg_insert", [nzbname, "downloaded and/or postprocessing failed!", "error"], {})
+                    pwdb.exc_async("db_msg_insert", [nzbname, "downloaded and/or postprocessing failed!", "error"], {})
                     mpp["post"] = None
                     # set 'flags' for getting next nzb
                     del dl
@@ -709,6 +729,8 @@ def ginzi_main(cfg_file, cfg, dirs, subdirs, guiport, mp_loggerqueue):
                        stopall=True, onlyarticlequeue=False)
     except Exception as e:
         logger.error(whoami() + str(e) + ": closeall error!")
+    if shm_ring:
+        shm_ring.close()
     dl = None
     nzbname = None
     pwdb.exc("db_nzb_set_current_nzbobj", [nzbname], {})
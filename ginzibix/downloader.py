@@ -1,7 +1,9 @@
 import queue
 import re
-import pickle
+import math
+import random
 import shutil
+import glob
 import os
 import time
 import threading
@@ -16,26 +18,45 @@ from ginzibix import par_verifier, par2lib, partial_unrar, article_decoder, pass
 from ginzibix import PWDBSender, mpp_is_alive, mpp_join, GUI_Poller, get_cut_nzbname, get_cut_msg, get_bg_color, get_status_name_and_color,\
     clear_postproc_dirs, get_server_config, get_configured_servers, get_config_for_server, get_free_server_cfg, is_port_in_use, do_mpconnections,\
     kill_mpp
+from ginzibix.yenc_header import parse_yenc
+from ginzibix.article_scheduler import get_rar_volume
+from ginzibix.shm_ring import resolve_info, free_info
+from ginzibix.article_decoder import PART_MISSING, PART_DONE, PART_FAILED, PART_QUEUED, PARTMAP_SUFFIX, load_partmap, add_decoder_pending,\
+    reset_decoder_pending
+from ginzibix.article_spill import ArticleSpill, SPILL_FILENAME, SPILL_WATERMARK, BACKLOG_MEMORY, BACKLOG_SPILLED,\
+    get_memory_config, get_backlog_sizes, add_backlog, reset_backlog
 
 
-empty_yenc_article = [b"=ybegin line=128 size=14 name=ginzi.txt",
-                      b'\x9E\x92\x93\x9D\x4A\x93\x9D\x4A\x8F\x97\x9A\x9E\xA3\x34\x0D\x0A',
-                      b"=yend size=14 crc32=8111111c"]
-
 CRIT_ART_HEALTH_W_PAR = 0.98
 CRIT_ART_HEALTH_WO_PAR = 0.998
 CRIT_ART_HEALTH = 0.80
 CRIT_CONN_HEALTH = 0.7
+# min. no. of checked articles before a sampled sanity check may stop early
+SANITY_MIN_SAMPLES = 200
+
+
+# wilson score interval for ok / n (95% confidence)
+def wilson_interval(ok, n, z=1.96):
+    if n == 0:
+        return 0, 1
+    p = ok / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(centre - half, 0), min(centre + half, 1)
 
 
 # Handles download of a NZB file
 class Downloader(Thread):
     def __init__(self, cfg, dirs, ct, mp_work_queue, articlequeue, resultqueue, mpp, pipes,
-                 renamer_result_queue, mp_events, nzbname, mp_loggerqueue, filewrite_lock, logger):
+                 renamer_result_queue, mp_events, nzbname, mp_loggerqueue, filewrite_lock, logger, shm_ring=None,
+                 decoder_pending=None):
         Thread.__init__(self)
         self.daemon = True
         self.lock = threading.Lock()
         self.filewrite_lock = filewrite_lock
+        # article bodies arrive as descriptors into this ring (see shm_ring.py)
+        self.shm_ring = shm_ring
         self.allfileslist, self.filetypecounter, self.overall_size, self.overall_size_wparvol, self.p2 = (None, ) * 5
         self.p2list = []
         self.mp_loggerqueue = mp_loggerqueue
@@ -48,6 +69,10 @@ class Downloader(Thread):
         self.articlequeue = articlequeue
         self.resultqueue = resultqueue
         self.mp_work_queue = mp_work_queue
+        # jobs in mp_work_queue not yet done by the decoder (see article_decoder.py)
+        self.decoder_pending = decoder_pending if decoder_pending is not None else mp.Value("q", 0)
+        # (filename, art_nr, PART_DONE / PART_FAILED / PART_MISSING) for articles sent to the decoder
+        self.mp_decoder_result_queue = mp.Queue()
         self.renamer_result_queue = renamer_result_queue
         self.mp_unrarqueue = mp.Queue()
         self.mp_nzbparser_outqueue = mp.Queue()
@@ -65,6 +90,7 @@ class Downloader(Thread):
         self.event_paused = threading.Event()
         self.stopped_counter = 0
         self.thread_is_running = False
+        self.bumped_files = []
 
         self.crit_conn_health = CRIT_CONN_HEALTH
         self.crit_art_health_w_par = CRIT_ART_HEALTH_W_PAR
@@ -114,6 +140,21 @@ class Downloader(Thread):
         except Exception as e:
             self.logger.debug(whoami() + str(e) + ": setting connection_idle_timeout to 15 sec.")
             self.connection_idle_timeout = 30
+        # sanity_check_sample: no. of articles to check, 0 = all
+        try:
+            self.sanity_check_sample = int(self.cfg["OPTIONS"]["SANITY_CHECK_SAMPLE"])
+        except Exception:
+            self.sanity_check_sample = 0
+        # decoder pool, stats survive decoder restarts
+        self.decoder_workers = article_decoder.get_nr_decoder_workers(self.cfg)
+        self.decoder_stats = mp.Array("d", self.decoder_workers * article_decoder.DECODER_STATS_FIELDS, lock=False)
+        self.decoder_ts_started = time.time()
+        # memory budget for article bodies queued for the decoder (see article_spill.py),
+        # backlog = bytes (in memory, spilled) not yet written by the decoder
+        self.memory_budget, self.spill_watermark, self.spill_max = get_memory_config(self.cfg)
+        self.decoder_backlog = mp.Array("q", 2)
+        self.memory_low = False
+        self.backpressure = False
 
     def serverhealth(self):
         if self.contains_par_files:
@@ -129,6 +170,7 @@ class Downloader(Thread):
         self.unpack_dir = self.dirs["incomplete"] + self.nzbdir + "_unpack0/"
         self.main_dir = self.dirs["incomplete"] + self.nzbdir
         self.rename_dir = self.dirs["incomplete"] + self.nzbdir + "_renamed0/"
+        self.partial_dir = self.dirs["incomplete"] + self.nzbdir + "_partial0/"
         try:
             if not os.path.isdir(self.dirs["incomplete"]):
                 os.mkdir(self.dirs["incomplete"])
@@ -142,6 +184,8 @@ class Downloader(Thread):
                 os.mkdir(self.download_dir)
             if not os.path.isdir(self.rename_dir):
                 os.mkdir(self.rename_dir)
+            if not os.path.isdir(self.partial_dir):
+                os.mkdir(self.partial_dir)
         except Exception as e:
             self.logger.error(whoami() + str(e) + " in creating dirs!")
             return -1
@@ -172,18 +216,17 @@ class Downloader(Thread):
             return False
 
     def getbytescount(self, filelist):
-        # generate all articles and files
-        bytescount0 = 0
-        for file_articles in filelist:
-            # iterate over all articles in file
-            for i, art0 in enumerate(file_articles):
-                if i == 0:
-                    continue
-                _, _, art_bytescount = art0
-                bytescount0 += art_bytescount
+        bytescount0 = filelist.get_bytescount()
         bytescount0 = bytescount0 / (1024 * 1024 * 1024)
         return bytescount0
 
+    # article table (see article_table.py) + file infos from db, mpconnector gets the
+    # table as well, queues only carry handles into it
+    def get_allfileslist(self):
+        self.allfileslist, self.filetypecounter, self.overall_size, self.overall_size_wparvol, self.already_downloaded_size, self.p2 = self.pwdb.exc(
+            "db_nzb_get_allfile_list", [self.nzbname], {})
+        do_mpconnections(self.pipes, "set_article_table", self.allfileslist)
+
     def inject_articles(self, ftypes, filelist, files0, infolist0, bytescount0_0, filetypecounter, onlyfirstarticle=False):
         # generate all articles and files
         files = files0
@@ -191,14 +234,19 @@ class Downloader(Thread):
         bytescount0 = bytescount0_0
         article_count = 0
         entire_artqueue = []
+        # db status of all files in one round trip
+        filestatuses = []
+        if not onlyfirstarticle:
+            filestatuses = self.pwdb.exc_many([("db_file_getstatus", [filelist.get_file(fid)[0]], {})
+                                               for fid in range(filelist.nr_files())])
         for f in ftypes:
-            for j, file_articles in enumerate(reversed(filelist)):
+            for fid in range(filelist.nr_files()):
                 # iterate over all articles in file
-                filename, age, filetype, nr_articles = file_articles[0]
+                filename, age, filetype, nr_articles = filelist.get_file(fid)
                 if onlyfirstarticle:
                     filestatus = -100
                 else:
-                    filestatus = self.pwdb.exc("db_file_getstatus", [filename], {})
+                    filestatus = filestatuses[fid]
                 # reconcile filetypecounter with db
                 if filetype == f and filestatus != -100:
                     if filename in filetypecounter[f]["filelist"] and filename not in filetypecounter[f]["loadedfiles"] and filestatus not in [0, 1]:
@@ -208,44 +256,70 @@ class Downloader(Thread):
                     level_servers = self.get_level_servers(age)
                     files[filename] = (nr_articles, age, filetype, False, True)
                     if not onlyfirstarticle:
+                        # infolist = part map per file, parts written before are taken over (resume)
                         try:
                             infolist[filename]
                         except Exception:
-                            infolist[filename] = [None] * nr_articles
+                            infolist[filename] = load_partmap(self.partial_dir, filename, nr_articles)
                     if not onlyfirstarticle:
-                        self.pwdb.exc("db_file_update_status", [filename, 1], {})   # status do downloading
-                    for i, art0 in enumerate(file_articles):
-                        if i == 0:
-                            continue
-                        art_nr, art_name, art_bytescount = art0
+                        self.pwdb.exc_async("db_file_update_status", [filename, 1], {})   # status do downloading
+                    handles = []
+                    for handle in filelist.get_articles_of_file(fid):
+                        art_nr = filelist.art_nr[handle]
                         if not onlyfirstarticle:
                             try:
-                                art_downloaded = True if infolist[filename][art_nr - 1] is not None else False
+                                art_downloaded = infolist[filename][art_nr - 1] in (PART_DONE, PART_QUEUED)
                             except Exception:
                                 art_downloaded = False
                             if not art_downloaded:
-                                bytescount0 += art_bytescount
-                                entire_artqueue.append((filename, age, filetype, nr_articles, art_nr, art_name,
-                                                        level_servers))
+                                bytescount0 += filelist.art_bytes[handle]
+                                handles.append(handle)
                         else:
                             if art_nr == 1:
-                                entire_artqueue.append((filename, age, filetype, nr_articles, art_nr, art_name,
-                                                        level_servers))
+                                handles.append(handle)
                                 break
                         article_count += 1
+                    if handles:
+                        entire_artqueue.append((level_servers, handles))
+                    elif not onlyfirstarticle and PART_DONE in infolist[filename] and infolist[filename].count(PART_DONE) == nr_articles:
+                        # decoder has written everything but was stopped before finishing the file
+                        self.finish_file(filename, files, infolist)
         if entire_artqueue:
             do_mpconnections(self.pipes, "push_entire_articlequeue", entire_artqueue)
         bytescount0 = bytescount0 / (1024 * 1024 * 1024)
         return files, infolist, bytescount0, article_count
 
+    # unrarer waits for next volume: move lowest incomplete rar in front of everything else
+    def bump_next_rar(self, files):
+        rars = [(get_rar_volume(filename), filename) for filename, (_, _, filetype, done, _) in files.items()
+                if filetype == "rar" and not done]
+        if not rars:
+            return
+        _, filename = min(rars)
+        if filename in self.bumped_files:
+            return
+        self.logger.debug(whoami() + "unrarer waiting, bumping priority of " + filename)
+        do_mpconnections(self.pipes, "bump_priority", [filename])
+        self.bumped_files.append(filename)
+
     def all_queues_are_empty(self):
         articlequeue_empty = resultqueue_empty = do_mpconnections(self.pipes, "queues_empty", None)
-        mpworkqueue_empty = self.mp_work_queue.qsize() == 0
+        mpworkqueue_empty = self.decoder_pending.value == 0
         return (articlequeue_empty and resultqueue_empty and mpworkqueue_empty)
 
+    # all articles of filename are downloaded (or failed): decoder moves it to download dir
+    def finish_file(self, filename, files, infolist):
+        (f_nr_articles, f_age, f_filetype, f_done, f_failed) = files[filename]
+        # first article carries the filename for the renamer
+        failed0 = infolist[filename][0] == PART_FAILED
+        add_decoder_pending(self.decoder_pending, 1)
+        self.mp_work_queue.put(("done", self.partial_dir, self.download_dir, filename, f_nr_articles))
+        files[filename] = (f_nr_articles, f_age, f_filetype, True, failed0)
+        infolist[filename] = None
+        self.logger.debug(whoami() + "All articles for " + filename + " downloaded, finishing decoding ...")
+
     def process_resultqueue(self, avgmiblist00, infolist00, files00):
         t0 = time.time()
-        global empty_yenc_article
         # read resultqueue + distribute to files
         newresult = False
         avgmiblist = avgmiblist00
@@ -270,7 +344,7 @@ class Downloader(Thread):
                 if ri >= len_resultlist:
                     break
                 # resultarticle = do_mpconnections(self.pipes, "pull_resultqueue", None) 
-                resultarticle = pickle.loads(resultlist[ri])
+                resultarticle = resultlist[ri]
                 ri += 1
                 if not resultarticle:
                     break
@@ -291,42 +365,132 @@ class Downloader(Thread):
                     continue
                 elif inf0 == "failed":
                     failed += 1
-                    inf0 = empty_yenc_article
                     self.logger.error(whoami() + filename + "/" + art_name + ": failed!!")
                 bytesdownloaded = 0
-                if add_bytes:
+                if add_bytes and inf0 != "failed":
                     try:
                         bytesdownloaded = sum(len(i) for i in inf0)
                     except Exception:
                         bytesdownloaded = 0
                     avgmiblist.append((time.time(), bytesdownloaded, download_server))
-                try:
-                    infolist[filename][art_nr - 1] = inf0
-                    newresult = True
-                except TypeError:
+                # file already finished (duplicate) or not of this nzb
+                if infolist.get(filename) is None:
+                    free_info(self.shm_ring, inf0)
                     continue
+                # decode + write article right away, only keep track of which parts are there
+                if inf0 == "failed":
+                    infolist[filename][art_nr - 1] = PART_FAILED
+                else:
+                    inf0 = self.spill_article(inf0)
+                    add_decoder_pending(self.decoder_pending, 1)
+                    self.mp_work_queue.put(("article", inf0, self.partial_dir, filename, nr_articles, art_nr, time.time()))
+                    infolist[filename][art_nr - 1] = PART_QUEUED
+                newresult = True
                 self.allbytesdownloaded0 += bytesdownloaded
-                # check if file is completed and put to mp_queue/decode in case
-                (f_nr_articles, f_age, f_filetype, f_done, f_failed) = files[filename]
-                len_articles_done = len([inf for inf in infolist[filename] if inf])
-                if not f_done and len_articles_done == f_nr_articles:
-                    failed0 = False
-                    if b"name=ginzi.txt" in infolist[filename][0][0]:
-                        failed0 = True
-                    inflist0 = infolist[filename][:]
-                    self.mp_work_queue.put((inflist0, self.download_dir, filename, filetype))
-                    files[filename] = (f_nr_articles, f_age, f_filetype, True, failed0)
-                    infolist[filename] = None
-                    self.logger.debug(whoami() + "All articles for " + filename + " downloaded, calling mp.decode ...")
+                self.check_file_complete(filename, files, infolist)
             except IndexError:
                 break
             except KeyError:
                 pass
         if len(avgmiblist) > 50:
             avgmiblist = avgmiblist[:50]
-        self.pwdb.exc("db_article_set_status", [updatedlist, 1], {})
+        if updatedlist:
+            self.pwdb.exc_async("db_article_set_status", [updatedlist, 1], {})
         return newresult, avgmiblist, infolist, files, failed
 
+    # all articles written (or failed): let decoder finish the file
+    def check_file_complete(self, filename, files, infolist):
+        (f_nr_articles, f_age, f_filetype, f_done, f_failed) = files[filename]
+        if not f_done and PART_MISSING not in infolist[filename] and PART_QUEUED not in infolist[filename]:
+            self.finish_file(filename, files, infolist)
+
+    # articles reported back by the decoder: written, failed to decode or lost (decoder
+    # crashed), the latter are downloaded again
+    def process_decoder_results(self, infolist, files):
+        lost = {}
+        updated = set()
+        while True:
+            try:
+                filename, art_nr, part_status = self.mp_decoder_result_queue.get_nowait()
+            except (queue.Empty, EOFError):
+                break
+            except Exception as e:
+                self.logger.warning(whoami() + str(e) + ": cannot read decoder results")
+                break
+            if infolist.get(filename) is None or infolist[filename][art_nr - 1] != PART_QUEUED:
+                continue
+            infolist[filename][art_nr - 1] = part_status
+            if part_status == PART_MISSING:
+                lost.setdefault(filename, []).append(art_nr)
+            updated.add(filename)
+        for filename, art_nrs in lost.items():
+            self.requeue_articles(filename, art_nrs, files, infolist)
+        for filename in updated:
+            self.check_file_complete(filename, files, infolist)
+        return bool(updated)
+
+    # decoder lost these articles, download them again
+    def requeue_articles(self, filename, art_nrs, files, infolist):
+        self.logger.warning(whoami() + filename + ": " + str(len(art_nrs)) + " article(s) lost by decoder, downloading again")
+        try:
+            handles = [self.allfileslist.get_handle(filename, art_nr) for art_nr in art_nrs]
+            level_servers = self.get_level_servers(files[filename][1])
+            do_mpconnections(self.pipes, "push_entire_articlequeue", [(level_servers, handles)])
+        except Exception as e:
+            self.logger.error(whoami() + str(e) + ": cannot requeue articles of " + filename)
+            for art_nr in art_nrs:
+                infolist[filename][art_nr - 1] = PART_FAILED
+
+    # decoder restarted: whatever it had not reported yet is gone
+    def requeue_queued_articles(self, infolist, files):
+        for filename, partmap in infolist.items():
+            if partmap is None or PART_QUEUED not in partmap:
+                continue
+            art_nrs = [i + 1 for i, part_status in enumerate(partmap) if part_status == PART_QUEUED]
+            for art_nr in art_nrs:
+                partmap[art_nr - 1] = PART_MISSING
+            self.requeue_articles(filename, art_nrs, files, infolist)
+
+    # bodies not in the shm ring go to the segment file above the watermark or when the
+    # system runs low on memory, as long as the segment file is below its max. size
+    def spill_article(self, inf0):
+        inmem, _ = get_backlog_sizes(inf0)
+        if inmem and (self.memory_low or self.decoder_backlog[BACKLOG_MEMORY] + inmem > self.spill_watermark)\
+           and self.decoder_backlog[BACKLOG_SPILLED] + inmem <= self.spill_max:
+            inf0 = self.article_spill.store(inf0)
+        add_backlog(self.decoder_backlog, *get_backlog_sizes(inf0))
+        return inf0
+
+    # backpressure on connection workers while the budget is exhausted (in memory above
+    # budget, segment file full), released below the watermark. returns used memory
+    def check_memory_budget(self):
+        mem = psutil.virtual_memory()
+        self.memory_low = mem.available < self.memory_budget
+        inmem, spilled = self.decoder_backlog[BACKLOG_MEMORY], self.decoder_backlog[BACKLOG_SPILLED]
+        if self.backpressure:
+            exhausted = inmem > self.spill_watermark or spilled > self.spill_max * SPILL_WATERMARK
+        else:
+            exhausted = inmem >= self.memory_budget or (self.spill_max > 0 and spilled >= self.spill_max)
+        if exhausted != self.backpressure:
+            if exhausted:
+                self.logger.warning(whoami() + "memory budget exhausted (" + str(inmem // 1024) + " KiB in memory, "
+                                    + str(spilled // 1024) + " KiB spilled), throttling connections")
+            else:
+                self.logger.info(whoami() + "decoder caught up, releasing connections")
+            self.set_backpressure(exhausted)
+        self.article_spill.truncate_if_drained(self.decoder_backlog)
+        return mem.total - mem.available
+
+    # only the decoder releases backlog, so it has to be dropped when the decoder is gone
+    def reset_decoder_backlog(self):
+        reset_backlog(self.decoder_backlog)
+        reset_decoder_pending(self.decoder_pending)
+        self.check_memory_budget()
+
+    def set_backpressure(self, backpressure):
+        self.backpressure = backpressure
+        do_mpconnections(self.pipes, "set_backpressure", backpressure)
+
     def clear_queues_and_pipes(self, onlyarticlequeue=False):
         self.logger.debug(whoami() + "starting clearing queues & pipes")
         do_mpconnections(self.pipes, "clear_articlequeue", None)
@@ -344,45 +508,86 @@ class Downloader(Thread):
         self.logger.debug(whoami() + "clearing queues & pipes done!")
         return True
 
-    # do sanitycheck on nzb (excluding articles for par2vols)
-    def do_sanity_check(self, allfileslist, files, infolist, bytescount0, filetypecounter):
+    # articles of all non-par2vol files for STAT check as [(level_servers, handles), ...],
+    # random sample of sample articles if 0 < sample < no. of articles
+    def get_sanity_articles(self, allfileslist, sample=0):
+        level_servers = {}
+        handles = []
+        for fid in range(allfileslist.nr_files()):
+            filename, age, filetype, nr_articles = allfileslist.get_file(fid)
+            if filetype == "par2vol":
+                continue
+            level_servers[fid] = self.get_level_servers(age)
+            handles.extend(allfileslist.get_articles_of_file(fid))
+        if 0 < sample < len(handles):
+            handles = random.sample(handles, sample)
+        handles_per_file = {}
+        for handle in handles:
+            handles_per_file.setdefault(allfileslist.art_file[handle], []).append(handle)
+        return [(level_servers[fid], handles0) for fid, handles0 in handles_per_file.items()]
+
+    # do sanitycheck on nzb (excluding articles for par2vols): pipelined STAT on all articles,
+    # or on a random sample if sanity_check_sample > 0. returns article health and its
+    # 95% confidence bounds (= health when all articles were checked)
+    def do_sanity_check(self, allfileslist):
         self.logger.info(whoami() + "performing sanity check")
+        if self.filetypecounter["par2vol"]["max"] > 0:
+            crit_health = self.crit_art_health_w_par
+        else:
+            crit_health = self.crit_art_health_wo_par
+        articles = self.get_sanity_articles(allfileslist, sample=self.sanity_check_sample)
+        nr_sanity_articles = sum(len(handles) for _, handles in articles)
+        sampling = 0 < self.sanity_check_sample <= nr_sanity_articles
         do_mpconnections(self.pipes, "set_tmode_sanitycheck", None)
-        sanity_injects = ["rar", "sfv", "nfo", "etc", "par2"]
-        files, infolist, bytescount0, article_count = self.inject_articles(sanity_injects, allfileslist, files, infolist, bytescount0, filetypecounter)
-        artsize0 = do_mpconnections(self.pipes, "len_articlequeue", None)
-        self.logger.info(whoami() + "Checking sanity on " + str(artsize0) + " articles")
-        do_mpconnections(self.pipes, "clear_articlequeue", None)
+        # random order, otherwise the scheduler sorts by file
+        do_mpconnections(self.pipes, "push_entire_articlequeue_unordered", articles)
+        self.logger.info(whoami() + "Checking sanity on " + str(nr_sanity_articles) + " articles" + (" (sample)" if sampling else ""))
         nr_articles = 0
         nr_ok_articles = 0
-        while True:
-            try:
-                resultarticle = do_mpconnections(self.pipes, "pull_resultqueue", None)
-                if not resultarticle:
+        tt_idle_start = time.time()
+        while not self.event_stopped.isSet() and nr_articles < nr_sanity_articles and time.time() - tt_idle_start < self.connection_idle_timeout:
+            resultarticle = do_mpconnections(self.pipes, "pull_resultqueue", None)
+            if not resultarticle:
+                time.sleep(0.05)
+                continue
+            tt_idle_start = time.time()
+            nr_articles += 1
+            _, _, _, _, _, artname, _, status, _ = resultarticle
+            if status != "failed":
+                nr_ok_articles += 1
+            else:
+                self.pwdb.exc_async("db_msg_insert", [self.nzbname, "cannot download " + artname, "info"], {})
+                self.logger.debug(whoami() + "cannot download " + artname)
+            # decide early: surely below critical health, or articles missing but surely repairable
+            if sampling and nr_articles >= SANITY_MIN_SAMPLES:
+                low, high = wilson_interval(nr_ok_articles, nr_articles)
+                if high < crit_health or (nr_ok_articles < nr_articles and low >= crit_health):
+                    self.logger.info(whoami() + "sanity check decided after " + str(nr_articles) + " articles")
                     break
-                nr_articles += 1
-                _, _, _, _, _, artname, _, status, _ = resultarticle
-                if status != "failed":
-                    nr_ok_articles += 1
-                else:
-                    self.pwdb.exc("db_msg_insert", [self.nzbname, "cannot download " + artname, "info"], {})
-                    self.logger.debug(whoami() + "cannot download " + artname)
-            except (queue.Empty, EOFError, IndexError):
-                break
+        do_mpconnections(self.pipes, "clear_articlequeue", None)
+        # drop results of STATs still in flight
+        tt_idle_start = time.time()
+        while time.time() - tt_idle_start < 1:
+            if do_mpconnections(self.pipes, "pull_resultqueue", None):
+                tt_idle_start = time.time()
+            else:
+                time.sleep(0.1)
+        do_mpconnections(self.pipes, "set_tmode_download", None)
         if nr_articles == 0:
-            a_health = 0
+            return 0, 0, 0
+        a_health = nr_ok_articles / nr_articles
+        if sampling:
+            low, high = wilson_interval(nr_ok_articles, nr_articles)
         else:
-            a_health = nr_ok_articles / (nr_articles)
-        self.logger.info(whoami() + "article health: {0:.4f}".format(a_health * 100) + "%")
-        do_mpconnections(self.pipes, "set_tmode_download", None)
-        return a_health
+            low = high = a_health
+        self.logger.info(whoami() + "article health: {0:.4f}% ({1:.4f}% - {2:.4f}%)".format(a_health * 100, low * 100, high * 100))
+        return a_health, low, high
 
     def do_pre_analyze(self):
-        res = self.pwdb.exc("db_nzb_get_allfile_list", [self.nzbname], {})
-        self.allfileslist, self.filetypecounter, self.overall_size, self.overall_size_wparvol, self.already_downloaded_size, self.p2 = res
+        self.get_allfileslist()
         # hier noch:
         #   - filetype ändern
-        self.pwdb.exc("db_msg_insert", [self.nzbname, "Performing NZB pre-analysis for obfusction detection", "info"], {})
+        self.pwdb.exc_async("db_msg_insert", [self.nzbname, "Performing NZB pre-analysis for obfusction detection", "info"], {})
         self.logger.info(whoami() + "performing pre-analysis")
         do_mpconnections(self.pipes, "set_tmode_download", None)
         injects = ["rar", "sfv", "nfo", "etc", "par2", "par2vol"]
@@ -406,15 +611,17 @@ class Downloader(Thread):
                 if inf0 == "failed":
                     status = -1
                     continue
+                info = resolve_info(self.shm_ring, inf0)
+                free_info(self.shm_ring, inf0)
+                inf0 = info
+                if not inf0:
+                    continue
                 ftype = old_filetype
-                try:
-                    lastline = inf0[-1].decode("latin-1")
-                    m = re.search('size=(.\d+?) ', lastline)
-                    if m:
-                        size = int(m.group(1))
-                except Exception as e:
-                    self.logger.warning(whoami() + str(e) + ", now estimating size ...")
-                    size = int(sum(len(i) for i in inf0.lines) * 1.1)
+                hdr = parse_yenc(inf0)
+                size = hdr.get_part_size() if hdr else None
+                if not size:
+                    self.logger.warning(whoami() + filename + ": no part size in yenc header, now estimating size ...")
+                    size = int(sum(len(i) for i in inf0) * 1.1)
                 try:
                     decoded, _, _, _, _ = ginzyenc.decode_usenet_chunks(inf0, size)
                 except Exception:
@@ -441,11 +648,8 @@ class Downloader(Thread):
                     self.filetypecounter[ftype]["max"] += 1
                     # self.filetypecounter[ftype]["filelist"].sort()
                     # update allfileslist
-                    for i, o_lists in enumerate(self.allfileslist):
-                        o_orig_name, o_age, o_type, o_nr_articles = o_lists[0]
-                        if o_orig_name == filename:
-                            self.allfileslist[i][0] = (filename, o_age, ftype, o_nr_articles)
-                            break
+                    self.allfileslist.set_filetype(filename, ftype)
+                    do_mpconnections(self.pipes, "update_file", (filename, filename, ftype))
                     # overall_size_wparvol
                     if old_filetype == "par2vol" or ftype == "par2vol":
                         fsize = self.pwdb.exc("db_file_getsize", [filename], {})
@@ -465,17 +669,16 @@ class Downloader(Thread):
         if obfusc_detected:
             self.pwdb.exc("db_nzb_store_allfile_list", [self.nzbname, self.allfileslist, self.filetypecounter, self.overall_size,
                                                         self.overall_size_wparvol, self.p2], {})
-            self.pwdb.exc("db_msg_insert", [self.nzbname, "Obfuscations detected - setting new file types", "info"], {})
+            self.pwdb.exc_async("db_msg_insert", [self.nzbname, "Obfuscations detected - setting new file types", "info"], {})
             self.logger.warning(whoami() + "Obfuscations detected - setting new file types")
 
-            self.allfileslist, self.filetypecounter, self.overall_size, self.overall_size_wparvol, self.already_downloaded_size, self.p2 = self.pwdb.exc(
-                "db_nzb_get_allfile_list", [self.nzbname], {})
+            self.get_allfileslist()
         else:
-            self.pwdb.exc("db_msg_insert", [self.nzbname, "No obfuscations detected!", "info"], {})
+            self.pwdb.exc_async("db_msg_insert", [self.nzbname, "No obfuscations detected!", "info"], {})
             self.logger.warning(whoami() + "No obfuscations detected!")
         if status == -1:
             self.logger.warning(whoami() + "Not all files could be checked for obfuscation, articles missing ...")
-            self.pwdb.exc("db_msg_insert", [self.nzbname, "Not all files could be checked for obfuscation, articles missing ...", "warning"], {})
+            self.pwdb.exc_async("db_msg_insert", [self.nzbname, "Not all files could be checked for obfuscation, articles missing ...", "warning"], {})
         return status
 
     # main download routine
@@ -496,8 +699,7 @@ class Downloader(Thread):
 
         # if preanalysed:
         if self.pwdb.exc("db_nzb_get_preanalysis_status", [nzbname], {}) == 1:
-            self.allfileslist, self.filetypecounter, self.overall_size, self.overall_size_wparvol, self.already_downloaded_size, self.p2 = self.pwdb.exc(
-                "db_nzb_get_allfile_list", [nzbname], {})
+            self.get_allfileslist()
         else:
             # do pre analysis
             self.do_pre_analyze()
@@ -511,25 +713,21 @@ class Downloader(Thread):
         # get list of par2 files
         self.p2list = self.pwdb.exc("db_p2_get_p2list", [self.nzbname], {})
 
-        # read infolist
-        try:
-            nzbdir = re.sub(r"[.]nzb$", "", nzbname, flags=re.IGNORECASE) + "/"
-            fn = self.dirs["incomplete"] + nzbdir + "infl_" + nzbname + ".gzbx"
-            with open(fn, "rb") as fp:
-                infolist = pickle.load(fp)
+        # resume: segment logs of partially written files are replayed in inject_articles
+        if glob.glob(self.partial_dir + "*" + PARTMAP_SUFFIX) + glob.glob(self.partial_dir + ".*" + PARTMAP_SUFFIX):
             self.allbytesdownloaded0 = int(self.already_downloaded_size * (1024 * 1024 * 1024))
             # force recheck of password in order to restart unrarer
             self.pwdb.exc("db_nzb_set_ispw_checked", [nzbname, False], {})
-        except Exception as e:
-            self.logger.warning(whoami() + str(e) + ": cannot load infolist from file")
-            infolist = {}
 
         self.logger.info(whoami() + "downloading " + nzbname)
-        self.pwdb.exc("db_msg_insert", [nzbname, "initializing download", "info"], {})
+        self.pwdb.exc_async("db_msg_insert", [nzbname, "initializing download", "info"], {})
 
         # init variables
         self.logger.debug(whoami() + "download: init variables")
         self.mpp_decoder = None
+        # previous decoder is gone and its queue cleared (control_loop.clear_download)
+        reset_decoder_pending(self.decoder_pending)
+        self.article_spill = ArticleSpill(self.partial_dir + SPILL_FILENAME, self.logger)
         article_failed = 0
         inject_set0 = []
         avgmiblist = []
@@ -587,18 +785,19 @@ class Downloader(Thread):
             # sanity check
             inject_set_sanity = []
             if self.cfg["OPTIONS"]["SANITY_CHECK"].lower() == "yes" and not self.pwdb.exc("db_nzb_loadpar2vols", [nzbname], {}):
-                self.pwdb.exc("db_msg_insert", [nzbname, "checking for sanity", "info"], {})
-                sanity0 = self.do_sanity_check(self.allfileslist, files, infolist, bytescount0, self.filetypecounter)
+                self.pwdb.exc_async("db_msg_insert", [nzbname, "checking for sanity", "info"], {})
+                sanity0, _, sanity_high = self.do_sanity_check(self.allfileslist)
                 if sanity0 < 1:
-                    if (self.filetypecounter["par2vol"]["max"] > 0 and sanity0 < self.crit_art_health_w_par) or\
-                       (self.filetypecounter["par2vol"]["max"] == 0 and sanity0 < self.crit_art_health_wo_par):
-                        self.pwdb.exc("db_msg_insert", [nzbname, "Sanity less than criticical health level, exiting", "error"], {})
+                    # with sampling: only give up if health is below critical level with 95% confidence
+                    if (self.filetypecounter["par2vol"]["max"] > 0 and sanity_high < self.crit_art_health_w_par) or\
+                       (self.filetypecounter["par2vol"]["max"] == 0 and sanity_high < self.crit_art_health_wo_par):
+                        self.pwdb.exc_async("db_msg_insert", [nzbname, "Sanity less than criticical health level, exiting", "error"], {})
                         self.results = nzbname, ((bytescount0, self.allbytesdownloaded0, availmem0, avgmiblist, self.filetypecounter, nzbname, article_health,
                                                   self.overall_size, self.already_downloaded_size, self.p2, self.overall_size_wparvol,
                                                   self.allfileslist)), "download failed", self.main_dir
                         sys.exit()
 
-                    self.pwdb.exc("db_msg_insert", [nzbname, "Sanity less than 100%, preloading par2vols!", "warning"], {})
+                    self.pwdb.exc_async("db_msg_insert", [nzbname, "Sanity less than 100%, preloading par2vols!", "warning"], {})
                     self.pwdb.exc("db_nzb_update_loadpar2vols", [nzbname, True], {})
                     self.overall_size = self.overall_size_wparvol
                     self.logger.info(whoami() + "queuing par2vols")
@@ -608,11 +807,15 @@ class Downloader(Thread):
                     time.sleep(0.5)
                     do_mpconnections(self.pipes, "resume", None)
                 else:
-                    self.pwdb.exc("db_msg_insert", [nzbname, "Sanity is 100%, all OK!", "info"], {})
+                    self.pwdb.exc_async("db_msg_insert", [nzbname, "Sanity is 100%, all OK!", "info"], {})
 
             # start decoder mpp
             self.logger.debug(whoami() + "starting decoder process ...")
-            self.mpp_decoder = mp.Process(target=article_decoder.decode_articles, args=(self.mp_work_queue, self.mp_loggerqueue, self.filewrite_lock, ))
+            self.mpp_decoder = mp.Process(target=article_decoder.decode_articles, args=(self.mp_work_queue, self.mp_loggerqueue, self.filewrite_lock,
+                                                                                            self.shm_ring.name if self.shm_ring else None,
+                                                                                            self.decoder_workers, self.decoder_stats,
+                                                                                            self.decoder_backlog, self.decoder_pending,
+                                                                                            self.mp_decoder_result_queue, ))
             self.mpp_decoder.start()
             self.mpp["decoder"] = self.mpp_decoder
 
@@ -632,7 +835,7 @@ class Downloader(Thread):
 
         # download loop until articles downloaded
         oldrarcounter = 0
-        self.pwdb.exc("db_msg_insert", [nzbname, "downloading", "info"], {})
+        self.pwdb.exc_async("db_msg_insert", [nzbname, "downloading", "info"], {})
 
         stopped_max_counter = 5
         getnextnzb = False
@@ -647,13 +850,16 @@ class Downloader(Thread):
 
         while self.stopped_counter < stopped_max_counter:
 
-            len_p2list = self.pwdb.exc("db_p2_get_len_p2list", [self.nzbname], {})
+            len_p2list, unrarstatus = self.pwdb.exc_many([("db_p2_get_len_p2list", [self.nzbname], {}),
+                                                          ("db_nzb_get_unrarstatus", [nzbname], {})])
 
             # monitor idle times of unrarer to avoid deadlock further down
             if unrarer_idle_starttime == sys.maxsize and self.event_unrareridle.is_set():
                 unrarer_idle_starttime = time.time()
             elif unrarer_idle_starttime != sys.maxsize and not self.event_unrareridle.is_set():
                 unrarer_idle_starttime = sys.maxsize
+            if self.event_unrareridle.is_set() and not self.event_stopped.isSet():
+                self.bump_next_rar(files)
 
             # if terminated: ensure that all tasks are processed
             if self.event_stopped.wait(0.25):
@@ -685,7 +891,6 @@ class Downloader(Thread):
                 self.logger.info(whoami() + "unrarer re-started, but should be dead, stopping ...")
                 kill_mpp(self.mpp, "unrarer")
             if not self.event_stopped.isSet():
-                unrarstatus = self.pwdb.exc("db_nzb_get_unrarstatus", [nzbname], {})
                 # if len p2list > 1: stop unrarer
                 if mpp_is_alive(self.mpp, "unrarer") and len_p2list > 1:
                     kill_mpp(self.mpp, "unrarer")
@@ -725,9 +930,16 @@ class Downloader(Thread):
             if self.event_stopped.isSet() and mpp_is_alive(self.mpp, "decoder"):
                 self.logger.info(whoami() + "decoder re-started, but should be dead, stopping ...")
                 kill_mpp(self.mpp, "decoder")
+                self.reset_decoder_backlog()
             if not self.event_stopped.isSet() and self.mpp["decoder"] and not mpp_is_alive(self.mpp, "decoder"):
                 self.logger.debug(whoami() + "restarting decoder process ...")
-                self.mpp_decoder = mp.Process(target=article_decoder.decode_articles, args=(self.mp_work_queue, self.mp_loggerqueue, self.filewrite_lock, ))
+                self.reset_decoder_backlog()
+                self.requeue_queued_articles(infolist, files)
+                self.mpp_decoder = mp.Process(target=article_decoder.decode_articles, args=(self.mp_work_queue, self.mp_loggerqueue, self.filewrite_lock,
+                                                                                            self.shm_ring.name if self.shm_ring else None,
+                                                                                            self.decoder_workers, self.decoder_stats,
+                                                                                            self.decoder_backlog, self.decoder_pending,
+                                                                                            self.mp_decoder_result_queue, ))
                 self.mpp_decoder.start()
                 self.mpp["decoder"] = self.mpp_decoder
 
@@ -736,7 +948,7 @@ class Downloader(Thread):
 
                 try:
                     filename, full_filename, filetype, old_filename, old_filetype = self.renamer_result_queue.get_nowait()
-                    self.pwdb.exc("db_msg_insert", [nzbname, "downloaded & renamed " + filename, "info"], {})
+                    self.pwdb.exc_async("db_msg_insert", [nzbname, "downloaded & renamed " + filename, "info"], {})
                     # have files been renamed ?
                     if old_filename != filename or old_filetype != filetype:
                         self.logger.info(whoami() + old_filename + "/" + old_filetype + " changed to " + filename + " / " + filetype)
@@ -748,10 +960,9 @@ class Downloader(Thread):
                         self.filetypecounter[filetype]["max"] += 1
                         self.filetypecounter[filetype]["loadedfiles"].append(filename)
                         # update allfileslist
-                        for i, o_lists in enumerate(self.allfileslist):
-                            o_orig_name, o_age, o_type, o_nr_articles = o_lists[0]
-                            if o_orig_name == old_filename:
-                                self.allfileslist[i][0] = (filename, o_age, o_type, o_nr_articles)
+                        self.allfileslist.set_filetype(old_filename, filetype)
+                        self.allfileslist.rename_file(old_filename, filename)
+                        do_mpconnections(self.pipes, "update_file", (old_filename, filename, filetype))
                     else:
                         self.logger.debug(whoami() + "moved " + filename + " to renamed dir")
                         self.filetypecounter[filetype]["counter"] += 1
@@ -779,7 +990,7 @@ class Downloader(Thread):
             if not self.event_stopped.isSet() and not loadpar2vols and loadpar2vols0:
                 loadpar2vols = True
                 if self.filetypecounter["par2vol"]["max"] > 0:
-                    self.pwdb.exc("db_msg_insert", [nzbname, "rar(s) corrupt, loading par2vol files", "info"], {})
+                    self.pwdb.exc_async("db_msg_insert", [nzbname, "rar(s) corrupt, loading par2vol files", "info"], {})
                     self.pwdb.exc("db_nzb_update_loadpar2vols", [nzbname, True], {})
                     self.overall_size = self.overall_size_wparvol
                     self.logger.info(whoami() + "queuing par2vols")
@@ -790,7 +1001,7 @@ class Downloader(Thread):
                     article_count += article_count0
                 else:
                     self.logger.error(whoami() + "rar files corrupt but cannot repair (no par2 files), exiting download")
-                    self.pwdb.exc("db_msg_insert", [nzbname, "rar files corrupt but cannot repair (no par2 files), exiting download", "error"], {})
+                    self.pwdb.exc_async("db_msg_insert", [nzbname, "rar files corrupt but cannot repair (no par2 files), exiting download", "error"], {})
                     self.pwdb.exc("db_nzb_update_status", [nzbname, -2], {})
                     return_reason = "download failed"
                     self.results = nzbname, ((bytescount0, self.allbytesdownloaded0, availmem0, avgmiblist, self.filetypecounter, nzbname, article_health,
@@ -815,7 +1026,7 @@ class Downloader(Thread):
                     self.logger.debug(whoami() + "unrarer running but stopping/postponing now due to broken rar file!")
                     kill_mpp(self.mpp, "unrarer")
                     self.pwdb.exc("db_nzb_update_unrar_status", [nzbname, 0], {})
-                    self.pwdb.exc("db_msg_insert", [nzbname, "par repair needed, postponing unrar", "info"], {})
+                    self.pwdb.exc_async("db_msg_insert", [nzbname, "par repair needed, postponing unrar", "info"], {})
 
             # check if unrarer should be started
             if not self.event_stopped.isSet() and unrarstatus == 0 and self.filetypecounter["rar"]["counter"] > oldrarcounter\
@@ -834,7 +1045,7 @@ class Downloader(Thread):
                         self.logger.warning(whoami() + "cannot test rar if pw protected, something is wrong: " + str(is_pwp) + ", exiting ...")
                         self.pwdb.exc("db_nzb_update_status", [nzbname, -2], {})  # status download failed
                         return_reason = "download failed"
-                        self.pwdb.exc("db_msg_insert", [nzbname, "download failed due to pw test not possible", "error"], {})
+                        self.pwdb.exc_async("db_msg_insert", [nzbname, "download failed due to pw test not possible", "error"], {})
                         self.results = nzbname, ((bytescount0, self.allbytesdownloaded0, availmem0, avgmiblist, self.filetypecounter, nzbname, article_health,
                                                   self.overall_size, self.already_downloaded_size, self.p2, self.overall_size_wparvol,
                                                   self.allfileslist)), return_reason, self.main_dir
@@ -846,7 +1057,7 @@ class Downloader(Thread):
                     if is_pwp == 1:
                         # if pw protected -> postpone password test + unrar
                         self.pwdb.exc("db_nzb_set_ispw", [nzbname, True], {})
-                        self.pwdb.exc("db_msg_insert", [nzbname, "rar archive is password protected", "warning"], {})
+                        self.pwdb.exc_async("db_msg_insert", [nzbname, "rar archive is password protected", "warning"], {})
                         self.logger.info(whoami() + "rar archive is pw protected, postponing unrar to postprocess ...")
                     elif is_pwp == -1 and len_p2list < 2:
                         # if not pw protected -> normal unrar
@@ -897,6 +1108,12 @@ class Downloader(Thread):
 
             # read resultqueue + decode via mp
             newresult, avgmiblist, infolist, files, failed = self.process_resultqueue(avgmiblist, infolist, files)
+            if self.process_decoder_results(infolist, files):
+                newresult = True
+            try:
+                availmem0 = self.check_memory_budget()
+            except Exception as e:
+                self.logger.debug(whoami() + str(e) + ": cannot check memory budget")
             article_failed += failed
             if article_count != 0:
                 article_health = 1 - article_failed / article_count
@@ -932,11 +1149,11 @@ class Downloader(Thread):
                     self.logger.info(whoami() + "articles missing and cannot repair, exiting download")
                     self.pwdb.exc("db_nzb_update_status", [nzbname, -2], {})
                     if par2failed:
-                        self.pwdb.exc("db_msg_insert", [nzbname, "par2 file broken/not available on servers", "error"], {})
+                        self.pwdb.exc_async("db_msg_insert", [nzbname, "par2 file broken/not available on servers", "error"], {})
                     elif rarfailed_wo_parvol:
-                        self.pwdb.exc("db_msg_insert", [nzbname, "rar file broken and repair files available", "error"], {})
+                        self.pwdb.exc_async("db_msg_insert", [nzbname, "rar file broken and repair files available", "error"], {})
                     else:
-                        self.pwdb.exc("db_msg_insert", [nzbname, "critical health threashold exceeded", "error"], {})
+                        self.pwdb.exc_async("db_msg_insert", [nzbname, "critical health threashold exceeded", "error"], {})
                     return_reason = "download failed"
                     self.results = nzbname, ((bytescount0, self.allbytesdownloaded0, availmem0, avgmiblist, self.filetypecounter, nzbname, article_health,
                                               self.overall_size, self.already_downloaded_size, self.p2, self.overall_size_wparvol,
@@ -953,7 +1170,7 @@ class Downloader(Thread):
                     article_count += article_count0
                     self.overall_size = self.overall_size_wparvol
                     loadpar2vols = True
-                    self.pwdb.exc("db_msg_insert", [nzbname, "rar(s) corrupt, loading par2vol files", "info"], {})
+                    self.pwdb.exc_async("db_msg_insert", [nzbname, "rar(s) corrupt, loading par2vol files", "info"], {})
 
             # check if all files are downloaded
             getnextnzb = True
@@ -981,7 +1198,7 @@ class Downloader(Thread):
                     dtt_bytes_dl = do_mpconnections(self.pipes, "get_bytesdownloaded", None) - self.tt_bytes_downloaded
                     dtt_wait = time.time() - self.tt_wait_for_completion
                     if not self.tt_msg_issued and dtt_wait > 2:
-                        self.pwdb.exc("db_msg_insert", [nzbname, "download slow!", "warning"], {})
+                        self.pwdb.exc_async("db_msg_insert", [nzbname, "download slow!", "warning"], {})
                         self.tt_msg_issued = True
                     if dtt_wait > self.connection_idle_timeout and dtt_bytes_dl <= 0:
                         dl_stuck = True
@@ -995,7 +1212,7 @@ class Downloader(Thread):
             if self.event_unrareridle.is_set() and (getnextnzb or self.all_queues_are_empty()):
                 if not self.tt_wait_for_completion_unrar:
                     self.tt_wait_for_completion_unrar = time.time()
-                    self.pwdb.exc("db_msg_insert", [nzbname, "waiting for unrarer to resume/finish", "info"], {})
+                    self.pwdb.exc_async("db_msg_insert", [nzbname, "waiting for unrarer to resume/finish", "info"], {})
                 else:
                     if time.time() - self.tt_wait_for_completion_unrar > self.connection_idle_timeout:
                         unrarer_is_stuck = True
@@ -1005,11 +1222,11 @@ class Downloader(Thread):
             # if unrarer stuck or all files are downloaded and still articles in queue --> inconsistency, exit!
             if unrarer_is_stuck or dl_stuck or (getnextnzb and not self.all_queues_are_empty()):
                 if unrarer_is_stuck:
-                    self.pwdb.exc("db_msg_insert", [nzbname, "unrarer is stuck!", "error"], {})
+                    self.pwdb.exc_async("db_msg_insert", [nzbname, "unrarer is stuck!", "error"], {})
                 elif dl_stuck:
-                    self.pwdb.exc("db_msg_insert", [nzbname, "download is stuck!", "error"], {})
+                    self.pwdb.exc_async("db_msg_insert", [nzbname, "download is stuck!", "error"], {})
                 else:
-                    self.pwdb.exc("db_msg_insert", [nzbname, "inconsistency in download queue", "error"], {})
+                    self.pwdb.exc_async("db_msg_insert", [nzbname, "inconsistency in download queue", "error"], {})
                 self.pwdb.exc("db_nzb_update_status", [nzbname, -2], {})
                 if unrarer_is_stuck:
                     self.logger.error(whoami() + ": all articles/files downloaded but unrarer still waiting, exiting ...")
@@ -1025,29 +1242,56 @@ class Downloader(Thread):
                 self.stopped_counter = stopped_max_counter
                 continue
 
-        # store infolist in file
-        if infolist and files:
-            saveinfolist = {}
-            try:
-                nzbdir = re.sub(r"[.]nzb$", "", nzbname, flags=re.IGNORECASE) + "/"
-                fn = self.dirs["incomplete"] + nzbdir + "infl_" + nzbname + ".gzbx"
-                with open(fn, "wb") as fp:
-                    for filename, item in files.items():
-                        f_nr_articles, f_age, f_filetype, f_done, f_failed = item
-                        if not f_done:
-                            saveinfolist[filename] = infolist[filename]
-                    pickle.dump(saveinfolist, fp)
-            except Exception as e:
-                self.logger.warning(whoami() + str(e) + ": cannot write " + fn)
-
+        # written parts are kept by the decoder in the segment logs of _partial0 (see segment_log.py)
         self.pwdb.exc("db_nzb_store_allfile_list", [self.nzbname, self.allfileslist, self.filetypecounter, self.overall_size,
                                                     self.overall_size_wparvol, self.p2], {})
+        self.log_compression_stats()
+        self.log_decoder_stats()
+        if self.backpressure:
+            self.set_backpressure(False)
+        spill_stats = self.article_spill.get_stats()
+        if spill_stats["articles_spilled"]:
+            self.logger.info(whoami() + "spilled " + str(spill_stats["articles_spilled"]) + " articles / "
+                             + str(spill_stats["bytes_spilled"]) + " bytes to disk")
+        # decoder may still read the segment file if terminated
+        self.article_spill.close(remove=self.decoder_backlog[BACKLOG_SPILLED] <= 0)
         if not return_reason:
             return_reason = "download terminated!"
         self.results = nzbname, ((bytescount0, self.allbytesdownloaded0, availmem0, avgmiblist, self.filetypecounter, nzbname, article_health,
                                   self.overall_size, self.already_downloaded_size, self.p2, self.overall_size_wparvol,
                                   self.allfileslist)), return_reason, self.main_dir
 
+    def log_compression_stats(self):
+        try:
+            stats = do_mpconnections(self.pipes, "get_compression_stats", None)
+            for server_name, st in stats.items():
+                if not st["mode"] or not st["compressed"]:
+                    continue
+                self.logger.info(whoami() + server_name + " (" + st["mode"] + "): " + str(st["compressed"]) + " bytes compressed / "
+                                 + str(st["uncompressed"]) + " bytes uncompressed, ratio {0:.2f}".format(st["uncompressed"] / st["compressed"]))
+        except Exception as e:
+            self.logger.debug(whoami() + str(e) + ": cannot get compression stats")
+
+    # per decoder worker: busy sec., articles, decoded bytes, utilization since start
+    def get_decoder_stats(self):
+        elapsed = max(time.time() - self.decoder_ts_started, 1)
+        stats = []
+        for idx in range(self.decoder_workers):
+            busy, articles, nbytes, wait = self.decoder_stats[idx * article_decoder.DECODER_STATS_FIELDS:
+                                                              (idx + 1) * article_decoder.DECODER_STATS_FIELDS]
+            stats.append({"busy": busy, "articles": int(articles), "bytes": int(nbytes), "utilization": busy / elapsed,
+                          "avg_queue_wait": wait / articles if articles else 0})
+        return stats
+
+    def log_decoder_stats(self):
+        try:
+            for idx, st in enumerate(self.get_decoder_stats()):
+                self.logger.info(whoami() + "decoder worker #" + str(idx) + ": " + str(st["articles"]) + " articles, "
+                                 + str(st["bytes"]) + " bytes, utilization {0:.1f}%".format(st["utilization"] * 100)
+                                 + ", avg. queue wait {0:.0f} ms".format(st["avg_queue_wait"] * 1000))
+        except Exception as e:
+            self.logger.debug(whoami() + str(e) + ": cannot get decoder stats")
+
     def get_level_servers(self, retention):
         result = do_mpconnections(self.pipes, "get_level_servers", retention)
         return result
@@ -2,7 +2,10 @@
 from peewee import Model, CharField, ForeignKeyField, IntegerField, TimeField, OperationalError, BooleanField, BlobField, DateTimeField
 from playhouse.sqlite_ext import CSqliteExtDatabase
 from playhouse.fields import PickleField
+from playhouse.migrate import SqliteMigrator, migrate
 from .mplogging import setup_logger, whoami
+from .article_table import ArticleTable
+from .rpc_stats import RPCStats
 import os
 import shutil
 import time
@@ -22,6 +25,14 @@ from dateutil.relativedelta import relativedelta
 
 
 TERMINATED = False
+# sec. between dropping async sequence nos. of processes which are gone
+ASYNC_SEQS_PRUNE_INTERVAL = 60
+
+# methods callable via PWDBSender besides all db_* methods
+RPC_METHODS = ("exc_many", "set_exit_goodbye_from_main", "get_all_data_for_gui", "get_db_timestamp",
+               "get_all_renamed_rar_files", "get_all_corrupt_rar_files", "get_renamed_p2", "move_nzb_list",
+               "nzb_prio_insert_second", "reorder_nzb_list", "get_stored_sorted_nzbs", "get_stored_sorted_nzbhistory",
+               "store_sorted_nzbs", "create_allfile_list_via_name", "make_allfilelist")
 
 if __name__ == "__main__":
     from par2lib import calc_file_md5hash, Par2File
@@ -72,6 +83,14 @@ class PWDB():
         self.wrapper_context = zmq.Context()
         self.wrapper_socket = self.wrapper_context.socket(zmq.REP)
         self.wrapper_socket.bind("ipc://" + ipc_location)
+        # fire and forget writes (PWDBSender.exc_async), sender -> seq. no. of last one done
+        self.async_socket = self.wrapper_context.socket(zmq.PULL)
+        self.async_socket.bind("ipc://" + maindir + "ginzibix_socket2")
+        self.async_seqs = {}
+        # dispatch table for do_loop + stats per method
+        self.rpc_methods = {name: getattr(self, name) for name, func in vars(PWDB).items()
+                            if callable(func) and (name.startswith("db_") or name in RPC_METHODS)}
+        self.rpc_stats = RPCStats()
         self.signal_ign_sigint = None
         self.signal_ign_sigterm = None
 
@@ -164,6 +183,11 @@ class PWDB():
             # db_file_update_status(filename, 1)
             status = IntegerField(default=0)
             size = IntegerField(default=0)
+            # crc32 of decoded file (hex) as combined from its yenc parts by the decoder
+            crc32 = CharField(default="N/A")
+            # md5 / md5 of first 16k (hex), also from the decoder
+            md5 = CharField(default="N/A")
+            md5_16k = CharField(default="N/A")
 
         class ARTICLE(BaseModel):
             name = CharField()
@@ -220,12 +244,25 @@ class PWDB():
                 self.logger.debug(whoami() + "copied file db to :memory: db")
             except Exception:
                 self.logger.warning(whoami())
+            self.migrate_db()
         else:
             self.db.connect()
             self.db.create_tables(self.tablelist)
 
         self.SQLITE_MAX_VARIABLE_NUMBER = int(max_sql_variables() / 4)
 
+    # adds columns of newer versions to a db file of an older version
+    def migrate_db(self):
+        try:
+            migrator = SqliteMigrator(self.db)
+            columns = [c.name for c in self.db.get_columns("file")]
+            for column in ["crc32", "md5", "md5_16k"]:
+                if column not in columns:
+                    migrate(migrator.add_column("file", column, CharField(default="N/A")))
+                    self.logger.info(whoami() + "added column " + column + " to table file")
+        except Exception as e:
+            self.logger.warning(whoami() + str(e) + ": cannot migrate db")
+
     def set_db_timestamp(func):
         @functools.wraps(func)
         def wrapper(self, *args, **kwargs):
@@ -246,25 +283,118 @@ class PWDB():
             self.logger.error(whoami() + str(e) + ": cannot save db file!")
             return -1
 
+    def call(self, funcstr, args0, kwargs0):
+        try:
+            func = self.rpc_methods[funcstr]
+        except KeyError:
+            self.logger.warning(whoami() + "unknown db call " + str(funcstr))
+            return None
+        return func(*args0, **kwargs0)
+
+    # several calls in one round trip (PWDBSender.exc_many), counted per call without payload
+    def exc_many(self, calls):
+        result = []
+        for funcstr, args0, kwargs0 in calls:
+            t0 = time.perf_counter()
+            result.append(self.call(funcstr, args0, kwargs0))
+            self.rpc_stats.add(funcstr, time.perf_counter() - t0)
+        return result
+
+    # {method: count, total / avg / p99 / max sec., bytes in / out}, highest total time first
+    def db_stats(self, reset=False):
+        stats = self.rpc_stats.get_stats()
+        if reset:
+            self.rpc_stats.reset()
+        return stats
+
+    def do_async_calls(self):
+        while True:
+            try:
+                frame = self.async_socket.recv(zmq.NOBLOCK)
+                sender_id, async_seq, funcstr, args0, kwargs0 = pickle.loads(frame)
+            except zmq.ZMQError:
+                return
+            except Exception as e:
+                # sender is unknown, its next sync call stops waiting once the socket is drained
+                self.logger.warning(whoami() + str(e) + ": dropping unreadable async db call")
+                continue
+            t0 = time.perf_counter()
+            try:
+                self.call(funcstr, args0, kwargs0)
+            except Exception as e:
+                self.logger.warning(whoami() + str(e) + ": " + funcstr)
+            self.rpc_stats.add(funcstr, time.perf_counter() - t0, len(frame))
+            self.async_seqs[sender_id] = async_seq
+
+    # async writes of a sender go before its next sync call (max. 1 sec.); gives up as soon
+    # as nothing more arrives, the missing writes were lost then
+    def wait_for_async_calls(self, sender_id, async_seq):
+        if sender_id is None:
+            return
+        t0 = time.time()
+        while self.async_seqs.get(sender_id, 0) < async_seq and time.time() - t0 < 1:
+            if not self.async_socket.poll(100):
+                self.logger.warning(whoami() + "async db calls of " + sender_id + " up to #" + str(async_seq)
+                                    + " missing, continuing")
+                self.async_seqs[sender_id] = async_seq
+                return
+            self.do_async_calls()
+
+    # sender_id = "pid.id", see PWDBSender.connect_async
+    def prune_async_seqs(self):
+        for sender_id in list(self.async_seqs):
+            try:
+                os.kill(int(sender_id.split(".")[0]), 0)
+            except ProcessLookupError:
+                del self.async_seqs[sender_id]
+            except Exception:
+                pass
+
     def do_loop(self):
-        self.wrapper_socket.setsockopt(zmq.RCVTIMEO, 1000)
+        poller = zmq.Poller()
+        poller.register(self.wrapper_socket, zmq.POLLIN)
+        poller.register(self.async_socket, zmq.POLLIN)
+        ts_pruned = time.time()
         while not TERMINATED:
             try:
-                funcstr, args0, kwargs0 = self.wrapper_socket.recv_pyobj()
+                socks = dict(poller.poll(timeout=1000))
             except zmq.ZMQError as e:
-                if e.errno == zmq.EAGAIN:
-                    continue
-                else:
-                    self.logger.debug(whoami() + str(e) + ": " + funcstr)
-                    continue
+                self.logger.debug(whoami() + str(e))
+                continue
+            if time.time() - ts_pruned > ASYNC_SEQS_PRUNE_INTERVAL:
+                self.prune_async_seqs()
+                ts_pruned = time.time()
+            if self.async_socket in socks:
+                self.do_async_calls()
+            if self.wrapper_socket not in socks:
+                continue
+            try:
+                frame = self.wrapper_socket.recv(zmq.NOBLOCK)
+            except zmq.ZMQError as e:
+                if e.errno != zmq.EAGAIN:
+                    self.logger.debug(whoami() + str(e))
+                continue
+            try:
+                funcstr, args0, kwargs0, sender_id, async_seq = pickle.loads(frame)
             except Exception as e:
-                self.logger.debug(whoami() + str(e) + ": " + funcstr)
+                # REP socket expects an answer anyway
+                self.logger.debug(whoami() + str(e))
+                self.wrapper_socket.send_pyobj(None)
                 continue
-            ret = eval("self." + funcstr + "(*args0, **kwargs0)")
+            self.wait_for_async_calls(sender_id, async_seq)
+            t0 = time.perf_counter()
+            ret = self.call(funcstr, args0, kwargs0)
+            dt = time.perf_counter() - t0
+            try:
+                data = pickle.dumps(ret, pickle.DEFAULT_PROTOCOL)
+            except Exception as e:
+                self.logger.warning(whoami() + str(e) + ": cannot pickle result of " + funcstr)
+                data = pickle.dumps(None)
             try:
-                self.wrapper_socket.send_pyobj(ret)
+                self.wrapper_socket.send(data)
             except Exception as e:
                 self.logger.debug(whoami() + str(e) + ": " + funcstr)
+            self.rpc_stats.add(funcstr, dt, len(frame), len(data))
 
     def set_exit_goodbye_from_main(self):
         global TERMINATED
@@ -476,6 +606,9 @@ class PWDB():
             return None
         # check here if all dillfields != "N/A"
         if allfilelist != "N/A" and filetypecounter != "N/A" and p2 != "N/A":
+            # stored by older versions as nested lists
+            if isinstance(allfilelist, list):
+                allfilelist = ArticleTable.from_allfileslist(allfilelist)
             return allfilelist, filetypecounter, overall_size, overall_size_wparvol, already_downloaded_size, p2
         return None
 
@@ -724,14 +857,18 @@ class PWDB():
                 except Exception:
                     return 0
             if f0list:
-                # calc crc32 of file
-                try:
-                    buf = open(file_to_be_checked, 'rb').read()
-                    buf = (binascii.crc32(buf) & 0xFFFFFFFF)
-                    crc32 = str("%08X" % buf).lower().strip()
-                    fileshort = file_to_be_checked.split("/")[-1]
-                except Exception:
-                    return 0
+                # crc32 of file: from decoder if possible, otherwise read file
+                fileshort = file_to_be_checked.split("/")[-1]
+                crc32 = self.db_file_get_crc32(fileshort)
+                if not crc32:
+                    try:
+                        buf = 0
+                        with open(file_to_be_checked, "rb") as f1:
+                            for chunk in iter(lambda: f1.read(1024 * 1024), b""):
+                                buf = binascii.crc32(chunk, buf)
+                        crc32 = str("%08X" % (buf & 0xFFFFFFFF)).lower().strip()
+                    except Exception:
+                        return 0
                 crc32ff = None
                 for ff in f0list:
                     try:
@@ -918,6 +1055,42 @@ class PWDB():
         except Exception as e:
             self.logger.warning(whoami() + str(e))
 
+    @set_db_timestamp
+    def db_file_set_crc32(self, filename, crc32):
+        try:
+            query = self.FILE.update(crc32=crc32).where(self.FILE.orig_name == filename)
+            query.execute()
+        except Exception as e:
+            self.logger.warning(whoami() + str(e))
+
+    def db_file_get_crc32(self, filename):
+        try:
+            file0 = self.FILE.get((self.FILE.orig_name == filename) | (self.FILE.renamed_name == filename))
+            if file0.crc32 != "N/A":
+                return file0.crc32
+        except Exception:
+            pass
+        return None
+
+    @set_db_timestamp
+    def db_file_set_md5(self, filename, md5, md5_16k):
+        try:
+            query = self.FILE.update(md5=md5, md5_16k=md5_16k).where(self.FILE.orig_name == filename)
+            query.execute()
+        except Exception as e:
+            self.logger.warning(whoami() + str(e))
+
+    # cached digest (bytes, like par2lib.calc_file_md5hash) by original or renamed name, None if not known
+    def db_file_get_md5(self, filename, only16k=False):
+        try:
+            file0 = self.FILE.get((self.FILE.orig_name == filename) | (self.FILE.renamed_name == filename))
+            md5 = file0.md5_16k if only16k else file0.md5
+            if md5 != "N/A":
+                return bytes.fromhex(md5)
+        except Exception:
+            pass
+        return None
+
     @set_db_timestamp
     def db_file_update_parstatus(self, filename, newparstatus):
         query = self.FILE.update(parverify_state=newparstatus).where(self.FILE.orig_name == filename)
@@ -1315,7 +1488,7 @@ class PWDB():
         if res:
             allfilelist, filetypecounter, overall_size, overall_size_wparvol, _, p2 = res
             return filetypecounter, nzbname
-        allfilelist = []
+        allfilelist = ArticleTable()
         filetypecounter = {"rar": {"counter": 0, "max": 0, "filelist": [], "loadedfiles": []},
                            "nfo": {"counter": 0, "max": 0, "filelist": [], "loadedfiles": []},
                            "par2": {"counter": 0, "max": 0, "filelist": [], "loadedfiles": []},
@@ -1328,7 +1501,6 @@ class PWDB():
         if not files:
             self.logger.info(whoami() + "No files to download for NZB " + nzb.name)
             return None, None
-        idx = 0
         overall_size = 0
         overall_size_wparvol = 0
         already_downloaded_size = 0
@@ -1370,25 +1542,19 @@ class PWDB():
                     self.logger.warning(whoami() + "processing " + f0.orig_name + ", but not found in dirs; this should not occur - will download again!!")
                 else:
                     filetypecounter[f0.ftype]["counter"] += 1
-                    md5 = calc_file_md5hash(filename0)
+                    md5 = self.db_file_get_md5(f0.orig_name) or calc_file_md5hash(filename0)
                     filetypecounter[f0.ftype]["loadedfiles"].append((f0.orig_name, filename0, md5))
                     already_downloaded_size += f0size
                     continue
-            allfilelist.append([(f0.orig_name, f0.age, f0.ftype, f0.nr_articles)])
-            articles = [articles0 for articles0 in f0.articles if articles0.status in [0, 1]]
+            fid = allfilelist.add_file(f0.orig_name, f0.age, f0.ftype, f0.nr_articles)
+            articles = sorted([articles0 for articles0 in f0.articles if articles0.status in [0, 1]], key=lambda a: a.number)
+            art_nrs = set()
             for a in articles:
-                allok = True
-                if len(allfilelist[idx]) > 2:
-                    for i1, art in enumerate(allfilelist[idx]):
-                        if i1 > 1:
-                            nr1, fn1, _ = art
-                            if nr1 == a.number:
-                                allok = False
-                                break
-                if allok:
-                    allfilelist[idx].append((a.number, a.name, a.size))
-            idx += 1
-        if allfilelist:
+                # skip duplicate article numbers
+                if a.number not in art_nrs:
+                    art_nrs.add(a.number)
+                    allfilelist.add_article(fid, a.number, a.name, a.size)
+        if allfilelist.nr_files():
             self.db_nzb_update_status(nzbname, 1, usefasttrack=False)
             overall_size /= gbdivisor
             overall_size_wparvol /= gbdivisor
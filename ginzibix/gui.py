@@ -1314,12 +1314,15 @@ class Handler:
 
         # get & store return values
         with self.gui.lock:
-            self.gui.cfg["OPTIONS"] = {"debuglevel": self.gui.gs_debuglevel_combotext.get_active_text(),
-                                       "sanity_check": "yes" if self.gui.gs_sanprecheck_switch.get_active() else "no",
-                                       "pw_file": self.gui.gs_filechooser_button.get_filename(),
-                                       "get_pw_directly": "yes" if self.gui.gs_getpwdir_switch.get_active() else "no",
-                                       "update_delay": self.gui.gs_guidelay_spinbutton2.get_value(),
-                                       "connection_idle_timeout": self.gui.gs_connectionstimeout_spinbutton1.get_value()}
+            # keep options which are not editable in the dialog
+            options0 = dict(self.gui.cfg["OPTIONS"])
+            options0.update({"debuglevel": self.gui.gs_debuglevel_combotext.get_active_text(),
+                             "sanity_check": "yes" if self.gui.gs_sanprecheck_switch.get_active() else "no",
+                             "pw_file": self.gui.gs_filechooser_button.get_filename(),
+                             "get_pw_directly": "yes" if self.gui.gs_getpwdir_switch.get_active() else "no",
+                             "update_delay": self.gui.gs_guidelay_spinbutton2.get_value(),
+                             "connection_idle_timeout": self.gui.gs_connectionstimeout_spinbutton1.get_value()})
+            self.gui.cfg["OPTIONS"] = options0
             self.gui.restart_button.set_label("!")
             self.gui.read_config()
             self.gui.appdata.settings_changed = True
@@ -0,0 +1,152 @@
+import time
+import threading
+from threading import Thread
+from collections import deque
+
+from ginzibix.mplogging import whoami
+
+
+# check interval in sec., no. of latency samples, min. samples before hedging starts,
+# threshold never below HEDGE_MIN_DELAY sec., finished hedged articles are remembered
+# for HEDGE_DONE_TTL sec. to drop late duplicates
+HEDGE_INTERVAL = 0.5
+HEDGE_SAMPLES = 500
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 2
+HEDGE_DONE_TTL = 600
+
+
+def get_percentile(samples, percentile):
+    if not samples:
+        return None
+    samples0 = sorted(samples)
+    return samples0[int(round((len(samples0) - 1) * percentile / 100))]
+
+
+# tracks articles in flight; if one takes longer than the n-th percentile of recent
+# download latencies a copy is queued in front of all other articles, so another
+# connection (of the same or another server) fetches it as well. the first good result
+# wins, later duplicates are dropped by the workers and counted as wasted bytes
+class ArticleHedger(Thread):
+    def __init__(self, ct, logger, percentile=95):
+        Thread.__init__(self)
+        self.daemon = True
+        self.ct = ct
+        self.logger = logger
+        self.percentile = percentile
+        self.running = True
+        self.lock = threading.Lock()
+        # art_name -> {"article": ..., "ts": start of download, "owner": idn of first connection,
+        #              "hedged": bool, "copies": no. of connections downloading it,
+        #              "results": no. of final results still expected (2 once hedged)}
+        self.inflight = {}
+        # art_name -> timestamp of first result, only for hedged articles
+        self.done = {}
+        self.latencies = deque(maxlen=HEDGE_SAMPLES)
+        self.stats = {"hedged": 0, "won": 0, "duplicates": 0, "wasted_bytes": 0}
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        self.logger.info(whoami() + "article hedger starting")
+        while self.running:
+            time.sleep(HEDGE_INTERVAL)
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.warning(whoami() + str(e))
+        self.logger.info(whoami() + "article hedger exited")
+
+    def get_threshold(self):
+        with self.lock:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            return max(get_percentile(self.latencies, self.percentile), HEDGE_MIN_DELAY)
+
+    def check(self):
+        now = time.time()
+        with self.lock:
+            for art_name in [a for a, ts in self.done.items() if now - ts > HEDGE_DONE_TTL]:
+                del self.done[art_name]
+        threshold = self.get_threshold()
+        if threshold is None or self.ct.mode != "download" or any(t.paused for t, _ in self.ct.threads):
+            return
+        hedges = []
+        with self.lock:
+            for art_name, entry in self.inflight.items():
+                if not entry["hedged"] and now - entry["ts"] > threshold:
+                    entry["hedged"] = True
+                    entry["results"] += 1
+                    hedges.append(entry["article"])
+            self.stats["hedged"] += len(hedges)
+        for article in hedges:
+            self.logger.debug(whoami() + "article " + article[5] + " in flight for more than {0:.1f} sec., hedging".format(threshold))
+            self.ct.articlequeue.append_urgent(article)
+
+    # called by worker before download, returns articles which still have to be downloaded
+    def track(self, articles, idn):
+        now = time.time()
+        articles0 = []
+        with self.lock:
+            for article in articles:
+                art_name = article[5]
+                if art_name in self.done:
+                    continue
+                if art_name not in self.inflight:
+                    self.inflight[art_name] = {"article": article, "ts": now, "owner": idn, "hedged": False,
+                                               "copies": 0, "results": 1}
+                self.inflight[art_name]["copies"] += 1
+                articles0.append(article)
+        return articles0
+
+    # article goes back to queue (other server / reconnect), a hedged one is kept until
+    # all its copies have reported
+    def release(self, article):
+        with self.lock:
+            entry = self.inflight.get(article[5])
+            if not entry:
+                return
+            entry["copies"] -= 1
+            if entry["copies"] <= 0 and not entry["hedged"]:
+                del self.inflight[article[5]]
+
+    # final result for article: True if it has to be sent, i.e. the first success or
+    # a failure of the last copy still expected
+    def finish(self, article, nbytes, idn):
+        art_name = article[5]
+        with self.lock:
+            if art_name in self.done:
+                self.stats["duplicates"] += 1
+                self.stats["wasted_bytes"] += nbytes
+                return False
+            entry = self.inflight.get(art_name)
+            if not entry:
+                return True
+            if not nbytes:
+                # failed: another copy may still deliver it
+                entry["copies"] -= 1
+                entry["results"] -= 1
+                if entry["results"] > 0:
+                    return False
+                del self.inflight[art_name]
+                return True
+            del self.inflight[art_name]
+            self.latencies.append(time.time() - entry["ts"])
+            if entry["hedged"]:
+                self.done[art_name] = time.time()
+                if idn != entry["owner"]:
+                    self.stats["won"] += 1
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.inflight = {}
+            self.done = {}
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self.inflight)
+        stats["threshold"] = self.get_threshold()
+        return stats
@@ -0,0 +1,120 @@
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+from ginzibix.mplogging import whoami
+
+
+MISS_CACHE_SIZE = 200000
+# in sec., servers may get articles later (propagation) so misses expire
+MISS_CACHE_TTL = 7 * 24 * 3600
+
+
+# remembers (message-id, server) pairs which returned 423/430 (no such article),
+# so these servers are skipped when the article is queued again: after restart,
+# reprocessing or sanity check. LRU bounded, entries expire after ttl sec.
+class MissCache:
+    def __init__(self, filename, logger, maxsize=MISS_CACHE_SIZE, ttl=MISS_CACHE_TTL):
+        self.filename = filename
+        self.logger = logger
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # (message-id, server) -> timestamp of miss
+        self.misses = OrderedDict()
+        self.dirty = False
+        self.hits = 0
+        self.load()
+
+    def __len__(self):
+        return len(self.misses)
+
+    def load(self):
+        if not self.filename:
+            return
+        try:
+            with open(self.filename, "rb") as fp:
+                misses = pickle.load(fp)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            self.logger.warning(whoami() + str(e) + ": cannot load miss cache, starting empty")
+            return
+        now = time.time()
+        with self.lock:
+            self.misses = OrderedDict((key, ts) for key, ts in misses.items() if now - ts < self.ttl)
+            while len(self.misses) > self.maxsize:
+                self.misses.popitem(last=False)
+        self.logger.debug(whoami() + "loaded " + str(len(self.misses)) + " entries from miss cache")
+
+    def save(self):
+        if not self.dirty or not self.filename:
+            return
+        try:
+            with self.lock:
+                data = pickle.dumps(self.misses)
+                self.dirty = False
+            with open(self.filename + ".tmp", "wb") as fp:
+                fp.write(data)
+            os.replace(self.filename + ".tmp", self.filename)
+        except Exception as e:
+            self.logger.warning(whoami() + str(e) + ": cannot save miss cache")
+
+    def add(self, message_id, server_name):
+        with self.lock:
+            key = (message_id, server_name)
+            self.misses[key] = time.time()
+            self.misses.move_to_end(key)
+            while len(self.misses) > self.maxsize:
+                self.misses.popitem(last=False)
+            self.dirty = True
+
+    # lock has to be held
+    def is_missing_locked(self, message_id, server_name, now):
+        key = (message_id, server_name)
+        try:
+            ts = self.misses[key]
+        except KeyError:
+            return False
+        if now - ts > self.ttl:
+            del self.misses[key]
+            self.dirty = True
+            return False
+        self.misses.move_to_end(key)
+        return True
+
+    def is_missing(self, message_id, server_name):
+        with self.lock:
+            return self.is_missing_locked(message_id, server_name, time.time())
+
+    # removes servers known to miss the article from its remaining servers,
+    # empty remaining servers -> article fails right away
+    def filter_article(self, article):
+        filename, age, filetype, nr_articles, art_nr, art_name, remaining_servers = article
+        if not remaining_servers or not self.misses:
+            return article
+        now = time.time()
+        next_servers = []
+        changed = False
+        with self.lock:
+            for level_servers in remaining_servers:
+                level_servers0 = [s for s in level_servers if not self.is_missing_locked(art_name, s, now)]
+                if len(level_servers0) != len(level_servers):
+                    changed = True
+                if level_servers0:
+                    next_servers.append(level_servers0)
+            if changed:
+                self.hits += 1
+        if not changed:
+            return article
+        return (filename, age, filetype, nr_articles, art_nr, art_name, next_servers)
+
+    def clear(self):
+        with self.lock:
+            self.misses = OrderedDict()
+            self.dirty = True
+
+    def get_stats(self):
+        return {"entries": len(self.misses), "hits": self.hits}
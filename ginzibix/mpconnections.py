@@ -1,9 +1,8 @@
 import nntplib
 import time
 from .server import Servers
-from threading import Thread
+from threading import Thread, RLock
 import socket
-import queue
 from collections import deque
 from setproctitle import setproctitle
 import os
@@ -11,17 +10,33 @@ import signal
 import zmq
 import sys
 from zmq.devices.basedevice import ProcessDevice, ThreadDevice
-import pickle
+import asyncio
 
 from ginzibix.mplogging import whoami
 from ginzibix import mplogging
 from ginzibix import PWDBSender, make_dirs, mpp_is_alive, mpp_join, GUI_Poller, get_cut_nzbname, get_cut_msg, get_bg_color, get_status_name_and_color,\
     clear_postproc_dirs, get_configured_servers, get_config_for_server, get_free_server_cfg, is_port_in_use, do_mpconnections,\
     kill_mpp
+from ginzibix.aionntp import AioNNTP
+from ginzibix.nntp_reader import read_body
+from ginzibix.bandwidth import BandwidthLimiter
+from ginzibix.article_scheduler import ArticleScheduler
+from ginzibix.hedging import ArticleHedger
+from ginzibix.miss_cache import MissCache, MISS_CACHE_TTL
+from ginzibix.shm_ring import ShmRing
+from ginzibix.result_batch import ResultBatcher, ResultReceiver, get_batch_config
 
 
 TERMINATED = False
 
+# connection autoscaler: evaluation interval in sec., max. share of 400/502/503 errors,
+# min. throughput gain to keep an added connection, intervals to wait after scaling down
+AUTOSCALE_INTERVAL = 10
+AUTOSCALE_MAX_ERROR_RATE = 0.05
+AUTOSCALE_MIN_GAIN = 0.05
+AUTOSCALE_HOLD_INTERVALS = 6
+AUTOSCALE_LOG_SIZE = 500
+
 
 class SigHandler_MPconnector:
     def __init__(self, logger):
@@ -35,10 +50,18 @@ class SigHandler_MPconnector:
 
 # This is the thread worker per connection to NNTP server
 class ConnectionWorker(Thread):
-    def __init__(self, connection, articlequeue, port, servers, cfg, logger):
+    def __init__(self, connection, articlequeue, port, servers, cfg, logger, limiter=None, hedger=None, miss_cache=None,
+                 shm_ring=None):
         Thread.__init__(self)
         self.daemon = True
         self.logger = logger
+        self.limiter = limiter
+        self.hedger = hedger
+        self.miss_cache = miss_cache
+        self.shm_ring = shm_ring
+        # results are sent in batches, see result_batch.py
+        self.batch_size, self.batch_delay = get_batch_config(cfg)
+        self.batcher = None
         self.connection = connection
         self.articlequeue = articlequeue
         self.port = port
@@ -63,6 +86,14 @@ class ConnectionWorker(Thread):
             self.connection_idle_time = int(cfg["OPTIONS"]["CONNECTION_IDLE_TIMEOUT"])
         except Exception:
             self.connection_idle_time = 45
+        self.pipeline = self.servers.get_server_option(self.name, "pipeline", 1)
+        # None, "deflate" or "gzip"; byte counts of article bodies on the wire / decompressed
+        self.compression = None
+        self.bytes_compressed = 0
+        self.bytes_uncompressed = 0
+        # for autoscaler: downloaded articles, 400/502/503 errors
+        self.articles_downloaded = 0
+        self.server_errors = 0
 
     def stop(self):
         self.running = False
@@ -73,28 +104,80 @@ class ConnectionWorker(Thread):
     #                -1:  retention not sufficient
     #                -2:  server connection error
     def download_article(self, article_name, article_age):
-        bytesdownloaded = 0
-        info0 = None
-        if self.mode == "sanitycheck":
-            try:
-                resp, number, message_id = self.nntpobj.stat(article_name)
-                if article_name != message_id:
-                    status = -1
-                else:
-                    status = 1
-            except Exception as e:
-                self.logger.error(whoami() + str(e) + self.idn + " for article " + article_name)
+        return self.download_articles([article_name], [article_age])[0]
+
+    # pipelined version: sends up to self.pipeline commands before reading the
+    # responses, which come back in the order the commands were sent.
+    # returns list of (status, bytesdownloaded, info) in order of article_names
+    def download_articles(self, article_names, article_ages):
+        results = [None] * len(article_names)
+        cmd = "STAT " if self.mode == "sanitycheck" else "BODY "
+        sent = []
+        for idx, (article_name, article_age) in enumerate(zip(article_names, article_ages)):
+            if self.mode != "sanitycheck" and self.server_retention < article_age * 0.95:
+                self.logger.warning(whoami() + "Retention on " + self.server_name + " not sufficient for article " + article_name)
+                results[idx] = (-1, 0, None)
+                continue
+            sent.append(idx)
+        try:
+            for idx in sent:
+                self.nntpobj._putcmd(cmd + article_names[idx])
+        except Exception as e:
+            # nothing can be read back, treat as connection error for all articles
+            self.logger.warning(whoami() + str(e) + ": cannot send commands on " + self.idn)
+            for idx in sent:
+                results[idx] = (-2, 0, None) if self.mode != "sanitycheck" else (-1, 0, 0)
+            return results
+        conn_status = None
+        for idx in sent:
+            if conn_status is not None:
+                # connection is broken / out of sync, do not read remaining responses
+                results[idx] = (conn_status, 0, None) if self.mode != "sanitycheck" else (-1, 0, 0)
+                continue
+            if self.mode == "sanitycheck":
+                results[idx] = self.read_stat_response(article_names[idx])
+                if results[idx][2] is None:
+                    conn_status = -2
+                    results[idx] = (-1, 0, 0)
+            else:
+                results[idx] = self.read_body_response(article_names[idx])
+                if results[idx][0] in [-2, -3]:
+                    conn_status = results[idx][0]
+        return results
+
+    # reads STAT response, info is None if connection is broken
+    def read_stat_response(self, article_name):
+        try:
+            resp = self.nntpobj._getresp()
+            resp, number, message_id = self.nntpobj._statparse(resp)
+            if article_name != message_id:
                 status = -1
-            return status, 0, 0
-        if self.server_retention < article_age * 0.95:
-            self.logger.warning(whoami() + "Retention on " + self.server_name + " not sufficient for article " + article_name)
+            else:
+                status = 1
+        except nntplib.NNTPError as e:
+            self.logger.error(whoami() + str(e) + self.idn + " for article " + article_name)
+            if e.response[:3] in ["423", "430"]:
+                self.add_miss(article_name)
+            status = -1
+        except Exception as e:
+            self.logger.error(whoami() + str(e) + self.idn + " for article " + article_name)
             return -1, 0, None
+        return status, 0, 0
+
+    def read_body_response(self, article_name):
+        bytesdownloaded = 0
+        info0 = None
         try:
-            resp, info = self.nntpobj.body(article_name)
-            if resp.startswith("222"):
+            resp, info0, wirebytes = read_body(self.nntpobj, self.compression)
+            if info0 is not None:
                 status = 1
-                info0 = [inf + b"\r\n" if not inf.endswith(b"\r\n") else inf for inf in info.lines]
-                bytesdownloaded = len(b''.join(info.lines))
+                bytesdownloaded = len(info0[0])
+                self.bytes_compressed += wirebytes
+                self.bytes_uncompressed += bytesdownloaded
+                if self.limiter:
+                    delay = self.limiter.consume(self.name, wirebytes)
+                    if delay > 0:
+                        self.wait_running(delay)
             else:
                 self.logger.warning(whoami() + resp + ": could not find " + article_name + " on " + self.idn)
                 status = 0
@@ -103,8 +186,12 @@ class ConnectionWorker(Thread):
             errcode = e.response.strip()[:3]
             if errcode == "400":
                 # server quits, new connection has to be established
+                self.server_errors += 1
                 status = -2
             else:
+                # 423/430: no such article
+                if errcode in ["423", "430"]:
+                    self.add_miss(article_name)
                 status = 0
             self.logger.warning(whoami() + e.response + ": could not find " + article_name + " on " + self.idn)
         # nntpError 5xx - Command unknown error
@@ -112,11 +199,11 @@ class ConnectionWorker(Thread):
             errcode = e.response.strip()[:3]
             if errcode in ["503", "502"]:
                 # timeout, closing connection
+                self.server_errors += 1
                 status = -2
             else:
                 status = 0
             self.logger.warning(whoami() + e.response + ": could not find " + article_name + " on " + self.idn)
-            status = 0
         except nntplib.NNTPError as e:
             status = 0
             self.logger.warning(whoami() + e.response + ": could not find " + article_name + " on " + self.idn)
@@ -128,7 +215,7 @@ class ConnectionWorker(Thread):
         except AttributeError as e:
             status = -2
             self.logger.warning(whoami() + str(e) + ": " + article_name + " on " + self.idn)
-        except BrokenPipeError as e:
+        except (BrokenPipeError, ConnectionError, EOFError) as e:
             status = -2
             self.logger.warning(whoami() + str(e) + ": " + article_name + " on " + self.idn)
         except Exception as e:
@@ -137,7 +224,6 @@ class ConnectionWorker(Thread):
             else:
                 status = 0
             self.logger.warning(whoami() + str(e) + ": " + article_name + " on " + self.idn)
-        # self.bandwidth_bytes += bytesdownloaded
         return status, bytesdownloaded, info0
 
     def wait_running(self, sec):
@@ -157,6 +243,7 @@ class ConnectionWorker(Thread):
             self.nntpobj = self.servers.open_connection(self.name, self.conn_nr)
             if self.nntpobj:
                 self.logger.debug(whoami() + "Server " + self.idn + " connected!")
+                self.compression = self.servers.get_compression(self.name, self.conn_nr)
                 self.last_timestamp = time.time()
                 self.connectionstate = 1
                 self.server_name, self.server_url, self.server_user, self.server_password, self.server_port,\
@@ -176,20 +263,26 @@ class ConnectionWorker(Thread):
             self.connectionstate = -1
 
     def remove_from_remaining_servers(self, name, remaining_servers):
-        next_servers = []
-        for s in remaining_servers:
-            addserver = s[:]
-            try:
-                addserver.remove(name)
-            except Exception:
-                pass
-            if addserver:
-                next_servers.append(addserver)
-        return next_servers
+        return remove_from_remaining_servers(name, remaining_servers)
 
     def is_download_done(self):
         return self.download_done
 
+    # hedging: False if another connection already delivered the article
+    def hedge_finish(self, article, nbytes):
+        if not self.hedger or self.hedger.finish(article, nbytes, self.idn):
+            return True
+        self.logger.debug(whoami() + "dropping duplicate of hedged article " + article[5] + " on " + self.idn)
+        return False
+
+    def hedge_release(self, article):
+        if self.hedger:
+            self.hedger.release(article)
+
+    def add_miss(self, article_name):
+        if self.miss_cache:
+            self.miss_cache.add(article_name, self.name)
+
     def run(self):
         self.logger.info(whoami() + self.idn + " thread starting !")
         timeout = 2
@@ -198,9 +291,11 @@ class ConnectionWorker(Thread):
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.PUSH)
         self.socket.connect("tcp://127.0.0.1:%d" % self.port)
+        self.batcher = ResultBatcher(self.socket, max_results=self.batch_size, max_delay=self.batch_delay)
         while self.running:
             self.download_done = True
             if self.paused:
+                self.batcher.flush()
                 if not self.tt_pause_started:
                     self.tt_pause_started = time.time()
                 elif time.time() - self.tt_pause_started > self.connection_idle_time and self.nntpobj:
@@ -218,14 +313,15 @@ class ConnectionWorker(Thread):
                 self.tt_pause_started = None
             if not self.running:
                 break
+            # only returns articles this server may fetch, blocks while there are none
+            # (but not longer than pending results may wait)
+            self.batcher.flush_if_due()
             try:
-                article = self.articlequeue.pop()
-            except (queue.Empty, EOFError, IndexError):
-                time.sleep(0.1)
-                continue
+                article = self.articlequeue.pop_for(self.name, timeout=self.batcher.get_timeout(0.5))
             except Exception as e:
-                self.logger.warning(whoami() + str(e) + ": problem in clearing article queue")
-                time.sleep(0.1)
+                self.logger.warning(whoami() + str(e) + ": problem in reading article queue")
+                article = None
+            if not article:
                 continue
             # avoid ctrl-c to interrup downloading itself
             self.download_done = False
@@ -233,27 +329,67 @@ class ConnectionWorker(Thread):
                 self.retry_connect()
             filename, age, filetype, nr_articles, art_nr, art_name, remaining_servers1 = article
             if not remaining_servers1:
-                self.socket.send(pickle.dumps(article + (None,)))
-                continue
-            if self.name not in remaining_servers1[0] or not self.nntpobj:
-                self.articlequeue.append((filename, age, filetype, nr_articles, art_nr, art_name, remaining_servers1))
-                time.sleep(0.1)
+                # no server left (retention / known misses), article fails
+                self.batcher.add((filename, age, filetype, nr_articles, art_nr, art_name, [], "failed", True))
                 continue
             if not self.nntpobj:
-                self.wait_running(3)
+                # give it back to other connections, retry_connect already waited
+                self.articlequeue.append(article)
                 continue
-            status, bytesdownloaded, info = self.download_article(art_name, age)
-            # if ctrl-c - exit thread
-            if status == -3 or not self.running:
+            # pipelining: fill up with further articles for this server
+            articles = [article] + self.articlequeue.pop_many_for(self.name, self.pipeline - 1)
+            if self.hedger:
+                # skip articles already delivered by a hedged copy
+                articles = self.hedger.track(articles, self.idn)
+                if not articles:
+                    continue
+            results = self.download_articles([a[5] for a in articles], [a[1] for a in articles])
+            connection_error = False
+            for article0, (status, bytesdownloaded, info) in zip(articles, results):
+                filename, age, filetype, nr_articles, art_nr, art_name, remaining_servers1 = article0
+                # if ctrl-c - give back article, thread exits below
+                if status == -3:
+                    self.hedge_release(article0)
+                    self.articlequeue.append(article0)
+                # if download successfull - put to resultqueue
+                elif status == 1:
+                    self.last_downloaded_ts = time.time()
+                    timeout = 2
+                    self.bytesdownloaded += bytesdownloaded
+                    self.articles_downloaded += 1
+                    if self.hedge_finish(article0, bytesdownloaded):
+                        # body goes to shared memory ring, only descriptor is sent
+                        if self.shm_ring:
+                            info = self.shm_ring.store(info)
+                        self.batcher.add((filename, age, filetype, nr_articles, art_nr, art_name, self.name, info, True))
+                # if 400 error
+                elif status == -2:
+                    connection_error = True
+                    # take next server
+                    next_servers = self.remove_from_remaining_servers(self.name, remaining_servers1)
+                    next_servers.append([self.name])    # add current server to end of list
+                    self.hedge_release(article0)
+                    self.logger.debug(whoami() + "Requeuing " + art_name + " on server " + self.idn)
+                    # requeue
+                    self.articlequeue.append((filename, age, filetype, nr_articles, art_nr, art_name, next_servers))
+                # if article could not be found on server / retention not good enough - requeue to other server
+                elif status in [0, -1]:
+                    timeout = 2
+                    next_servers = self.remove_from_remaining_servers(self.name, remaining_servers1)
+                    if not next_servers:
+                        self.logger.error(whoami() + "Download finally failed on server " + self.idn + ": for article " + art_name + " "
+                                          + str(next_servers))
+                        if self.hedge_finish(article0, 0):
+                            self.batcher.add((filename, age, filetype, nr_articles, art_nr, art_name, [], "failed", True))
+                    else:
+                        self.logger.debug(whoami() + "Download failed on server " + self.idn + ": for article " + art_name + ", queueing: "
+                                          + str(next_servers))
+                        self.hedge_release(article0)
+                        self.articlequeue.append((filename, age, filetype, nr_articles, art_nr, art_name, next_servers))
+            self.batcher.flush_if_due()
+            if any(r[0] == -3 for r in results) or not self.running:
                 break
-            # if download successfull - put to resultqueue
-            elif status == 1:
-                self.last_downloaded_ts = time.time()
-                timeout = 2
-                self.bytesdownloaded += bytesdownloaded
-                self.socket.send(pickle.dumps((filename, age, filetype, nr_articles, art_nr, art_name, self.name, info, True)))
-            # if 400 error
-            elif status == -2:
+            if connection_error:
                 # disconnect
                 self.logger.warning(whoami() + self.idn + " server connection error, reconnecting ...")
                 self.connectionstate = -1
@@ -264,40 +400,55 @@ class ConnectionWorker(Thread):
                 except Exception:
                     pass
                 self.nntpobj = None
-                # take next server
-                next_servers = self.remove_from_remaining_servers(self.name, remaining_servers1)
-                next_servers.append([self.name])    # add current server to end of list
-                self.logger.debug(whoami() + "Requeuing " + art_name + " on server " + self.idn)
-                # requeue
-                self.articlequeue.append((filename, age, filetype, nr_articles, art_nr, art_name, next_servers))
                 self.wait_running(timeout)
                 timeout *= 2
                 if timeout > 30:
                     timeout = 2
-                continue
-            # if article could not be found on server / retention not good enough - requeue to other server
-            elif status in [0, -1]:
-                timeout = 2
-                next_servers = self.remove_from_remaining_servers(self.name, remaining_servers1)
-                if not next_servers:
-                    self.logger.error(whoami() + "Download finally failed on server " + self.idn + ": for article " + art_name + " " + str(next_servers))
-                    self.socket.send(pickle.dumps((filename, age, filetype, nr_articles, art_nr, art_name, [], "failed", True)))
-                else:
-                    self.logger.debug(whoami() + "Download failed on server " + self.idn + ": for article " + art_name + ", queueing: "
-                                      + str(next_servers))
-                    self.articlequeue.append((filename, age, filetype, nr_articles, art_nr, art_name, next_servers))
+        self.batcher.flush()
         self.logger.info(whoami() + self.idn + " exited!")
 
 
 # this class deals on a meta-level with usenet connections
 class ConnectionThreads:
-    def __init__(self, cfg, articlequeue, port, server_ts, logger):
+    def __init__(self, cfg, articlequeue, port, server_ts, logger, shm_ring=None, main_dir=None):
         self.cfg = cfg
         self.logger = logger
+        self.shm_ring = shm_ring
         self.threads = []
+        # workers removed by the autoscaler, kept for byte statistics
+        self.retired_threads = []
         self.articlequeue = articlequeue
         self.port = port
         self.servers = None
+        self.mode = "download"
+        self.autoscaler = None
+        # guards self.threads + paused state, workers are added / removed by the autoscaler thread
+        self.threads_lock = RLock()
+        self.paused = False
+        try:
+            self.autoscale = True if cfg["OPTIONS"]["AUTOSCALE_CONNECTIONS"].lower() == "yes" else False
+        except Exception:
+            self.autoscale = False
+        # shared by all workers, see bandwidth.py
+        self.limiter = BandwidthLimiter(cfg, logger)
+        # duplicate requests for articles stuck in flight, see hedging.py
+        self.hedger = None
+        try:
+            self.hedging = True if cfg["OPTIONS"]["HEDGE_REQUESTS"].lower() == "yes" else False
+        except Exception:
+            self.hedging = False
+        try:
+            self.hedge_percentile = float(cfg["OPTIONS"]["HEDGE_PERCENTILE"])
+        except Exception:
+            self.hedge_percentile = 95
+        # 430 misses per server, consulted whenever articles are queued
+        try:
+            miss_cache_ttl = float(cfg["OPTIONS"]["MISS_CACHE_TTL"]) * 3600
+        except Exception:
+            miss_cache_ttl = MISS_CACHE_TTL
+        # not persisted without main_dir
+        self.miss_cache = MissCache(main_dir + "ginzibix.misses" if main_dir else None, logger, ttl=miss_cache_ttl)
+        self.articlequeue.article_filter = self.miss_cache.filter_article
         self.bdl_results = {}
         for s in server_ts:
             try:
@@ -320,7 +471,7 @@ class ConnectionThreads:
             return result
         for servername, _, _, _, _, _, _, _, _, useserver in self.servers.server_config:
             if useserver:
-                bdl = sum([t.bytesdownloaded for t, _ in self.threads if t.name == servername])
+                bdl = sum([t.bytesdownloaded for t in self.all_workers() if t.name == servername])
                 result["-ALL SERVERS-"] += bdl
                 try:
                     result[servername] = self.bdl_results[servername] + bdl
@@ -331,7 +482,7 @@ class ConnectionThreads:
     def get_bytesdownloaded(self):
         if self.threads:
             try:
-                bdl = sum([t.bytesdownloaded for t, _ in self.threads])
+                bdl = sum([t.bytesdownloaded for t in self.all_workers()])
             except Exception:
                 bdl = 0
             if (not isinstance(bdl, int)) and (not isinstance(bdl, float)):
@@ -340,41 +491,153 @@ class ConnectionThreads:
         else:
             return 0
 
+    def all_workers(self):
+        return [t for t, _ in self.threads] + self.retired_threads
+
+    def start_worker(self, sn, scon):
+        t = ConnectionWorker((sn, scon), self.articlequeue, self.port, self.servers,
+                             self.cfg, self.logger, limiter=self.limiter, hedger=self.hedger, miss_cache=self.miss_cache,
+                             shm_ring=self.shm_ring)
+        t.mode = self.mode
+        with self.threads_lock:
+            t.paused = self.paused
+            self.threads.append((t, time.time()))
+            t.start()
+        return t
+
+    def stop_worker(self, t):
+        t.stop()
+        t.join()
+        self.servers.close_connection(t.name, t.conn_nr)
+
     def start_threads(self):
         if not self.threads:
             self.logger.debug(whoami() + "starting download threads")
             self.init_servers()
+            self.retired_threads = []
+            self.paused = False
+            if self.hedging:
+                self.hedger = ArticleHedger(self, self.logger, percentile=self.hedge_percentile)
+                self.hedger.start()
+            limits = self.get_connection_limits()
             for sn, scon, _, _ in self.all_connections:
-                t = ConnectionWorker((sn, scon), self.articlequeue, self.port, self.servers,
-                                     self.cfg, self.logger)
-                self.threads.append((t, time.time()))
-                t.start()
+                # autoscaler starts with min. connections and ramps up from there
+                if self.autoscale and scon > limits[sn][0]:
+                    continue
+                self.start_worker(sn, scon)
+            if self.autoscale:
+                self.autoscaler = ConnectionAutoscaler(self, self.logger)
+                self.autoscaler.start()
         else:
             self.logger.debug(whoami() + "threads already started")
 
+    # {server_name: (min_connections, max_connections)}
+    def get_connection_limits(self):
+        limits = {}
+        for sn, _, _, _, _, _, _, connections, _, useserver in self.servers.server_config:
+            if useserver:
+                limits[sn] = (min(self.servers.get_server_option(sn, "min_connections", 1), connections), connections)
+        return limits
+
+    # starts next free connection to server, returns worker or None
+    def add_connection(self, server_name):
+        with self.threads_lock:
+            if self.paused:
+                return None
+            running = [t.conn_nr for t, _ in self.threads if t.name == server_name]
+            for sn, scon, _, _ in self.all_connections:
+                if sn == server_name and scon not in running:
+                    self.logger.info(whoami() + "adding connection #" + str(scon) + " to " + server_name)
+                    return self.start_worker(sn, scon)
+        return None
+
+    # stops connection with highest number on server, returns worker or None
+    def remove_connection(self, server_name):
+        with self.threads_lock:
+            workers = sorted([t for t, _ in self.threads if t.name == server_name], key=lambda t: t.conn_nr)
+            if len(workers) <= 1:
+                return None
+            t = workers[-1]
+            self.logger.info(whoami() + "removing connection #" + str(t.conn_nr) + " from " + server_name)
+            self.threads = [(t0, ts) for t0, ts in self.threads if t0 is not t]
+            self.retired_threads.append(t)
+        # outside of lock, joining may take a while
+        self.stop_worker(t)
+        return t
+
+    def set_mode(self, mode):
+        self.mode = mode
+        for t, _ in self.threads:
+            t.mode = mode
+
+    def get_autoscaler_log(self):
+        if not self.autoscaler:
+            return []
+        return list(self.autoscaler.decisions)
+
+    def stop_autoscaler(self):
+        if self.autoscaler:
+            self.autoscaler.stop()
+            self.autoscaler.join()
+            self.autoscaler = None
+
+    # keeps hedger object for get_hedging_stats until next start
+    def stop_hedger(self):
+        if self.hedger:
+            self.hedger.stop()
+            self.hedger.join()
+
+    def get_hedging_stats(self):
+        if not self.hedger:
+            return None
+        return self.hedger.get_stats()
+
+    def get_result_batch_stats(self):
+        batchers = [getattr(t, "batcher", None) for t, _ in self.threads]
+        batchers.append(getattr(self, "batcher", None))
+        batches_sent = results_sent = latency_sum = latency_max = 0
+        for b in batchers:
+            if not b:
+                continue
+            batches_sent += b.batches_sent
+            results_sent += b.results_sent
+            latency_sum += b.latency_sum
+            latency_max = max(latency_max, b.latency_max)
+        if not batches_sent:
+            return {"batches_sent": 0, "results_sent": 0, "avg_batch_size": 0, "avg_latency": 0, "max_latency": 0}
+        return {"batches_sent": batches_sent, "results_sent": results_sent, "avg_batch_size": results_sent / batches_sent,
+                "avg_latency": latency_sum / batches_sent, "max_latency": latency_max}
+
     def pause_threads(self):
-        if self.threads:
+        with self.threads_lock:
+            if not self.threads:
+                return
+            self.paused = True
             for t, _ in self.threads:
                 t.paused = True
-            # wait until all threads are really in pause loop
-            while True:
-                all_paused = True
-                for t, _ in self.threads:
-                    if not t.tt_pause_started:
-                        all_paused = False
-                        break
-                if all_paused:
+        # wait until all threads are really in pause loop
+        while True:
+            all_paused = True
+            with self.threads_lock:
+                threads = list(self.threads)
+            for t, _ in threads:
+                if not t.tt_pause_started:
+                    all_paused = False
                     break
-                time.sleep(0.1)
+            if all_paused:
+                break
+            time.sleep(0.1)
 
     def resume_threads(self):
-        if self.threads:
-            self.logger.debug(whoami() + "Resuming threads")
-            for t, _ in self.threads:
-                t.paused = False
-        else:
-            self.logger.debug(whoami() + "Starting threads")
-            self.start_threads()
+        with self.threads_lock:
+            if self.threads:
+                self.logger.debug(whoami() + "Resuming threads")
+                self.paused = False
+                for t, _ in self.threads:
+                    t.paused = False
+                return
+        self.logger.debug(whoami() + "Starting threads")
+        self.start_threads()
 
     def stop_threads(self):
         if not self.threads:
@@ -382,6 +645,8 @@ class ConnectionThreads:
             return
         try:
             self.logger.debug(whoami() + "stopping download threads + servers")
+            self.stop_autoscaler()
+            self.stop_hedger()
             for t, _ in self.threads:
                 t.stop()
                 t.last_downloaded_ts = None
@@ -426,29 +691,571 @@ class ConnectionThreads:
             return None
         return self.servers.server_config
 
+    # {server_name: {"mode": ..., "compressed": bytes on wire, "uncompressed": bytes decompressed}}
+    def get_compression_stats(self):
+        result = {}
+        for t in self.all_workers():
+            if t.name not in result:
+                result[t.name] = {"mode": None, "compressed": 0, "uncompressed": 0}
+            result[t.name]["compressed"] += t.bytes_compressed
+            result[t.name]["uncompressed"] += t.bytes_uncompressed
+            if t.compression:
+                result[t.name]["mode"] = t.compression
+        return result
 
-def get_from_streamingdevice(socket, onlyfirst=False):
-    result = []
-    while True:
-        try:
-            res0 = socket.recv(flags=zmq.NOBLOCK)
-            if not onlyfirst:
-                result.append(res0)
+
+# ramps connections per server up / down: adds a connection as long as this raises the
+# server's throughput and no 400/502/503 errors occur, removes one if the last one
+# added did not help or the error rate gets too high. decisions are logged for inspection
+class ConnectionAutoscaler(Thread):
+    def __init__(self, ct, logger):
+        Thread.__init__(self)
+        self.daemon = True
+        self.ct = ct
+        self.logger = logger
+        self.running = True
+        # server -> (bytes, articles, errors) at last evaluation
+        self.last_counters = {}
+        # server -> {"last_action": ..., "bps_before": ..., "hold": ...}
+        self.state = {}
+        self.decisions = deque(maxlen=AUTOSCALE_LOG_SIZE)
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        self.logger.info(whoami() + "connection autoscaler starting")
+        tt_last = time.time()
+        while self.running:
+            time.sleep(0.25)
+            if time.time() - tt_last < AUTOSCALE_INTERVAL:
+                continue
+            dt = time.time() - tt_last
+            tt_last = time.time()
+            try:
+                self.evaluate(dt)
+            except Exception as e:
+                self.logger.warning(whoami() + str(e))
+        self.logger.info(whoami() + "connection autoscaler exited")
+
+    def get_counters(self, server_name):
+        workers = [t for t in self.ct.all_workers() if t.name == server_name]
+        return (sum(t.bytesdownloaded for t in workers), sum(t.articles_downloaded for t in workers),
+                sum(t.server_errors for t in workers))
+
+    def record(self, server_name, action, n_old, n_new, bps, error_rate, reason):
+        decision = {"time": time.time(), "server": server_name, "action": action, "connections_before": n_old,
+                    "connections_after": n_new, "bytes_per_sec": bps, "bytes_per_sec_per_conn": bps / max(n_old, 1),
+                    "error_rate": error_rate, "reason": reason}
+        self.decisions.append(decision)
+        self.logger.info(whoami() + server_name + ": " + action + " " + str(n_old) + " -> " + str(n_new) + " connections ("
+                         + reason + ", {0:.1f} KiB/s)".format(bps / 1024))
+
+    def evaluate(self, dt):
+        threads = self.ct.threads
+        if not threads or self.ct.paused or any(t.paused for t, _ in threads) or self.ct.mode != "download":
+            # measurements while paused are meaningless
+            self.last_counters = {}
+            return
+        for server_name, (min_conn, max_conn) in self.ct.get_connection_limits().items():
+            busy = self.ct.articlequeue.len_for(server_name) > 0
+            n = len([t for t, _ in self.ct.threads if t.name == server_name])
+            counters = self.get_counters(server_name)
+            last = self.last_counters.get(server_name)
+            self.last_counters[server_name] = counters
+            if last is None:
+                continue
+            bps = (counters[0] - last[0]) / dt
+            n_articles = counters[1] - last[1]
+            n_errors = counters[2] - last[2]
+            error_rate = n_errors / (n_articles + n_errors) if n_articles + n_errors else 0
+            st = self.state.setdefault(server_name, {"last_action": None, "bps_before": 0, "hold": 0})
+            if st["hold"] > 0:
+                st["hold"] -= 1
+            if error_rate > AUTOSCALE_MAX_ERROR_RATE and n > min_conn:
+                if self.ct.remove_connection(server_name):
+                    self.record(server_name, "down", n, n - 1, bps, error_rate, "error rate {0:.1f}%".format(error_rate * 100))
+                st["last_action"] = "down"
+                st["hold"] = AUTOSCALE_HOLD_INTERVALS
+            elif not busy:
+                st["last_action"] = None
+            elif st["last_action"] == "up" and bps < st["bps_before"] * (1 + AUTOSCALE_MIN_GAIN) and n > min_conn:
+                if self.ct.remove_connection(server_name):
+                    self.record(server_name, "down", n, n - 1, bps, error_rate, "no throughput gain from last connection")
+                st["last_action"] = "down"
+                st["hold"] = AUTOSCALE_HOLD_INTERVALS
+            elif st["hold"] == 0 and n < max_conn and n_errors == 0:
+                if self.ct.add_connection(server_name):
+                    self.record(server_name, "up", n, n + 1, bps, error_rate, "ramping up")
+                    st["last_action"] = "up"
+                    st["bps_before"] = bps
             else:
-                result = pickle.loads(res0)
-                break
-        except zmq.ZMQError as e:
-            if e.errno == zmq.EAGAIN and not onlyfirst:
-                if result == []:
-                    result = None
+                st["last_action"] = None
+
+
+# coroutine worker per connection to NNTP server, keeps the same state attributes
+# as ConnectionWorker so ConnectionThreads methods work on both
+class AioConnectionWorker:
+    def __init__(self, connection, engine, servers, cfg, logger):
+        self.logger = logger
+        self.limiter = engine.limiter
+        self.hedger = engine.hedger
+        self.miss_cache = engine.miss_cache
+        self.shm_ring = engine.shm_ring
+        self.connection = connection
+        self.engine = engine
+        self.articlequeue = engine.articlequeue
+        self.servers = servers
+        self.nntpobj = None
+        self.running = True
+        self.name, self.conn_nr = self.connection
+        self.idn = self.name + " #" + str(self.conn_nr)
+        self.bytesdownloaded = 0
+        self.last_timestamp = 0
+        self.mode = "download"
+        self.download_done = True
+        self.last_downloaded_ts = None
+        self.paused = False
+        self.tt_pause_started = None
+        # 0 ... not running
+        # 1 ... running ok
+        # -1 ... connection problem
+        self.connectionstate = 0
+        try:
+            self.connection_idle_time = int(cfg["OPTIONS"]["CONNECTION_IDLE_TIMEOUT"])
+        except Exception:
+            self.connection_idle_time = 45
+        self.pipeline = self.servers.get_server_option(self.name, "pipeline", 1)
+        # None, "deflate" or "gzip"; byte counts of article bodies on the wire / decompressed
+        self.compression = None
+        self.bytes_compressed = 0
+        self.bytes_uncompressed = 0
+        # for autoscaler: downloaded articles, 400/502/503 errors
+        self.articles_downloaded = 0
+        self.server_errors = 0
+
+    def stop(self):
+        self.running = False
+
+    def is_download_done(self):
+        return self.download_done
+
+    # hedging: False if another connection already delivered the article
+    def hedge_finish(self, article, nbytes):
+        if not self.hedger or self.hedger.finish(article, nbytes, self.idn):
+            return True
+        self.logger.debug(whoami() + "dropping duplicate of hedged article " + article[5] + " on " + self.idn)
+        return False
+
+    def hedge_release(self, article):
+        if self.hedger:
+            self.hedger.release(article)
+
+    def add_miss(self, article_name):
+        if self.miss_cache:
+            self.miss_cache.add(article_name, self.name)
+
+    async def wait_running(self, sec):
+        tt0 = time.time()
+        while time.time() - tt0 < sec and self.running and not self.paused:
+            await asyncio.sleep(0.1)
+
+    async def open_connection(self):
+        sc = self.servers.get_single_server_config(self.name)
+        if not sc:
+            self.logger.error(whoami() + "Cannot get server config for server: " + self.name)
+            return None
+        server_name, server_url, user, password, port, usessl, level, connections, retention, useserver = sc
+        if not useserver:
+            return None
+        try:
+            self.logger.debug(whoami() + "Opening connection # " + str(self.conn_nr) + " to server " + server_name)
+            nntpobj = await AioNNTP(server_url, port=port, user=user, password=password, usessl=usessl,
+                                    compression=self.servers.get_server_option(self.name, "compression", False)).connect()
+            self.logger.debug(whoami() + "Opened Connection #" + str(self.conn_nr) + " on server " + server_name)
+            if nntpobj.compression:
+                self.logger.info(whoami() + "Using " + nntpobj.compression + " compression on " + self.idn)
+            return nntpobj
+        except Exception as e:
+            self.logger.error(whoami() + "Server " + server_name + " connect error: " + str(e))
+            return None
+
+    async def close_connection(self):
+        if not self.nntpobj:
+            return False
+        nntpobj = self.nntpobj
+        self.nntpobj = None
+        try:
+            await nntpobj.quit()
+            self.logger.warning(whoami() + "Closed connection #" + str(self.conn_nr) + " on " + self.name)
+            return True
+        except Exception as e:
+            self.logger.warning(whoami() + "Server " + self.name + " close error: " + str(e))
+            return False
+
+    async def retry_connect(self):
+        idx = 0
+        self.logger.debug(whoami() + "Server " + self.idn + " connecting ...")
+        while idx < 5 and self.running and not self.paused:
+            await self.close_connection()
+            self.nntpobj = await self.open_connection()
+            if self.nntpobj:
+                self.logger.debug(whoami() + "Server " + self.idn + " connected!")
+                self.compression = self.nntpobj.compression
+                self.last_timestamp = time.time()
+                self.connectionstate = 1
+                self.server_name, self.server_url, self.server_user, self.server_password, self.server_port,\
+                    self.server_usessl, self.server_level, self.server_connections, self.server_retention,\
+                    self.useserver = self.servers.get_single_server_config(self.connection[0])
+                await self.wait_running(1)
+                return
+            self.logger.warning(whoami() + "Could not connect to server " + self.idn + ", will retry in 5 sec.")
+            await self.wait_running(2)
+            if not self.running or self.paused:
                 break
+            idx += 1
+        if not self.running:
+            self.logger.warning(whoami() + "No connection retries anymore due to exiting")
+        else:
+            self.logger.error(whoami() + "Connect retries to " + self.idn + " failed!")
+            self.connectionstate = -1
+
+    # same status codes as ConnectionWorker.download_articles, commands are pipelined
+    async def download_articles(self, article_names, article_ages):
+        results = [None] * len(article_names)
+        cmd = "STAT " if self.mode == "sanitycheck" else "BODY "
+        sent = []
+        for idx, (article_name, article_age) in enumerate(zip(article_names, article_ages)):
+            if self.mode != "sanitycheck" and self.server_retention < article_age * 0.95:
+                self.logger.warning(whoami() + "Retention on " + self.server_name + " not sufficient for article " + article_name)
+                results[idx] = (-1, 0, None)
+                continue
+            sent.append(idx)
+        try:
+            await self.nntpobj.putcmds([cmd + article_names[idx] for idx in sent])
+        except Exception as e:
+            self.logger.warning(whoami() + str(e) + ": cannot send commands on " + self.idn)
+            for idx in sent:
+                results[idx] = (-2, 0, None) if self.mode != "sanitycheck" else (-1, 0, 0)
+            return results
+        conn_status = None
+        for idx in sent:
+            if conn_status is not None:
+                results[idx] = (conn_status, 0, None) if self.mode != "sanitycheck" else (-1, 0, 0)
+                continue
+            if self.mode == "sanitycheck":
+                results[idx] = await self.read_stat_response(article_names[idx])
+                if results[idx][2] is None:
+                    conn_status = -2
+                    results[idx] = (-1, 0, 0)
+            else:
+                results[idx] = await self.read_body_response(article_names[idx])
+                if results[idx][0] in [-2, -3]:
+                    conn_status = results[idx][0]
+        return results
+
+    async def read_stat_response(self, article_name):
+        try:
+            resp, number, message_id = self.nntpobj.statparse(await self.nntpobj.getresp())
+            if article_name != message_id:
+                status = -1
             else:
-                result = None
+                status = 1
+        except nntplib.NNTPError as e:
+            self.logger.error(whoami() + str(e) + self.idn + " for article " + article_name)
+            if e.response[:3] in ["423", "430"]:
+                self.add_miss(article_name)
+            status = -1
+        except Exception as e:
+            self.logger.error(whoami() + str(e) + self.idn + " for article " + article_name)
+            return -1, 0, None
+        return status, 0, 0
+
+    async def read_body_response(self, article_name):
+        bytesdownloaded = 0
+        info0 = None
+        try:
+            resp, info0, wirebytes = await self.nntpobj.getbody()
+            if info0 is not None:
+                status = 1
+                bytesdownloaded = len(info0[0])
+                self.bytes_compressed += wirebytes
+                self.bytes_uncompressed += bytesdownloaded
+                if self.limiter:
+                    delay = self.limiter.consume(self.name, wirebytes)
+                    if delay > 0:
+                        await self.wait_running(delay)
+            else:
+                self.logger.warning(whoami() + resp + ": could not find " + article_name + " on " + self.idn)
+                status = 0
+        # nntpError 4xx - Command was syntactically correct but failed for some reason
+        except nntplib.NNTPTemporaryError as e:
+            errcode = e.response.strip()[:3]
+            if errcode == "400":
+                # server quits, new connection has to be established
+                self.server_errors += 1
+                status = -2
+            else:
+                # 423/430: no such article
+                if errcode in ["423", "430"]:
+                    self.add_miss(article_name)
+                status = 0
+            self.logger.warning(whoami() + e.response + ": could not find " + article_name + " on " + self.idn)
+        # nntpError 5xx - Command unknown error
+        except nntplib.NNTPPermanentError as e:
+            errcode = e.response.strip()[:3]
+            if errcode in ["503", "502"]:
+                # timeout, closing connection
+                self.server_errors += 1
+                status = -2
+            else:
+                status = 0
+            self.logger.warning(whoami() + e.response + ": could not find " + article_name + " on " + self.idn)
+        except nntplib.NNTPError as e:
+            status = 0
+            self.logger.warning(whoami() + e.response + ": could not find " + article_name + " on " + self.idn)
+        except asyncio.CancelledError:
+            status = -3
+        except (asyncio.TimeoutError, EOFError, ConnectionError, OSError, AttributeError) as e:
+            status = -2
+            self.logger.warning(whoami() + str(e) + ": " + article_name + " on " + self.idn)
+        except Exception as e:
+            status = 0
+            self.logger.warning(whoami() + str(e) + ": " + article_name + " on " + self.idn)
+        return status, bytesdownloaded, info0
+
+    async def run(self):
+        self.logger.info(whoami() + self.idn + " coroutine starting !")
+        timeout = 2
+        self.tt_pause_started = None
+        while self.running:
+            self.download_done = True
+            if self.paused:
+                if not self.tt_pause_started:
+                    self.tt_pause_started = time.time()
+                elif time.time() - self.tt_pause_started > self.connection_idle_time and self.nntpobj:
+                    await self.close_connection()
+                    self.logger.info(whoami() + self.idn + " connection idle, closed!")
+                    self.connectionstate = -1
+                await asyncio.sleep(0.25)
+                continue
+            else:
+                self.tt_pause_started = None
+            article = self.articlequeue.pop_for(self.name)
+            if not article:
+                await self.engine.wait_articlequeue(1)
+                continue
+            self.download_done = False
+            if not self.nntpobj:
+                await self.retry_connect()
+            filename, age, filetype, nr_articles, art_nr, art_name, remaining_servers1 = article
+            if not remaining_servers1:
+                self.engine.send_result((filename, age, filetype, nr_articles, art_nr, art_name, [], "failed", True))
+                continue
+            if not self.nntpobj:
+                self.articlequeue.append(article)
+                continue
+            articles = [article] + self.articlequeue.pop_many_for(self.name, self.pipeline - 1)
+            if self.hedger:
+                articles = self.hedger.track(articles, self.idn)
+                if not articles:
+                    continue
+            results = await self.download_articles([a[5] for a in articles], [a[1] for a in articles])
+            connection_error = False
+            for article0, (status, bytesdownloaded, info) in zip(articles, results):
+                filename, age, filetype, nr_articles, art_nr, art_name, remaining_servers1 = article0
+                if status == -3:
+                    self.hedge_release(article0)
+                    self.articlequeue.append(article0)
+                elif status == 1:
+                    self.last_downloaded_ts = time.time()
+                    timeout = 2
+                    self.bytesdownloaded += bytesdownloaded
+                    self.articles_downloaded += 1
+                    if self.hedge_finish(article0, bytesdownloaded):
+                        if self.shm_ring:
+                            info = self.shm_ring.store(info)
+                        self.engine.send_result((filename, age, filetype, nr_articles, art_nr, art_name, self.name, info, True))
+                elif status == -2:
+                    connection_error = True
+                    next_servers = remove_from_remaining_servers(self.name, remaining_servers1)
+                    next_servers.append([self.name])    # add current server to end of list
+                    self.hedge_release(article0)
+                    self.logger.debug(whoami() + "Requeuing " + art_name + " on server " + self.idn)
+                    self.articlequeue.append((filename, age, filetype, nr_articles, art_nr, art_name, next_servers))
+                elif status in [0, -1]:
+                    timeout = 2
+                    next_servers = remove_from_remaining_servers(self.name, remaining_servers1)
+                    if not next_servers:
+                        self.logger.error(whoami() + "Download finally failed on server " + self.idn + ": for article " + art_name + " "
+                                          + str(next_servers))
+                        if self.hedge_finish(article0, 0):
+                            self.engine.send_result((filename, age, filetype, nr_articles, art_nr, art_name, [], "failed", True))
+                    else:
+                        self.logger.debug(whoami() + "Download failed on server " + self.idn + ": for article " + art_name + ", queueing: "
+                                          + str(next_servers))
+                        self.hedge_release(article0)
+                        self.articlequeue.append((filename, age, filetype, nr_articles, art_nr, art_name, next_servers))
+            if any(r[0] == -3 for r in results) or not self.running:
                 break
-    return result
+            if connection_error:
+                self.logger.warning(whoami() + self.idn + " server connection error, reconnecting ...")
+                self.connectionstate = -1
+                await self.close_connection()
+                await self.wait_running(timeout)
+                timeout *= 2
+                if timeout > 30:
+                    timeout = 2
+        await self.close_connection()
+        self.logger.info(whoami() + self.idn + " exited!")
+
+
+# drives all connections as coroutines from one event loop which runs in its own thread,
+# articles + results use the same queue / zmq protocol as the threaded engine
+class AioConnectionThreads(ConnectionThreads):
+    def __init__(self, cfg, articlequeue, port, server_ts, logger, shm_ring=None, main_dir=None):
+        ConnectionThreads.__init__(self, cfg, articlequeue, port, server_ts, logger, shm_ring=shm_ring, main_dir=main_dir)
+        self.loop = None
+        self.loopthread = None
+        self.article_event = None
+        # worker -> concurrent future of its run() coroutine
+        self.futures = {}
+        self.context = None
+        self.socket = None
+        # one batcher for all coroutines, flushed by flush_results()
+        self.batcher = None
+        self.flush_task = None
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def init_loop(self):
+        self.article_event = asyncio.Event()
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.PUSH)
+        self.socket.connect("tcp://127.0.0.1:%d" % self.port)
+        batch_size, batch_delay = get_batch_config(self.cfg)
+        self.batcher = ResultBatcher(self.socket, max_results=batch_size, max_delay=batch_delay)
+        self.flush_task = asyncio.ensure_future(self.flush_results())
+
+    async def flush_results(self):
+        while True:
+            await asyncio.sleep(max(self.batcher.max_delay / 2, 0.01))
+            self.batcher.flush_if_due()
+
+    async def close_loop(self):
+        self.flush_task.cancel()
+        self.batcher.flush()
+
+    def send_result(self, result):
+        self.batcher.add(result)
+
+    async def wait_articlequeue(self, timeout):
+        self.article_event.clear()
+        try:
+            await asyncio.wait_for(self.article_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    # registered as listener on the article scheduler
+    def notify_articlequeue(self):
+        if self.loop and self.article_event:
+            self.loop.call_soon_threadsafe(self.article_event.set)
+
+    def start_worker(self, sn, scon):
+        t = AioConnectionWorker((sn, scon), self, self.servers, self.cfg, self.logger)
+        t.mode = self.mode
+        with self.threads_lock:
+            t.paused = self.paused
+            self.threads.append((t, time.time()))
+            self.futures[t] = asyncio.run_coroutine_threadsafe(t.run(), self.loop)
+        return t
+
+    # coroutine closes its connection itself
+    def stop_worker(self, t):
+        t.stop()
+        self.notify_articlequeue()
+        try:
+            self.futures.pop(t).result()
+        except Exception as e:
+            self.logger.warning(whoami() + str(e))
+
+    def start_threads(self):
+        if not self.threads:
+            self.logger.debug(whoami() + "starting download coroutines")
+            self.init_servers()
+            self.loop = asyncio.new_event_loop()
+            self.loopthread = Thread(target=self.run_loop, daemon=True)
+            self.loopthread.start()
+            asyncio.run_coroutine_threadsafe(self.init_loop(), self.loop).result()
+            self.articlequeue.add_listener(self.notify_articlequeue)
+            self.retired_threads = []
+            self.paused = False
+            if self.hedging:
+                self.hedger = ArticleHedger(self, self.logger, percentile=self.hedge_percentile)
+                self.hedger.start()
+            limits = self.get_connection_limits()
+            for sn, scon, _, _ in self.all_connections:
+                if self.autoscale and scon > limits[sn][0]:
+                    continue
+                self.start_worker(sn, scon)
+            if self.autoscale:
+                self.autoscaler = ConnectionAutoscaler(self, self.logger)
+                self.autoscaler.start()
+        else:
+            self.logger.debug(whoami() + "coroutines already started")
 
+    def stop_threads(self):
+        if not self.threads:
+            self.logger.debug(whoami() + "no coroutines running, exiting ...")
+            return
+        try:
+            self.logger.debug(whoami() + "stopping download coroutines + servers")
+            self.stop_autoscaler()
+            self.stop_hedger()
+            self.articlequeue.remove_listener(self.notify_articlequeue)
+            for t, _ in self.threads:
+                t.stop()
+                t.last_downloaded_ts = None
+            self.notify_articlequeue()
+            for f in self.futures.values():
+                try:
+                    f.result()
+                except Exception as e:
+                    self.logger.warning(whoami() + str(e))
+            self.futures = {}
+            del self.threads
+            self.threads = []
+            asyncio.run_coroutine_threadsafe(self.close_loop(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loopthread.join()
+            self.loop.close()
+            self.loop = None
+            self.socket.close()
+            self.socket = None
+            if self.servers:
+                del self.servers
+                self.servers = None
+            self.logger.debug(whoami() + "all coroutines / servers stopped")
+        except Exception as e:
+            self.logger.warning(whoami() + str(e))
 
-def mpconnector(child_pipe, cfg, server_ts, mp_loggerqueue):
+
+def remove_from_remaining_servers(name, remaining_servers):
+    next_servers = []
+    for s in remaining_servers:
+        addserver = s[:]
+        try:
+            addserver.remove(name)
+        except Exception:
+            pass
+        if addserver:
+            next_servers.append(addserver)
+    return next_servers
+
+
+def mpconnector(child_pipe, cfg, server_ts, mp_loggerqueue, shm_name=None, main_dir=None):
     setproctitle("gzbx." + os.path.basename(__file__))
 
     logger = mplogging.setup_logger(mp_loggerqueue, __file__)
@@ -482,15 +1289,43 @@ def mpconnector(child_pipe, cfg, server_ts, mp_loggerqueue):
     # poller to check if streamerdevice is empty
     poller = zmq.Poller()
     poller.register(socket, zmq.POLLIN)
+    # results arrive as multipart batches
+    receiver = ResultReceiver(socket)
 
-    thr_articlequeue = deque()
-    ct = ConnectionThreads(cfg, thr_articlequeue, connections_port, server_ts, logger)
+    # "threads": one thread per connection, "asyncio": all connections in one event loop
+    try:
+        connection_engine = cfg["OPTIONS"]["CONNECTION_ENGINE"].lower()
+        if connection_engine not in ["threads", "asyncio"]:
+            connection_engine = "threads"
+    except Exception:
+        connection_engine = "threads"
+    logger.info(whoami() + "using connection engine: " + connection_engine)
+
+    thr_articlequeue = ArticleScheduler()
+
+    # shared memory ring for article bodies, created by control_loop
+    shm_ring = None
+    if shm_name:
+        try:
+            shm_ring = ShmRing.attach(shm_name)
+        except Exception as e:
+            logger.warning(whoami() + str(e) + ": cannot attach shared memory ring, sending articles via zmq")
+    if connection_engine == "asyncio":
+        ct = AioConnectionThreads(cfg, thr_articlequeue, connections_port, server_ts, logger, shm_ring=shm_ring,
+                                  main_dir=main_dir)
+    else:
+        ct = ConnectionThreads(cfg, thr_articlequeue, connections_port, server_ts, logger, shm_ring=shm_ring,
+                               main_dir=main_dir)
 
     cmdlist = ("start", "stop", "pause", "resume", "reset_timestamps", "reset_timestamps_bdl",
                "get_downloaded_per_server", "exit", "clearqueues", "connection_thread_health", "get_server_config",
                "set_tmode_sanitycheck", "set_tmode_download", "get_level_servers", "clear_articlequeue",
                "queues_empty", "clear_resultqueue", "len_articlequeue", "push_articlequeue", "pull_resultqueue",
-               "push_entire_articlequeue", "pull_entire_resultqueue", "get_bytesdownloaded")
+               "push_entire_articlequeue", "pull_entire_resultqueue", "get_bytesdownloaded", "get_compression_stats",
+               "set_bandwidth_limit", "get_bandwidth_limits", "get_autoscaler_log", "bump_priority",
+               "get_hedging_stats", "get_miss_cache_stats", "clear_miss_cache",
+               "push_entire_articlequeue_unordered", "set_article_table", "reset_shm_ring", "get_shm_ring_stats",
+               "get_result_batch_stats", "set_backpressure", "update_file")
 
     quit_via_cmdexit = False
 
@@ -509,25 +1344,47 @@ def mpconnector(child_pipe, cfg, server_ts, mp_loggerqueue):
                     thr_articlequeue.append(param)
                 except Exception:
                     result = None
+            elif cmd == "set_article_table":
+                # param = ArticleTable of new nzb, queues are empty
+                thr_articlequeue.set_table(param)
+            elif cmd == "update_file":
+                # param = (old_filename, filename, filetype or None)
+                try:
+                    thr_articlequeue.update_file(*param)
+                except Exception as e:
+                    logger.warning(whoami() + str(e) + ": cannot update file in article table")
+                    result = None
             elif cmd == "push_entire_articlequeue":
+                # param = [(remaining_servers, handles into article table), ...]
+                try:
+                    thr_articlequeue.extend_handles(param)
+                except Exception:
+                    result = None
+            elif cmd == "push_entire_articlequeue_unordered":
+                # downloaded in random order, not by file priority (sanity check)
                 try:
-                    for article0 in param:
-                        thr_articlequeue.append(article0)
+                    thr_articlequeue.extend_handles(param, urgent=True, shuffle=True)
                 except Exception:
                     result = None
+            elif cmd == "set_backpressure":
+                # param = True: decoder backlog over memory budget, workers stop taking articles
+                thr_articlequeue.set_throttled(param)
+            elif cmd == "bump_priority":
+                # param = list of filenames to download first
+                try:
+                    thr_articlequeue.bump_priority(param)
+                except Exception as e:
+                    logger.warning(whoami() + str(e) + ": cannot bump priority")
+                    result = None
             elif cmd == "pull_entire_resultqueue":
-                result = get_from_streamingdevice(socket, onlyfirst=False)
+                result = receiver.pull_all()
                 logger.debug(whoami() + "len_articlequeue: " + str(len(ct.articlequeue)))
             elif cmd == "pull_resultqueue":
-                result = get_from_streamingdevice(socket, onlyfirst=True)
+                result = receiver.pull_one()
             elif cmd == "start":
                 ct.start_threads()
             elif cmd == "queues_empty":
-                socks = dict(poller.poll(timeout=10))
-                streamerdevice_empty = True
-                if socket in socks and socks[socket] == zmq.POLLIN:
-                    streamerdevice_empty = False
-                result = (len(ct.articlequeue) == 0) and streamerdevice_empty
+                result = (len(ct.articlequeue) == 0) and receiver.is_empty(poller)
             elif cmd == "get_bytesdownloaded":
                 result = ct.get_bytesdownloaded()
             elif cmd == "len_articlequeue":
@@ -538,29 +1395,57 @@ def mpconnector(child_pipe, cfg, server_ts, mp_loggerqueue):
             elif cmd == "clear_articlequeue":
                 ct.articlequeue.clear()
             elif cmd == "clear_resultqueue":
-                get_from_streamingdevice(socket, onlyfirst=False)
+                receiver.pull_all()
             elif cmd == "stop":
                 ct.stop_threads()
+                ct.miss_cache.save()
             elif cmd == "resume":
                 ct.resume_threads()
             elif cmd == "pause":
                 ct.pause_threads()
+                ct.miss_cache.save()
             elif cmd == "reset_timestamps":
                 ct.reset_timestamps()
             elif cmd == "reset_timestamps_bdl":
                 ct.reset_timestamps_bdl()
             elif cmd == "get_downloaded_per_server":
                 result = ct.get_downloaded_per_server()
+            elif cmd == "get_compression_stats":
+                result = ct.get_compression_stats()
+            elif cmd == "set_bandwidth_limit":
+                # param = (server_name or None for global, KiB/s or None to reset global to config)
+                try:
+                    server_name, rate_kib = param
+                    result = ct.limiter.set_limit(server_name, rate_kib)
+                except Exception as e:
+                    logger.warning(whoami() + str(e) + ": cannot set bandwidth limit")
+                    result = None
+            elif cmd == "get_bandwidth_limits":
+                result = ct.limiter.get_limits()
             elif cmd == "connection_thread_health":
                 result = ct.connection_thread_health()
             elif cmd == "get_server_config":
                 result = ct.get_server_config()
             elif cmd == "set_tmode_sanitycheck":
-                for t, _ in ct.threads:
-                    t.mode = "sanitycheck"
+                ct.set_mode("sanitycheck")
             elif cmd == "set_tmode_download":
-                for t, _ in ct.threads:
-                    t.mode = "download"
+                ct.set_mode("download")
+            elif cmd == "get_autoscaler_log":
+                result = ct.get_autoscaler_log()
+            elif cmd == "get_hedging_stats":
+                result = ct.get_hedging_stats()
+            elif cmd == "reset_shm_ring":
+                if ct.shm_ring:
+                    ct.shm_ring.reset()
+            elif cmd == "get_shm_ring_stats":
+                result = ct.shm_ring.get_stats() if ct.shm_ring else None
+            elif cmd == "get_result_batch_stats":
+                result = {"receiver": receiver.get_stats(), "senders": ct.get_result_batch_stats()}
+            elif cmd == "get_miss_cache_stats":
+                result = ct.miss_cache.get_stats()
+            elif cmd == "clear_miss_cache":
+                ct.miss_cache.clear()
+                ct.miss_cache.save()
             elif cmd == "get_level_servers":
                 le_serv0 = []
                 try:
@@ -581,12 +1466,17 @@ def mpconnector(child_pipe, cfg, server_ts, mp_loggerqueue):
                 break
             elif cmd == "clearqueues":
                 ct.articlequeue.clear()
-                get_from_streamingdevice(socket, onlyfirst=False)
+                if ct.hedger:
+                    ct.hedger.clear()
+                receiver.pull_all()
             child_pipe.send(result)
         else:
             child_pipe.send(None)
     logger.debug(whoami() + "shutting down ...")
     ct.stop_threads()
-    get_from_streamingdevice(socket, onlyfirst=False)
+    ct.miss_cache.save()
+    if ct.shm_ring:
+        ct.shm_ring.close()
+    receiver.pull_all()
     if quit_via_cmdexit:
         child_pipe.send(result)
@@ -0,0 +1,91 @@
+import zlib
+import nntplib
+
+from ginzibix.nntp_reader import CHUNK_SIZE
+
+
+# replaces nntplib's socket file after COMPRESS DEFLATE (RFC 8054): everything
+# read is inflated, everything written is deflated; counts bytes on the wire
+class DeflateFile:
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.decompressor = zlib.decompressobj(-15)
+        self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        self.rbuf = bytearray()
+        self.bytes_in = 0
+        self.bytes_inflated = 0
+
+    def fill(self):
+        while True:
+            data = self.fileobj.read1(CHUNK_SIZE)
+            if not data:
+                return False
+            self.bytes_in += len(data)
+            out = self.decompressor.decompress(data)
+            if out:
+                self.bytes_inflated += len(out)
+                self.rbuf += out
+                return True
+
+    def peek(self, n=0):
+        if not self.rbuf:
+            self.fill()
+        return bytes(self.rbuf)
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            while self.fill():
+                pass
+            n = len(self.rbuf)
+        while len(self.rbuf) < n and self.fill():
+            pass
+        data = bytes(self.rbuf[:n])
+        del self.rbuf[:n]
+        return data
+
+    def readline(self, limit=-1):
+        start = 0
+        while True:
+            idx = self.rbuf.find(b"\n", start)
+            if idx >= 0 or (limit > 0 and len(self.rbuf) >= limit):
+                n = idx + 1 if idx >= 0 else limit
+                if limit > 0:
+                    n = min(n, limit)
+                return self.read(n)
+            start = len(self.rbuf)
+            if not self.fill():
+                return self.read(len(self.rbuf))
+
+    def write(self, data):
+        return self.fileobj.write(self.compressor.compress(data))
+
+    def flush(self):
+        self.fileobj.write(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.fileobj.flush()
+
+    def close(self):
+        self.fileobj.close()
+
+
+# returns "deflate", "gzip" or None
+def negotiate_compression(nntpobj):
+    try:
+        caps = nntpobj.getcapabilities()
+    except Exception:
+        caps = {}
+    if "DEFLATE" in caps.get("COMPRESS", []):
+        try:
+            resp = nntpobj._shortcmd("COMPRESS DEFLATE")
+            if resp.startswith("206"):
+                nntpobj.file = DeflateFile(nntpobj.file)
+                return "deflate"
+        except nntplib.NNTPError:
+            pass
+    # XFEATURE is usually not listed in capabilities, so just try it
+    try:
+        resp = nntpobj._shortcmd("XFEATURE COMPRESS GZIP TERMINATOR")
+        if resp.startswith("290"):
+            return "gzip"
+    except nntplib.NNTPError:
+        pass
+    return None
@@ -0,0 +1,115 @@
+import zlib
+
+# reads dot-terminated NNTP multiline responses into one contiguous buffer
+# instead of nntplib's list of lines; the body is handed over as a single
+# chunk, ginzyenc decodes lists of chunks just like lists of lines
+
+CHUNK_SIZE = 65536
+TERMINATOR = b"\r\n.\r\n"
+
+
+# returns (index after terminator, index of body end incl. last CRLF) or (-1, -1)
+def find_terminator(buf, start=0):
+    if buf[:3] == b".\r\n":
+        return 3, 0
+    idx = buf.find(TERMINATOR, start)
+    if idx < 0:
+        return -1, -1
+    return idx + 5, idx + 2
+
+
+def dot_unstuff(body):
+    if body[:2] == b"..":
+        body = body[1:]
+    return body.replace(b"\r\n..", b"\r\n.")
+
+
+# reads body from a buffered (nntplib) file object, consumes exactly up to the
+# terminator, so pipelined responses behind it stay in the buffer
+def read_dot_terminated(fileobj):
+    buf = bytearray()
+    while True:
+        chunk = fileobj.peek(CHUNK_SIZE)
+        if not chunk:
+            raise EOFError("connection closed while reading body")
+        searchstart = max(len(buf) - 4, 0)
+        buf += chunk
+        end, bodyend = find_terminator(buf, searchstart)
+        if end >= 0:
+            fileobj.read(end - (len(buf) - len(chunk)))
+            del buf[bodyend:]
+            return dot_unstuff(bytes(buf))
+        fileobj.read(len(chunk))
+
+
+# zlib or gzip header at start of a XFEATURE COMPRESS GZIP block; a zlib header is
+# CMF (deflate, window <= 32K) + FLG with (CMF * 256 + FLG) % 31 == 0 and no preset dict,
+# so plain bodies which just start with "x" are not taken for compressed ones
+def is_compressed_block(head):
+    if len(head) < 2:
+        return False
+    if head[0] == 0x1f and head[1] == 0x8b:
+        return True
+    return head[0] & 0x0f == 8 and head[0] >> 4 <= 7 and (head[0] * 256 + head[1]) % 31 == 0 and not head[1] & 0x20
+
+
+# decompressed block may still carry the dot terminator
+def finish_compressed_block(data):
+    end, bodyend = find_terminator(data)
+    if end == len(data):
+        data = data[:bodyend]
+    return dot_unstuff(data)
+
+
+# reads a multiline block after XFEATURE COMPRESS GZIP, returns body, bytes on wire;
+# uncompressed blocks are read as usual
+def read_compressed_block(fileobj):
+    head = fileobj.peek(2)
+    if not head:
+        raise EOFError("connection closed while reading body")
+    if not is_compressed_block(head):
+        body = read_dot_terminated(fileobj)
+        return body, len(body)
+    decompressor = zlib.decompressobj(47)
+    out = []
+    wire = 0
+    while not decompressor.eof:
+        chunk = fileobj.peek(CHUNK_SIZE)
+        if not chunk:
+            raise EOFError("connection closed while reading compressed body")
+        out.append(decompressor.decompress(chunk))
+        used = len(chunk) - len(decompressor.unused_data)
+        fileobj.read(used)
+        wire += used
+    # TERMINATOR variant: ".\r\n" follows the compressed data
+    if fileobj.peek(3)[:1] == b".":
+        wire += len(fileobj.readline())
+    return finish_compressed_block(b"".join(out)), wire
+
+
+# reads BODY response (after the command was sent) from nntplib object,
+# returns resp, [body], bytes received on the wire for the body
+def read_body(nntpobj, compression=None):
+    fileobj = nntpobj.file
+    bytes_in0 = getattr(fileobj, "bytes_in", 0)
+    resp = nntpobj._getresp()
+    if not resp.startswith("222"):
+        return resp, None, 0
+    if compression == "gzip":
+        body, wire = read_compressed_block(fileobj)
+    else:
+        body = read_dot_terminated(fileobj)
+        wire = len(body)
+        if compression == "deflate":
+            wire = fileobj.bytes_in - bytes_in0
+    return resp, [body], wire
+
+
+# returns last non-empty line of an article given as list of chunks/lines
+def get_last_line(chunks):
+    last = chunks[-1]
+    end = len(last)
+    while end > 0 and last[end - 1] in b"\r\n":
+        end -= 1
+    start = last.rfind(b"\n", 0, end) + 1
+    return last[start:end]
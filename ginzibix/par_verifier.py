@@ -105,17 +105,17 @@ def par_verifier(child_pipe, renamed_dir, verifiedrar_dir, main_dir, mp_loggerqu
         logger.debug(whoami() + "verifying all unchecked rarfiles")
         for filename, f_origname in unverified_rarfiles:
             f_short = filename.split("/")[-1]
-            md5 = calc_file_md5hash(renamed_dir + filename)
+            md5 = pwdb.exc("db_file_get_md5", [filename], {}) or calc_file_md5hash(renamed_dir + filename)
             md5match = [(pmd5 == md5) for pname, pmd5 in p2.filenames() if pname == filename]
             if False in md5match:
                 logger.warning(whoami() + " error in md5 hash match for file " + f_short)
-                pwdb.exc("db_msg_insert", [nzbname, "error in md5 hash match for file " + f_short, "warning"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "error in md5 hash match for file " + f_short, "warning"], {})
                 pwdb.exc("db_nzb_update_verify_status", [nzbname, -2], {})
                 pwdb.exc("db_file_update_parstatus", [f_origname, -1], {})
                 child_pipe.send(True)
             else:
                 logger.info(whoami() + f_short + " md5 hash match ok, copying to verified_rar dir")
-                pwdb.exc("db_msg_insert", [nzbname, f_short + " md5 hash match ok, copying to verified_rar dir ", "info"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, f_short + " md5 hash match ok, copying to verified_rar dir ", "info"], {})
                 shutil.copy(renamed_dir + filename, verifiedrar_dir)
                 pwdb.exc("db_file_update_parstatus", [f_origname, 1], {})
     elif (pvmode == "verify" and not p2) or (pvmode == "copy"):
@@ -125,13 +125,13 @@ def par_verifier(child_pipe, renamed_dir, verifiedrar_dir, main_dir, mp_loggerqu
             sfvcheck = pwdb.exc("db_nzb_check_sfvcrc32", [nzbname, renamed_dir, renamed_dir + filename], {})
             if sfvcheck == -1:
                 logger.warning(whoami() + " error in crc32 check for file " + f_short)
-                pwdb.exc("db_msg_insert", [nzbname, "error in crc32 check for file " + f_short, "warning"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "error in crc32 check for file " + f_short, "warning"], {})
                 pwdb.exc("db_nzb_update_verify_status", [nzbname, -2], {})
                 pwdb.exc("db_file_update_parstatus", [f_origname, -1], {})
                 child_pipe.send(True)
                 continue
             logger.debug(whoami() + "copying " + f_short + " to verified_rar dir")
-            pwdb.exc("db_msg_insert", [nzbname, "copying " + f_short + " to verified_rar dir ", "info"], {})
+            pwdb.exc_async("db_msg_insert", [nzbname, "copying " + f_short + " to verified_rar dir ", "info"], {})
             shutil.copy(renamed_dir + filename, verifiedrar_dir)
             pwdb.exc("db_file_update_parstatus", [f_origname, 1], {})
 
@@ -168,19 +168,19 @@ def par_verifier(child_pipe, renamed_dir, verifiedrar_dir, main_dir, mp_loggerqu
                         continue
                     if pwdb.exc("db_file_getparstatus", [rar0], {}) == 0 and f0_renamedname != "N/A":
                         f_short = f0_renamedname.split("/")[-1]
-                        md5 = calc_file_md5hash(renamed_dir + rar0)
+                        md5 = pwdb.exc("db_file_get_md5", [rar0], {}) or calc_file_md5hash(renamed_dir + rar0)
                         md5match = [(pmd5 == md5) for pname, pmd5 in p2.filenames() if pname == f0_renamedname]
                         #print(f0_renamedname, md5, " : ", p2.filenames())
                         #print(md5match)
                         #print("-" * 80)
                         if True in md5match:
                             logger.info(whoami() + f_short + " md5 hash match ok, copying to verified_rar dir")
-                            pwdb.exc("db_msg_insert", [nzbname, f_short + " md5 hash match ok, copying to verified_rar dir ", "info"], {})
+                            pwdb.exc_async("db_msg_insert", [nzbname, f_short + " md5 hash match ok, copying to verified_rar dir ", "info"], {})
                             shutil.copy(renamed_dir + f0_renamedname, verifiedrar_dir)
                             pwdb.exc("db_file_update_parstatus", [f0_origname, 1], {})
                         elif False in md5match:
                             logger.warning(whoami() + "error in md5 hash match for file " + f_short)
-                            pwdb.exc("db_msg_insert", [nzbname, "error in md5 hash match for file " + f_short, "warning"], {})
+                            pwdb.exc_async("db_msg_insert", [nzbname, "error in md5 hash match for file " + f_short, "warning"], {})
                             pwdb.exc("db_nzb_update_verify_status", [nzbname, -2], {})
                             pwdb.exc("db_file_update_parstatus", [f0_origname, -1], {})
                             child_pipe.send(True)
@@ -188,14 +188,14 @@ def par_verifier(child_pipe, renamed_dir, verifiedrar_dir, main_dir, mp_loggerqu
                             sfvcheck = pwdb.exc("db_nzb_check_sfvcrc32", [nzbname, renamed_dir, rar], {})
                             if sfvcheck == -1:
                                 logger.warning(whoami() + " error in crc32 check for file " + rar0)
-                                pwdb.exc("db_msg_insert", [nzbname, "error in crc32 check for file " + rar0, "warning"], {})
+                                pwdb.exc_async("db_msg_insert", [nzbname, "error in crc32 check for file " + rar0, "warning"], {})
                                 pwdb.exc("db_nzb_update_verify_status", [nzbname, -2], {})
                                 pwdb.exc("db_file_update_parstatus", [f0_origname, -1], {})
                                 child_pipe.send(True)
                                 continue
                             if pwdb.exc("db_file_getparstatus", [rar0], {}) == 0 and f0_renamedname != "N/A":
                                 logger.debug(whoami() + "no md5 check, copying " + f0_renamedname.split("/")[-1] + " to verified_rar dir")
-                                pwdb.exc("db_msg_insert", [nzbname, "no md5 check, copying " + f0_renamedname.split("/")[-1] + " to verified_rar dir", "info"], {})
+                                pwdb.exc_async("db_msg_insert", [nzbname, "no md5 check, copying " + f0_renamedname.split("/")[-1] + " to verified_rar dir", "info"], {})
                                 shutil.copy(renamed_dir + f0_renamedname, verifiedrar_dir)
                                 pwdb.exc("db_file_update_parstatus", [f0_origname, 1], {})
             # free rars or copy mode?
@@ -213,14 +213,14 @@ def par_verifier(child_pipe, renamed_dir, verifiedrar_dir, main_dir, mp_loggerqu
                         sfvcheck = pwdb.exc("db_nzb_check_sfvcrc32", [nzbname, renamed_dir, file0full], {})
                         if sfvcheck == -1:
                             logger.warning(whoami() + " error in crc32 check for file " + rar0)
-                            pwdb.exc("db_msg_insert", [nzbname, "error in crc32 check for file " + rar0, "warning"], {})
+                            pwdb.exc_async("db_msg_insert", [nzbname, "error in crc32 check for file " + rar0, "warning"], {})
                             pwdb.exc("db_nzb_update_verify_status", [nzbname, -2], {})
                             pwdb.exc("db_file_update_parstatus", [f0_origname, -1], {})
                             child_pipe.send(True)
                             continue
                         if pwdb.exc("db_file_getparstatus", [rar0], {}) == 0 and f0_renamedname != "N/A":
                             logger.debug(whoami() + "copying " + f0_renamedname.split("/")[-1] + " to verified_rar dir")
-                            pwdb.exc("db_msg_insert", [nzbname, "copying " + f0_renamedname.split("/")[-1] + " to verified_rar dir", "info"], {})
+                            pwdb.exc_async("db_msg_insert", [nzbname, "copying " + f0_renamedname.split("/")[-1] + " to verified_rar dir", "info"], {})
                             shutil.copy(renamed_dir + f0_renamedname, verifiedrar_dir)
                             pwdb.exc("db_file_update_parstatus", [f0_origname, 1], {})
         allrarsverified, rvlist = pwdb.exc("db_only_verified_rars", [nzbname], {})
@@ -238,7 +238,7 @@ def par_verifier(child_pipe, renamed_dir, verifiedrar_dir, main_dir, mp_loggerqu
         logger.debug(whoami() + "rar files ok, no repair needed, exiting par_verifier")
         pwdb.exc("db_nzb_update_verify_status", [nzbname, 2], {})
     elif p2list and corruptrars:
-        pwdb.exc("db_msg_insert", [nzbname, "repairing rar files", "info"], {})
+        pwdb.exc_async("db_msg_insert", [nzbname, "repairing rar files", "info"], {})
         logger.info(whoami() + "par2vol files present, repairing ...")
         allok = True
         allfound = True
@@ -250,7 +250,7 @@ def par_verifier(child_pipe, renamed_dir, verifiedrar_dir, main_dir, mp_loggerqu
                 allfound = False
                 continue
             lrar = str(len(rarfiles))
-            pwdb.exc("db_msg_insert", [nzbname, "performing par2verify for " + fnshort, "info"], {})
+            pwdb.exc_async("db_msg_insert", [nzbname, "performing par2verify for " + fnshort, "info"], {})
             ssh = subprocess.Popen(['par2verify', fnlong], shell=False, stdout=subprocess.PIPE, stderr=subprocess. PIPE)
             sshres = ssh.stdout.readlines()
             repair_is_required = False
@@ -262,13 +262,13 @@ def par_verifier(child_pipe, renamed_dir, verifiedrar_dir, main_dir, mp_loggerqu
                 if "Repair is possible" in ss0:
                     repair_is_possible = True
             if not repair_is_required:
-                pwdb.exc("db_msg_insert", [nzbname, "par2verify for " + fnshort + ": repair is not required!", "info"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "par2verify for " + fnshort + ": repair is not required!", "info"], {})
                 res0 = 1
             elif repair_is_required and not repair_is_possible:
-                pwdb.exc("db_msg_insert", [nzbname, "par2verify for " + fnshort + ": repair is required but not possible", "error"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "par2verify for " + fnshort + ": repair is required but not possible", "error"], {})
                 res0 = -1
             elif repair_is_required and repair_is_possible:
-                pwdb.exc("db_msg_insert", [nzbname, "par2verify for " + fnshort + ": repair is required and possible, repairing files", "info"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "par2verify for " + fnshort + ": repair is required and possible, repairing files", "info"], {})
                 logger.info(whoami() + "repair is required and possible, performing par2repair")
                 # repair
                 ssh = subprocess.Popen(['par2repair', fnlong], shell=False, stdout=subprocess.PIPE, stderr=subprocess. PIPE)
@@ -288,14 +288,14 @@ def par_verifier(child_pipe, renamed_dir, verifiedrar_dir, main_dir, mp_loggerqu
             if res0 != 1:
                 allok = False
                 logger.error(whoami() + "repair failed for " + lrar + "rarfiles in " + fnshort)
-                pwdb.exc("db_msg_insert", [nzbname, "rar file repair failed for " + lrar + " rarfiles in " + fnshort + "!", "error"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "rar file repair failed for " + lrar + " rarfiles in " + fnshort + "!", "error"], {})
             else:
                 logger.info(whoami() + "repair success for " + lrar + "rarfiles in " + fnshort)
-                pwdb.exc("db_msg_insert", [nzbname, "rar file repair success for " + lrar + " rarfiles in " + fnshort + "!", "info"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "rar file repair success for " + lrar + " rarfiles in " + fnshort + "!", "info"], {})
         if not allfound:
             allok = False
             logger.error(whoami() + "cannot attempt one or more par2repairs due to missing par2 file(s)!")
-            pwdb.exc("db_msg_insert", [nzbname, "cannot attempt one or more par2repairs due to missing par2 file(s)!", "error"], {})
+            pwdb.exc_async("db_msg_insert", [nzbname, "cannot attempt one or more par2repairs due to missing par2 file(s)!", "error"], {})
         if allok:
             logger.info(whoami() + "repair success")
             pwdb.exc("db_nzb_update_verify_status", [nzbname, 2], {})
@@ -311,7 +311,7 @@ def par_verifier(child_pipe, renamed_dir, verifiedrar_dir, main_dir, mp_loggerqu
             for _, c_origname in corruptrars:
                 pwdb.exc("db_file_update_parstatus", [c_origname, -2], {})
     else:
-        pwdb.exc("db_msg_insert", ["nzbname", "rar file repair failed, no par files available", "error"], {})
+        pwdb.exc_async("db_msg_insert", ["nzbname", "rar file repair failed, no par files available", "error"], {})
         logger.warning(whoami() + "some rars are corrupt but cannot repair (no par2 files)")
         pwdb.exc("db_nzb_update_verify_status", [nzbname, -1], {})
     logger.info(whoami() + "terminated!")
@@ -395,7 +395,7 @@ def multipartrar_repair(directory, parvolname, pwdb, nzbname, logger):
     cwd0 = os.getcwd()
     os.chdir(directory)
     logger.info(whoami() + "checking if repair possible for " + parvolname)
-    pwdb.exc("db_msg_insert", [nzbname, "checking if repair is possible", "info"], {})
+    pwdb.exc_async("db_msg_insert", [nzbname, "checking if repair is possible", "info"], {})
     ssh = subprocess.Popen(['par2verify', parvolname], shell=False, stdout=subprocess.PIPE, stderr=subprocess. PIPE)
     sshres = ssh.stdout.readlines()
     repair_is_required = False
@@ -409,7 +409,7 @@ def multipartrar_repair(directory, parvolname, pwdb, nzbname, logger):
             repair_is_possible = True
     if repair_is_possible and repair_is_required:
         logger.info(whoami() + "repair is required and possible, performing par2repair")
-        pwdb.exc("db_msg_insert", [nzbname, "repair is required and possible, performing par2repair", "info"], {})
+        pwdb.exc_async("db_msg_insert", [nzbname, "repair is required and possible, performing par2repair", "info"], {})
         # repair
         ssh = subprocess.Popen(['par2repair', parvolname], shell=False, stdout=subprocess.PIPE, stderr=subprocess. PIPE)
         sshres = ssh.stdout.readlines()
@@ -426,7 +426,7 @@ def multipartrar_repair(directory, parvolname, pwdb, nzbname, logger):
             exitstatus = 1
     elif repair_is_required and not repair_is_possible:
         logger.error(whoami() + "repair is required but not possible!")
-        pwdb.exc("db_msg_insert", [nzbname, "repair is required but not possible!", "error"], {})
+        pwdb.exc_async("db_msg_insert", [nzbname, "repair is required but not possible!", "error"], {})
         exitstatus = -1
     elif not repair_is_required and not repair_is_possible:
         logger.error(whoami() + "repair is not required - all OK!")
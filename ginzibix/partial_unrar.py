@@ -161,15 +161,15 @@ def partial_unrar(directory, unpack_dir, nzbname, mp_loggerqueue, password, even
     if password:
         cmd = "unrar x -y -o+ -p" + password + " '" + directory + nextrarname + "' '" + unpack_dir + "'"
         logger.debug(whoami() + "rar archive is passworded, executing " + cmd)
-        pwdb.exc("db_msg_insert", [nzbname, "unraring pw protected rar archive", "info"], {})
+        pwdb.exc_async("db_msg_insert", [nzbname, "unraring pw protected rar archive", "info"], {})
         status = 1
         child = pexpect.spawn(cmd)
         status, statmsg, str0 = process_next_unrar_child_pass(event_idle, child, logger)
         if status < 0:
             logger.info(whoami() + nextrarname + ": " + statmsg)
-            pwdb.exc("db_msg_insert", [nzbname, "unrar " + nextrarname + " failed!", "error"], {})
+            pwdb.exc_async("db_msg_insert", [nzbname, "unrar " + nextrarname + " failed!", "error"], {})
         else:
-            pwdb.exc("db_msg_insert", [nzbname, "checking for double packed rars", "info"], {})
+            pwdb.exc_async("db_msg_insert", [nzbname, "checking for double packed rars", "info"], {})
             # check if double packed
             try:
                 child.kill(signal.SIGKILL)
@@ -177,7 +177,7 @@ def partial_unrar(directory, unpack_dir, nzbname, mp_loggerqueue, password, even
                 pass
             is_double_packed, fn = check_double_packed(unpack_dir)
             if is_double_packed:
-                pwdb.exc("db_msg_insert", [nzbname, "rars are double packed, starting unrar 2nd run", "warning"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "rars are double packed, starting unrar 2nd run", "warning"], {})
                 logger.debug(whoami() + "rars are double packed, executing " + cmd)
                 # unrar without pausing! 
                 cmd = "unrar x -y -o+ -p" + password + " '" + fn + "' '" + unpack_dir + "'"
@@ -185,11 +185,11 @@ def partial_unrar(directory, unpack_dir, nzbname, mp_loggerqueue, password, even
                 status, statmsg, str0 = process_next_unrar_child_pass(event_idle, child, logger)
                 if status < 0:
                     logger.info(whoami() + "2nd pass: " + statmsg)
-                    pwdb.exc("db_msg_insert", [nzbname, "unrar 2nd pass failed!", "error"], {})
+                    pwdb.exc_async("db_msg_insert", [nzbname, "unrar 2nd pass failed!", "error"], {})
                 elif status == 0:
                     statmsg = "All OK"
                     status = 0
-                    pwdb.exc("db_msg_insert", [nzbname, "unrar success 2nd pass for all rar files!", "info"], {})
+                    pwdb.exc_async("db_msg_insert", [nzbname, "unrar success 2nd pass for all rar files!", "info"], {})
                     logger.info(whoami() + "unrar success 2nd pass for all rar files!")
                     logger.debug(whoami() + "deleting all rar files in unpack_dir")
                     delete_all_rar_files(unpack_dir, logger)
@@ -197,16 +197,16 @@ def partial_unrar(directory, unpack_dir, nzbname, mp_loggerqueue, password, even
                     status = -3
                     statmsg = "unknown error"
                     logger.info(whoami() + "2nd pass: " + statmsg + " / " + str0)
-                    pwdb.exc("db_msg_insert", [nzbname, "unrar 2nd pass failed!", "error"], {})
+                    pwdb.exc_async("db_msg_insert", [nzbname, "unrar 2nd pass failed!", "error"], {})
             else:
                 statmsg = "All OK"
                 status = 0
-                pwdb.exc("db_msg_insert", [nzbname, "unrar success for all rar files!", "info"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "unrar success for all rar files!", "info"], {})
                 logger.info(whoami() + "unrar success for all rar files!")
     else:
         cmd = "unrar x -y -o+ -vp '" + directory + nextrarname + "' '" + unpack_dir + "'"
         logger.debug(whoami() + "rar archive is NOT passworded, executing " + cmd)
-        pwdb.exc("db_msg_insert", [nzbname, "unraring rar archive", "info"], {})
+        pwdb.exc_async("db_msg_insert", [nzbname, "unraring rar archive", "info"], {})
 
         child = pexpect.spawn(cmd)
         status = 1      # 1 ... running, 0 ... exited ok, -1 ... rar corrupt, -2 ..missing rar, -3 ... unknown error
@@ -222,11 +222,11 @@ def partial_unrar(directory, unpack_dir, nzbname, mp_loggerqueue, password, even
             #print(delta_size / delta_t, "M decompressed per sec")
             if status < 0:
                 logger.info(whoami() + nextrarname + ": " + statmsg)
-                pwdb.exc("db_msg_insert", [nzbname, "unrar " + oldnextrarname + " failed!", "error"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "unrar " + oldnextrarname + " failed!", "error"], {})
                 break
             logger.info(whoami() + nextrarname + ": unrar success!")
             if status == 0:
-                pwdb.exc("db_msg_insert", [nzbname, "checking for double packed rars", "info"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "checking for double packed rars", "info"], {})
                 # check if double packed
                 try:
                     child.kill(signal.SIGKILL)
@@ -234,7 +234,7 @@ def partial_unrar(directory, unpack_dir, nzbname, mp_loggerqueue, password, even
                     pass
                 is_double_packed, fn = check_double_packed(unpack_dir)
                 if is_double_packed:
-                    pwdb.exc("db_msg_insert", [nzbname, "rars are double packed, starting unrar 2nd run", "warning"], {})
+                    pwdb.exc_async("db_msg_insert", [nzbname, "rars are double packed, starting unrar 2nd run", "warning"], {})
                     cmd = "unrar x -y -o+ '" + fn + "' '" + unpack_dir + "'"
                     logger.debug(whoami() + "rars are double packed, executing " + cmd)
                     # unrar without pausing!
@@ -242,12 +242,12 @@ def partial_unrar(directory, unpack_dir, nzbname, mp_loggerqueue, password, even
                     status, statmsg, str0 = process_next_unrar_child_pass(event_idle, child, logger)
                     if status < 0:
                         logger.info(whoami() + "2nd pass: " + statmsg)
-                        pwdb.exc("db_msg_insert", [nzbname, "unrar 2nd pass failed!", "error"], {})
+                        pwdb.exc_async("db_msg_insert", [nzbname, "unrar 2nd pass failed!", "error"], {})
                         break
                     if status == 0:
                         statmsg = "All OK"
                         status = 0
-                        pwdb.exc("db_msg_insert", [nzbname, "unrar success 2nd pass for all rar files!", "info"], {})
+                        pwdb.exc_async("db_msg_insert", [nzbname, "unrar success 2nd pass for all rar files!", "info"], {})
                         logger.info(whoami() + "unrar success 2nd pass for all rar files!")
                         logger.debug(whoami() + "deleting all rar files in unpack_dir")
                         delete_all_rar_files(unpack_dir, logger)
@@ -256,12 +256,12 @@ def partial_unrar(directory, unpack_dir, nzbname, mp_loggerqueue, password, even
                         status = -3
                         statmsg = "unknown error"
                         logger.info(whoami() + "2nd pass: " + statmsg + " / " + str0)
-                        pwdb.exc("db_msg_insert", [nzbname, "unrar 2nd pass failed!", "error"], {})
+                        pwdb.exc_async("db_msg_insert", [nzbname, "unrar 2nd pass failed!", "error"], {})
                         break
                 else:
                     statmsg = "All OK"
                     status = 0
-                    pwdb.exc("db_msg_insert", [nzbname, "unrar success for all rar files!", "info"], {})
+                    pwdb.exc_async("db_msg_insert", [nzbname, "unrar success for all rar files!", "info"], {})
                     logger.info(whoami() + "unrar success for all rar files!")
                     break
             try:
@@ -272,9 +272,9 @@ def partial_unrar(directory, unpack_dir, nzbname, mp_loggerqueue, password, even
                 logger.warning(whoami() + str(e) + ", unknown error")
                 statmsg = "unknown error in re evalution"
                 status = -4
-                pwdb.exc("db_msg_insert", [nzbname, "unrar " + oldnextrarname + " failed!", "error"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "unrar " + oldnextrarname + " failed!", "error"], {})
                 break
-            pwdb.exc("db_msg_insert", [nzbname, "unrar " + oldnextrarname + " success!", "info"], {})
+            pwdb.exc_async("db_msg_insert", [nzbname, "unrar " + oldnextrarname + " success!", "info"], {})
             logger.debug(whoami() + "Waiting for next rar: " + nextrarname)
             # first, if .r00
             try:
@@ -317,7 +317,7 @@ def partial_unrar(directory, unpack_dir, nzbname, mp_loggerqueue, password, even
                         if f0_number == -1:
                             continue
                         if f0_wo_number == nextrar_wo_number and f0_number > nextrar_number:
-                            pwdb.exc("db_msg_insert", [nzbname, "unrar waiting for next rar, but next rar " + nextrar_short + " seems to be skipped, you may want to interrupt ...", "warning"], {})
+                            pwdb.exc_async("db_msg_insert", [nzbname, "unrar waiting for next rar, but next rar " + nextrar_short + " seems to be skipped, you may want to interrupt ...", "warning"], {})
                             break
 
             event_idle.clear()
@@ -77,7 +77,7 @@ def make_complete_dir(dirs, nzbdir, logger):
 
 
 def postprocess_nzb(nzbname, articlequeue, resultqueue, mp_work_queue, pipes, mpp0, mp_events, cfg, verifiedrar_dir,
-                    unpack_dir, nzbdir, rename_dir, main_dir, download_dir, dirs, pw_file, mp_loggerqueue):
+                    unpack_dir, nzbdir, rename_dir, main_dir, download_dir, dirs, pw_file, mp_loggerqueue, decoder_pending=None):
 
     setproctitle("gzbx." + os.path.basename(__file__))
     pwdb = PWDBSender()
@@ -105,7 +105,7 @@ def postprocess_nzb(nzbname, articlequeue, resultqueue, mp_work_queue, pipes, mp
     event_verifieridle = mp_events["verifier"]
     event_unrareridle = mp_events["unrarer"]
 
-    pwdb.exc("db_msg_insert", [nzbname, "starting postprocess", "info"], {})
+    pwdb.exc_async("db_msg_insert", [nzbname, "starting postprocess", "info"], {})
     logger.debug(whoami() + "starting clearing queues & pipes")
 
     # clear pipes
@@ -117,16 +117,16 @@ def postprocess_nzb(nzbname, articlequeue, resultqueue, mp_work_queue, pipes, mp
     except Exception as e:
         logger.error(whoami() + str(e))
         pwdb.exc("db_nzb_update_status", [nzbname, -4], {})
-        pwdb.exc("db_msg_insert", [nzbname, "postprocessing/clearing pipes failed!", "error"], {})
+        pwdb.exc_async("db_msg_insert", [nzbname, "postprocessing/clearing pipes failed!", "error"], {})
         sys.exit()
     logger.debug(whoami() + "clearing queues & pipes done!")
 
-    # join decoder
+    # join decoder: wait until all articles are written and all files are moved to download dir
     if mpp_is_alive(mpp, "decoder"):
         t0 = time.time()
         timeout_reached = False
         try:
-            while mp_work_queue.qsize() > 0:
+            while (decoder_pending.value if decoder_pending is not None else mp_work_queue.qsize()) > 0:
                 if time.time() - t0 > 60 * 3:
                     timeout_reached = True
                     break
@@ -196,7 +196,7 @@ def postprocess_nzb(nzbname, articlequeue, resultqueue, mp_work_queue, pipes, mp
     # if verifier is running but wrong status, or correct status but not running, exit
     elif mpp_is_alive(mpp, "verifier") or verifystatus == 1:
         pwdb.exc("db_nzb_update_status", [nzbname, -4], {})
-        pwdb.exc("db_msg_insert", [nzbname, "par_verifier status inconsistency", "error"], {})
+        pwdb.exc_async("db_msg_insert", [nzbname, "par_verifier status inconsistency", "error"], {})
         logger.debug(whoami() + "something is wrong with par_verifier, exiting postprocessor")
         logger.info(whoami() + "postprocess of NZB " + nzbname + " failed!")
         if mpp_is_alive(mpp, "verifier"):
@@ -216,16 +216,16 @@ def postprocess_nzb(nzbname, articlequeue, resultqueue, mp_work_queue, pipes, mp
         pwdb.exc("db_nzb_set_ispw_checked", [nzbname, True], {})
         if ispw == 0 or ispw == -2 or ispw == -3:
             logger.warning(whoami() + "cannot test rar if pw protected, something is wrong: " + str(ispw) + ", exiting ...")
-            pwdb.exc("db_msg_insert", [nzbname, "postprocessing failed due to pw test not possible", "error"], {})
+            pwdb.exc_async("db_msg_insert", [nzbname, "postprocessing failed due to pw test not possible", "error"], {})
             pwdb.exc("db_nzb_update_status", [nzbname, -4], {})
             sys.exit()
         elif ispw == 1:
             pwdb.exc("db_nzb_set_ispw", [nzbname, True], {})
-            pwdb.exc("db_msg_insert", [nzbname, "rar archive is password protected", "warning"], {})
+            pwdb.exc_async("db_msg_insert", [nzbname, "rar archive is password protected", "warning"], {})
             logger.info(whoami() + "rar archive is pw protected")
         elif ispw == -1:
             pwdb.exc("db_nzb_set_ispw", [nzbname, False], {})
-            pwdb.exc("db_msg_insert", [nzbname, "rar archive is NOT password protected", "info"], {})
+            pwdb.exc_async("db_msg_insert", [nzbname, "rar archive is NOT password protected", "info"], {})
             logger.info(whoami() + "rar archive is NOT pw protected")
     ispw = pwdb.exc("db_nzb_get_ispw", [nzbname], {})
     unrarernewstarted = False
@@ -237,16 +237,16 @@ def postprocess_nzb(nzbname, articlequeue, resultqueue, mp_work_queue, pipes, mp
             logger.warning(whoami() + str(e))
         if pwdb.exc("db_nzb_get_password", [nzbname], {}) == "N/A":
             logger.info(whoami() + "Trying to get password from file for NZB " + nzbname)
-            pwdb.exc("db_msg_insert", [nzbname, "trying to get password", "info"], {})
+            pwdb.exc_async("db_msg_insert", [nzbname, "trying to get password", "info"], {})
             pw = passworded_rars.get_password(verifiedrar_dir, pw_file, nzbname, logger, get_pw_direct=get_pw_direct0)
             if pw:
                 logger.info(whoami() + "Found password " + pw + " for NZB " + nzbname)
-                pwdb.exc("db_msg_insert", [nzbname, "found password " + pw, "info"], {})
+                pwdb.exc_async("db_msg_insert", [nzbname, "found password " + pw, "info"], {})
                 pwdb.exc("db_nzb_set_password", [nzbname, pw], {})
         else:
             pw = pwdb.exc("db_nzb_get_password", [nzbname], {})
         if not pw:
-            pwdb.exc("db_msg_insert", [nzbname, "Provided password was not correct / no password found in PW file! ", "error"], {})
+            pwdb.exc_async("db_msg_insert", [nzbname, "Provided password was not correct / no password found in PW file! ", "error"], {})
             logger.error(whoami() + "Cannot find password for NZB " + nzbname + "in postprocess, exiting ...")
             pwdb.exc("db_nzb_update_status", [nzbname, -4], {})
             mpp["unrarer"] = None
@@ -323,11 +323,11 @@ def postprocess_nzb(nzbname, articlequeue, resultqueue, mp_work_queue, pipes, mp
     logger.info(whoami() + "Finalverifierstate: " + str(finalverifierstate) + " / Finalrarstate: " + str(finalrarstate) + " / Finalnonrarstate: "
                 + str(finalnonrarstate))
     if finalrarstate and finalnonrarstate and finalverifierstate:
-        pwdb.exc("db_msg_insert", [nzbname, "unrar/par-repair ok!", "success"], {})
+        pwdb.exc_async("db_msg_insert", [nzbname, "unrar/par-repair ok!", "success"], {})
         logger.info(whoami() + "unrar/par-repair of NZB " + nzbname + " success!")
     else:
         pwdb.exc("db_nzb_update_status", [nzbname, -4], {})
-        pwdb.exc("db_msg_insert", [nzbname, "unrar/par-repair failed!", "error"], {})
+        pwdb.exc_async("db_msg_insert", [nzbname, "unrar/par-repair failed!", "error"], {})
         logger.info(whoami() + "postprocess of NZB " + nzbname + " failed!")
         sys.exit()
 
@@ -335,13 +335,13 @@ def postprocess_nzb(nzbname, articlequeue, resultqueue, mp_work_queue, pipes, mp
 
     # copy to complete
     logger.info(whoami() + "starting copy-to-complete")
-    pwdb.exc("db_msg_insert", [nzbname, "copying & cleaning directories", "info"], {})
+    pwdb.exc_async("db_msg_insert", [nzbname, "copying & cleaning directories", "info"], {})
     complete_dir = make_complete_dir(dirs, nzbdir, logger)
     if not complete_dir:
         pwdb.exc("db_nzb_update_status", [nzbname, -4], {})
-        pwdb.exc("db_msg_insert", [nzbname, "postprocessing failed!", "error"], {})
+        pwdb.exc_async("db_msg_insert", [nzbname, "postprocessing failed!", "error"], {})
         logger.info("Cannot create complete_dir for " + nzbname + ", exiting ...")
-        pwdb.exc("db_msg_insert", [nzbname, "postprocessing failed!", "error"], {})
+        pwdb.exc_async("db_msg_insert", [nzbname, "postprocessing failed!", "error"], {})
         sys.exit()
     # move all non-rar/par2/par2vol files from renamed to complete
     for f00 in glob.glob(rename_dir + "*") + glob.glob(rename_dir + ".*"):
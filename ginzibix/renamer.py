@@ -441,7 +441,8 @@ def renamer(child_pipe, renamer_result_queue, mp_loggerqueue, filewrite_lock):
                                 except Exception:
                                     pass
                             else:
-                                notrenamedfiles.append((fnfull, fnshort, par2lib.calc_file_md5hash_16k(fnfull)))
+                                md5_16k = pwdb.exc("db_file_get_md5", [fnshort], {"only16k": True}) or par2lib.calc_file_md5hash_16k(fnfull)
+                                notrenamedfiles.append((fnfull, fnshort, md5_16k))
                 # rename & move rar + remaining files
                 if notrenamedfiles:
                     # da hats was
@@ -0,0 +1,158 @@
+import time
+import pickle
+import zmq
+from collections import deque
+
+# results are sent from the connection workers in batches of multipart messages:
+#   frame 0:  pickled list of (result tuple, no. of body chunks), bodies (lists of
+#             bytes chunks) are replaced by None, no. of chunks is -1 if there is no body
+#   frame 1+: raw body chunks in the same order
+# so bodies are never pickled on the way to mpconnector
+
+# defaults for flushing a batch: no. of results, bytes of bodies, sec. since first result
+RESULT_BATCH_SIZE = 16
+RESULT_BATCH_BYTES = 8 * 1024 * 1024
+RESULT_BATCH_DELAY = 0.05
+
+
+# (max. results, max. delay) per batch from config
+def get_batch_config(cfg):
+    try:
+        max_results = int(cfg["OPTIONS"]["RESULT_BATCH_SIZE"])
+    except Exception:
+        max_results = RESULT_BATCH_SIZE
+    try:
+        max_delay = float(cfg["OPTIONS"]["RESULT_BATCH_DELAY"])
+    except Exception:
+        max_delay = RESULT_BATCH_DELAY
+    return max(max_results, 1), max(max_delay, 0)
+
+
+def is_body(info):
+    return isinstance(info, list) and all(isinstance(chunk, (bytes, bytearray)) for chunk in info)
+
+
+def encode_results(results):
+    meta = []
+    frames = [None]
+    for result in results:
+        info = result[7]
+        if is_body(info):
+            meta.append((result[:7] + (None, ) + result[8:], len(info)))
+            frames.extend(info)
+        else:
+            meta.append((result, -1))
+    frames[0] = pickle.dumps(meta)
+    return frames
+
+
+def decode_results(frames):
+    results = []
+    idx = 1
+    for result, nchunks in pickle.loads(frames[0]):
+        if nchunks < 0:
+            results.append(result)
+            continue
+        results.append(result[:7] + (frames[idx:idx + nchunks], ) + result[8:])
+        idx += nchunks
+    return results
+
+
+# worker side: collects results, flushes when batch is full or too old
+class ResultBatcher:
+    def __init__(self, socket, max_results=RESULT_BATCH_SIZE, max_bytes=RESULT_BATCH_BYTES, max_delay=RESULT_BATCH_DELAY):
+        self.socket = socket
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.results = []
+        self.nbytes = 0
+        self.ts_first = None
+        # metrics
+        self.batches_sent = 0
+        self.results_sent = 0
+        self.latency_sum = 0
+        self.latency_max = 0
+
+    def add(self, result):
+        if not self.results:
+            self.ts_first = time.time()
+        self.results.append(result)
+        if is_body(result[7]):
+            self.nbytes += sum(len(chunk) for chunk in result[7])
+        if len(self.results) >= self.max_results or self.nbytes >= self.max_bytes:
+            self.flush()
+
+    def flush(self):
+        if not self.results:
+            return
+        self.socket.send_multipart(encode_results(self.results), copy=False)
+        latency = time.time() - self.ts_first
+        self.batches_sent += 1
+        self.results_sent += len(self.results)
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.results = []
+        self.nbytes = 0
+        self.ts_first = None
+
+    # sec. until batch has to be flushed, default if nothing is pending
+    def get_timeout(self, default):
+        if not self.results:
+            return default
+        return max(min(default, self.ts_first + self.max_delay - time.time()), 0)
+
+    def flush_if_due(self):
+        if self.results and time.time() - self.ts_first >= self.max_delay:
+            self.flush()
+
+
+# mpconnector side: drains batches from the streamer device
+class ResultReceiver:
+    def __init__(self, socket):
+        self.socket = socket
+        self.pending = deque()
+        self.batches_received = 0
+        self.results_received = 0
+        self.max_batch_size = 0
+
+    def receive_batch(self):
+        try:
+            frames = self.socket.recv_multipart(flags=zmq.NOBLOCK)
+        except zmq.ZMQError:
+            return False
+        results = decode_results(frames)
+        self.batches_received += 1
+        self.results_received += len(results)
+        self.max_batch_size = max(self.max_batch_size, len(results))
+        self.pending.extend(results)
+        return True
+
+    # list of all available results or None
+    def pull_all(self):
+        while self.receive_batch():
+            pass
+        if not self.pending:
+            return None
+        result = list(self.pending)
+        self.pending.clear()
+        return result
+
+    # next result or None
+    def pull_one(self):
+        if not self.pending:
+            self.receive_batch()
+        if not self.pending:
+            return None
+        return self.pending.popleft()
+
+    def is_empty(self, poller):
+        if self.pending:
+            return False
+        socks = dict(poller.poll(timeout=10))
+        return self.socket not in socks or socks[self.socket] != zmq.POLLIN
+
+    def get_stats(self):
+        return {"batches_received": self.batches_received, "results_received": self.results_received,
+                "avg_batch_size": self.results_received / self.batches_received if self.batches_received else 0,
+                "max_batch_size": self.max_batch_size}
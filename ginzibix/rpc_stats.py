@@ -0,0 +1,61 @@
+# per method stats of the db calls (see PWDB.do_loop): count, latency histogram with
+# log2 buckets (bucket i = latency < 2**i usec.), request / response payload bytes
+NR_BUCKETS = 32
+
+
+class MethodStats:
+    __slots__ = ("count", "time_total", "time_max", "buckets", "bytes_in", "bytes_out")
+
+    def __init__(self):
+        self.count = 0
+        self.time_total = 0
+        self.time_max = 0
+        self.buckets = [0] * NR_BUCKETS
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def add(self, dt, bytes_in, bytes_out):
+        self.count += 1
+        self.time_total += dt
+        self.time_max = max(self.time_max, dt)
+        self.buckets[min(int(dt * 1000000).bit_length(), NR_BUCKETS - 1)] += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    # upper bound of the bucket which contains the q-quantile, in sec.
+    def get_quantile(self, q):
+        if not self.count:
+            return 0
+        limit = q * self.count
+        cum = 0
+        for i, n in enumerate(self.buckets):
+            cum += n
+            if cum >= limit:
+                return min((2 ** i) / 1000000, self.time_max)
+        return self.time_max
+
+    def get_stats(self):
+        return {"count": self.count, "time_total": self.time_total,
+                "time_avg": self.time_total / self.count if self.count else 0,
+                "time_p99": self.get_quantile(0.99), "time_max": self.time_max,
+                "bytes_in": self.bytes_in, "bytes_out": self.bytes_out}
+
+
+class RPCStats:
+    def __init__(self):
+        self.methods = {}
+
+    def add(self, funcstr, dt, bytes_in=0, bytes_out=0):
+        try:
+            stats = self.methods[funcstr]
+        except KeyError:
+            stats = self.methods[funcstr] = MethodStats()
+        stats.add(dt, bytes_in, bytes_out)
+
+    # {method: stats}, methods with highest total time first
+    def get_stats(self):
+        return dict(sorted(((funcstr, stats.get_stats()) for funcstr, stats in self.methods.items()),
+                           key=lambda item: item[1]["time_total"], reverse=True))
+
+    def reset(self):
+        self.methods = {}
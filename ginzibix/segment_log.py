@@ -0,0 +1,103 @@
+import os
+import struct
+import zlib
+
+# resume state of a partially written file in _partial0/: append-only log next to it,
+# one record per part, appended as soon as a decoder worker has written the part. a
+# crash loses nothing that is on disk already, a torn or corrupt tail (checksum per
+# record) is ignored and cut off when the log is appended to again. the log is only
+# replayed when the file is touched after a restart (downloader: which articles are
+# missing, decoder: offsets + crc32s of the parts), and removed with the decoded file.
+
+SEGLOG_MAGIC = b"GZBXSEG1"
+# art_nr, file size, begin, length, crc32 of part data
+RECORD = struct.Struct("<IQQII")
+CHECKSUM = struct.Struct("<I")
+RECORD_SIZE = RECORD.size + CHECKSUM.size
+
+
+def pack_record(art_nr, size, begin, length, crc):
+    record = RECORD.pack(art_nr, size, begin, length, crc)
+    return record + CHECKSUM.pack(zlib.crc32(record))
+
+
+# -> (file size or None, {art_nr: (begin, length, crc32)}, length of valid part of log),
+# None if it is not a segment log
+def replay(filename):
+    with open(filename, "rb") as f0:
+        data = f0.read()
+    if not data.startswith(SEGLOG_MAGIC):
+        return None
+    size = None
+    parts = {}
+    pos = len(SEGLOG_MAGIC)
+    while pos + RECORD_SIZE <= len(data):
+        record = data[pos:pos + RECORD.size]
+        checksum, = CHECKSUM.unpack_from(data, pos + RECORD.size)
+        if zlib.crc32(record) != checksum:
+            break
+        art_nr, size0, begin, length, crc = RECORD.unpack(record)
+        if length:
+            size = size0
+        parts[art_nr] = (begin, length, crc)
+        pos += RECORD_SIZE
+    return size, parts, pos
+
+
+class SegmentLog:
+    def __init__(self, filename):
+        self.filename = filename
+        self.fd = None
+        self.size = None
+        # art_nr -> (begin, length, crc32)
+        self.parts = {}
+        self.valid_length = 0
+
+    # replays existing log, anything else is started over on first append
+    def load(self):
+        try:
+            res = replay(self.filename)
+        except FileNotFoundError:
+            return
+        if res is not None:
+            self.size, self.parts, self.valid_length = res
+
+    def open(self):
+        self.fd = os.open(self.filename, os.O_WRONLY | os.O_CREAT, 0o644)
+        if not self.valid_length:
+            os.ftruncate(self.fd, 0)
+            os.write(self.fd, SEGLOG_MAGIC)
+            self.valid_length = len(SEGLOG_MAGIC)
+        else:
+            # cut off torn tail
+            os.ftruncate(self.fd, self.valid_length)
+        os.lseek(self.fd, self.valid_length, os.SEEK_SET)
+
+    def append(self, art_nr, size, begin, length, crc):
+        if self.fd is None:
+            self.open()
+        try:
+            os.write(self.fd, pack_record(art_nr, size, begin, length, crc))
+        except OSError:
+            # reopen cuts off a partial record
+            self.close()
+            raise
+        self.valid_length += RECORD_SIZE
+        self.size = size
+        self.parts[art_nr] = (begin, length, crc)
+
+    def close(self):
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+
+    # file is decoded: nothing to resume anymore
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
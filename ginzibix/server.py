@@ -1,8 +1,9 @@
 import ssl
 import nntplib
 from ginzibix.mplogging import whoami
+from ginzibix.nntp_compress import negotiate_compression
 from ginzibix import PWDBSender, make_dirs, mpp_is_alive, mpp_join, GUI_Poller, get_cut_nzbname, get_cut_msg, get_bg_color, get_status_name_and_color,\
-    clear_postproc_dirs, get_server_config, get_configured_servers, get_config_for_server, get_free_server_cfg, is_port_in_use, do_mpconnections,\
+    clear_postproc_dirs, get_server_config, get_server_options, get_configured_servers, get_config_for_server, get_free_server_cfg, is_port_in_use, do_mpconnections,\
     kill_mpp
 
 
@@ -16,10 +17,14 @@ class Servers():
         # server_config = [(server_name, server_url, user, password, port, usessl, level, connections,
         #                   retention, useserver)]
         self.server_config = get_server_config(self.cfg)
+        # server_options = {server_name: {"pipeline": 1, ...}}
+        self.server_options = get_server_options(self.cfg)
         # all_connections = [(server_name, conn#, retention, nntp_obj)]
         self.all_connections = self.get_all_connections()
         # level_servers0 = {"0": ["EWEKA", "BULK"], "1": ["TWEAK"], "2": ["NEWS", "BALD"]}
         self.level_servers = self.get_level_servers()
+        # compression_modes = {(server_name, conn#): None / "deflate" / "gzip"}
+        self.compression_modes = {}
 
     def __bool__(self):
         if not self.server_config:
@@ -32,6 +37,15 @@ class Servers():
                 return server_name, server_url, user, password, port, usessl, level, connections, retention, useserver
         return None
 
+    def get_server_option(self, server_name0, option, default=None):
+        try:
+            return self.server_options[server_name0][option]
+        except Exception:
+            return default
+
+    def get_compression(self, server_name0, conn_nr):
+        return self.compression_modes.get((server_name0, conn_nr), None)
+
     def get_all_connections(self):
         conn = []
         for s_name, _, _, _, _, _, _, s_connections, s_retention, s_useserver in self.server_config:
@@ -77,6 +91,15 @@ class Servers():
                                     else:
                                         nntpobj = nntplib.NNTP(server_url, user=user, password=password, readermode=True, port=port)
                                 self.logger.debug(whoami() + "Opened Connection #" + str(conn_nr) + " on server " + server_name0)
+                                self.compression_modes[(sn, cn)] = None
+                                if self.get_server_option(server_name0, "compression", False):
+                                    try:
+                                        self.compression_modes[(sn, cn)] = negotiate_compression(nntpobj)
+                                    except Exception as e:
+                                        self.logger.warning(whoami() + str(e) + ": cannot negotiate compression on " + server_name0)
+                                    if self.compression_modes[(sn, cn)]:
+                                        self.logger.info(whoami() + "Using " + self.compression_modes[(sn, cn)] + " compression on connection #"
+                                                         + str(conn_nr) + " of " + server_name0)
                                 result = nntpobj
                                 self.all_connections[idx] = (sn, cn, rt, nntpobj)
                                 break
@@ -0,0 +1,204 @@
+import struct
+import threading
+try:
+    # python >= 3.8, without it the ring is off and bodies go via zmq as before
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+# ring buffer in shared memory for article bodies: connection workers (mpconnector
+# process) write bodies once, only small ShmRef descriptors go through zmq, the
+# downloader and mp_work_queue; the decoder process reads the bodies in place and
+# frees the records. records are freed out of order, the write position only moves
+# over freed records; if the ring is full, bodies are sent inline as before.
+
+# record header: state, length of record incl. header, record id
+HEADER = struct.Struct("<BxxxII4x")
+STATE_FREE = 0
+STATE_USED = 1
+# filler at the end of the ring, free by definition
+STATE_PAD = 2
+ALIGN = 16
+
+
+class ShmRef:
+    __slots__ = ("offset", "length", "rid")
+
+    def __init__(self, offset, length, rid):
+        self.offset = offset
+        self.length = length
+        self.rid = rid
+
+    def __len__(self):
+        return self.length
+
+    def __getstate__(self):
+        return (self.offset, self.length, self.rid)
+
+    def __setstate__(self, state):
+        self.offset, self.length, self.rid = state
+
+
+class ShmRing:
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.name = shm.name
+        self.buf = shm.buf
+        self.size = shm.size
+        self.owner = owner
+        # writer state, only used in the process which calls store()
+        self.lock = threading.Lock()
+        self.head = 0
+        self.tail = 0
+        self.used = 0
+        self.next_rid = 1
+        self.bytes_stored = 0
+        self.bytes_inline = 0
+
+    @classmethod
+    def create(cls, size):
+        if shared_memory is None:
+            raise RuntimeError("multiprocessing.shared_memory requires python >= 3.8")
+        size = max(size // ALIGN * ALIGN, ALIGN * 2)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        shm.buf[:HEADER.size] = HEADER.pack(STATE_FREE, 0, 0)
+        return cls(shm, owner=True)
+
+    # attach in child process, only the creator unlinks the segment (children share
+    # the creator's resource tracker, so no extra registration is left behind)
+    @classmethod
+    def attach(cls, name):
+        if shared_memory is None:
+            raise RuntimeError("multiprocessing.shared_memory requires python >= 3.8")
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm)
+
+    def close(self):
+        self.buf = None
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except Exception:
+            pass
+
+    # --- writer side ---
+
+    def advance_tail(self):
+        while self.used > 0:
+            state, length, _ = HEADER.unpack_from(self.buf, self.tail)
+            if state == STATE_USED:
+                break
+            self.used -= length
+            self.tail = (self.tail + length) % self.size
+
+    def allocate(self, reclen):
+        self.advance_tail()
+        if self.used == 0:
+            self.head = self.tail = 0
+        elif self.head == self.tail:
+            return None
+        if self.head >= self.tail:
+            # free space: head .. end, then 0 .. tail
+            if self.size - self.head >= reclen:
+                return self.head
+            if self.tail >= reclen and self.size - self.head >= HEADER.size:
+                padlen = self.size - self.head
+                HEADER.pack_into(self.buf, self.head, STATE_PAD, padlen, 0)
+                self.used += padlen
+                self.head = 0
+                return 0
+            return None
+        if self.tail - self.head >= reclen:
+            return self.head
+        return None
+
+    # copies body into ring, returns ShmRef or None if it does not fit
+    def put(self, body):
+        reclen = (HEADER.size + len(body) + ALIGN - 1) // ALIGN * ALIGN
+        with self.lock:
+            offset = self.allocate(reclen)
+            if offset is None:
+                return None
+            rid = self.next_rid
+            self.next_rid = (self.next_rid % 0xFFFFFFFF) + 1
+            start = offset + HEADER.size
+            self.buf[start:start + len(body)] = body
+            HEADER.pack_into(self.buf, offset, STATE_USED, reclen, rid)
+            self.head = (offset + reclen) % self.size
+            self.used += reclen
+            self.bytes_stored += len(body)
+        return ShmRef(start, len(body), rid)
+
+    # info from read_body ([body]) -> [ShmRef], unchanged if ring is full
+    def store(self, info):
+        # sanity check (STAT) results carry no body
+        if not isinstance(info, list):
+            return info
+        try:
+            refs = [self.put(chunk) for chunk in info]
+        except Exception:
+            refs = [None]
+        if None in refs:
+            for ref in refs:
+                if ref:
+                    self.free(ref)
+            self.bytes_inline += sum(len(chunk) for chunk in info)
+            return info
+        return refs
+
+    # only when no descriptor is alive anymore (new nzb, decoder stopped)
+    def reset(self):
+        with self.lock:
+            self.head = self.tail = self.used = 0
+            HEADER.pack_into(self.buf, 0, STATE_FREE, 0, 0)
+
+    def get_stats(self):
+        return {"size": self.size, "used": self.used, "bytes_stored": self.bytes_stored, "bytes_inline": self.bytes_inline}
+
+    # --- reader side (any process) ---
+
+    def is_valid(self, ref):
+        state, _, rid = HEADER.unpack_from(self.buf, ref.offset - HEADER.size)
+        return state == STATE_USED and rid == ref.rid
+
+    # returns memoryview on the body, None if record was freed / reused
+    def view(self, ref):
+        if not self.is_valid(ref):
+            return None
+        return self.buf[ref.offset:ref.offset + ref.length]
+
+    def get(self, ref):
+        view = self.view(ref)
+        return bytes(view) if view is not None else None
+
+    def free(self, ref):
+        if self.is_valid(ref):
+            self.buf[ref.offset - HEADER.size] = STATE_FREE
+
+
+# list of chunks, possibly ShmRefs -> list of bytes (None if info is gone)
+def resolve_info(ring, info):
+    if not isinstance(info, list) or not any(isinstance(chunk, ShmRef) for chunk in info):
+        return info
+    if not ring:
+        return None
+    chunks = []
+    for chunk in info:
+        if isinstance(chunk, ShmRef):
+            chunk = ring.get(chunk)
+            if chunk is None:
+                return None
+        chunks.append(chunk)
+    return chunks
+
+
+def free_info(ring, info):
+    if not ring or not isinstance(info, list):
+        return
+    for chunk in info:
+        if isinstance(chunk, ShmRef):
+            ring.free(chunk)
@@ -0,0 +1,107 @@
+from ginzibix.nntp_reader import get_last_line
+
+# yEnc control lines of an article given as list of chunks (bytes / memoryviews):
+#   =ybegin part=1 total=50 line=128 size=38400000 name=file.rar
+#   =ypart begin=1 end=768000
+#   ... encoded data ...
+#   =yend size=768000 part=1 pcrc32=ab12cd34 crc32=...
+# only the head of the first chunk(s) and the last line are looked at, values are taken
+# from bytes without decoding to str or running a regex per article.
+
+HEAD_SIZE = 1024
+INT_KEYS = (b"part", b"total", b"line", b"size", b"begin", b"end")
+HEX_KEYS = (b"pcrc32", b"crc32")
+
+
+class YencHeader:
+    __slots__ = ("name", "size", "part", "total", "line", "begin", "end", "part_size", "pcrc32", "crc32")
+
+    def __init__(self):
+        # name as bytes, size = file size from =ybegin, part_size = size from =yend,
+        # begin / end 1-based as in =ypart, crc32s as int; None if not present
+        for key in self.__slots__:
+            setattr(self, key, None)
+
+    # 0-based offset of part in file
+    def get_offset(self):
+        return self.begin - 1 if self.begin else 0
+
+    # decoded size of part, None if unknown
+    def get_part_size(self):
+        if self.part_size:
+            return self.part_size
+        if self.begin and self.end:
+            return self.end - self.begin + 1
+        if self.size and not self.part:
+            return self.size
+        return None
+
+
+# key=value pairs of a control line -> {key: int / bytes}, name= is always last and
+# may contain spaces
+def parse_line(line):
+    values = {}
+    pos = line.find(b" name=")
+    if pos >= 0:
+        values[b"name"] = line[pos + 6:].rstrip(b"\r\n")
+        line = line[:pos]
+    for field in line.split()[1:]:
+        key, sep, value = field.partition(b"=")
+        if not sep:
+            continue
+        try:
+            if key in INT_KEYS:
+                values[key] = int(value)
+            elif key in HEX_KEYS:
+                values[key] = int(value, 16)
+        except ValueError:
+            pass
+    return values
+
+
+def get_head(info):
+    head = b""
+    for chunk in info:
+        head += bytes(chunk[:HEAD_SIZE - len(head)])
+        if len(head) >= HEAD_SIZE:
+            break
+    return head
+
+
+def get_line(buf, keyword, start=0):
+    pos = buf.find(keyword, start)
+    if pos < 0:
+        return None, start
+    end = buf.find(b"\n", pos)
+    if end < 0:
+        end = len(buf)
+    return buf[pos:end], end
+
+
+# -> YencHeader, None if there is no =ybegin line
+def parse_yenc(info):
+    if not info:
+        return None
+    head = get_head(info)
+    ybegin, pos = get_line(head, b"=ybegin ")
+    if ybegin is None:
+        return None
+    hdr = YencHeader()
+    values = parse_line(ybegin)
+    hdr.name = values.get(b"name")
+    hdr.size = values.get(b"size")
+    hdr.part = values.get(b"part")
+    hdr.total = values.get(b"total")
+    hdr.line = values.get(b"line")
+    ypart, _ = get_line(head, b"=ypart ", pos)
+    if ypart is not None:
+        values = parse_line(ypart)
+        hdr.begin = values.get(b"begin")
+        hdr.end = values.get(b"end")
+    lastline = bytes(get_last_line(info))
+    if lastline.startswith(b"=yend "):
+        values = parse_line(lastline)
+        hdr.part_size = values.get(b"size")
+        hdr.pcrc32 = values.get(b"pcrc32")
+        hdr.crc32 = values.get(b"crc32")
+    return hdr